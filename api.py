@@ -1,13 +1,46 @@
+import asyncio
 import os
 import time
+from typing import Optional
 from openai import OpenAI
 from openai import AsyncOpenAI
 from zai import ZhipuAiClient
 from autogen_ext.models.openai import OpenAIChatCompletionClient
 import pydantic
-import json
+from llm.client import request_key
+from llm.cache import ResponseCache, CachedChatCompletionClient
+from llm.transport import SharedTransport
+from llm.concurrency import AdaptiveConcurrencyLimiter, ConcurrencyGatedClient
+from llm.ratelimit import RateLimiter, RateLimitedChatCompletionClient
+from llm.tokens import estimate_chat_tokens
+from llm.replay import CallRecorder, RecordReplayChatCompletionClient, ReplayMissError
+from llm.hedge import Hedger, HedgedChatCompletionClient
+from llm.breaker import CircuitBreaker, Failover, FailoverChatCompletionClient
+from llm.usage import UsageLedger, UsageLedgerClient, WireUsageClient
+from llm.routing import ModelRoute, ModelRouter
+from llm.budget import TokenBudget, BudgetedChatCompletionClient
+from llm.prompt_size import PromptSizer, PromptSizeClient
+from llm.repair import JsonRepairer
+from llm.retry import Retrier, RetryBudget, RetryPolicy, RetryableOutputError, RetryingChatCompletionClient
+from llm.context import current_context
+from llm.streaming import JsonCutoffClient, StreamMonitor, StreamingJsonClient
+from llm.structured import StructuredOutput, StructuredOutputClient
+from llm.middleware import MiddlewareStack
+from utils import extract_json
+from utils_json import dumps
+from utils_logger import LOGGER
+from configs.models import MODEL_ROUTES, ROLE_ROUTES, DEFAULT_ROUTE, RETRY_POLICIES, DEFAULT_RETRY_POLICY, DECISION_FIELDS, MIDDLEWARE_LAYERS
+from configs.prompts import PROMPT_TOKEN_LIMIT, PROMPT_FIELD_PRIORITY, PROMPT_FIELD_MIN_TOKENS, REPAIR_PROMPT
 
 ZHIPU_API_KEY = os.getenv("ZHIPU_API_KEY", "9ef211babbe74eff8f3c3c609d5a4d68.rDkx1q72bq8VAwZn")
+GLM_BASE_URL = os.getenv("GLM_BASE_URL", "https://open.bigmodel.cn/api/paas/v4/")
+# 主端点熔断后切换到的备用端点 / 模型, 两者都不配置时不做切换
+GLM_FALLBACK_BASE_URL = os.getenv("GLM_FALLBACK_BASE_URL", "")
+GLM_FALLBACK_MODEL = os.getenv("GLM_FALLBACK_MODEL", "")
+GLM_FALLBACK_API_KEY = os.getenv("GLM_FALLBACK_API_KEY", ZHIPU_API_KEY)
+FALLBACK_ENABLED = bool(GLM_FALLBACK_BASE_URL or GLM_FALLBACK_MODEL)
+# SDK 层只保留一个兜底超时且不自行重试; 重试由 RETRIER 负责, 其按阶段超时只作用于实际发出的请求 (由熔断器执行, 不含排队时间)
+SDK_TIMEOUT = float(os.getenv("LLM_SDK_TIMEOUT", "300"))
 
 MODEL_INFO = {
     "vision": False,
@@ -16,47 +49,228 @@ MODEL_INFO = {
     "family": "glm",
     "structured_output": False,
 }
-MODEL_CLIENT = OpenAIChatCompletionClient(
-    model="glm-4.5",
-    api_key=ZHIPU_API_KEY,
-    base_url="https://open.bigmodel.cn/api/paas/v4/",
-    model_info=MODEL_INFO,
-    max_retries=3,
-    timeout=120,
-    extra_body={
-        "thinking": {
-            "type": "disabled",
-        },
-    }
+# 相同请求 (model + messages + schema + 采样参数) 直接从磁盘缓存返回, 通过 LLM_CACHE_MODE 开启
+LLM_CACHE = ResponseCache.from_env()
+# 所有客户端共用一个 keep-alive 连接池 (LLM_HTTP_* 环境变量调节)
+HTTP_TRANSPORT = SharedTransport()
+# 各阶段共享的 AIMD 并发窗口, 按单次模型请求占用, 由每次调用的延迟 / 429 / 超时反馈调节
+CONCURRENCY_LIMITER = AdaptiveConcurrencyLimiter.from_env()
+# 进程级 RPM / TPM 令牌桶 (LLM_RPM, LLM_TPM), 所有阶段共用
+RATE_LIMITER = RateLimiter.from_env()
+# 录制 / 回放所有模型调用 (LLM_RECORD_MODE=record|replay), 用于可复现的性能对比
+LLM_RECORDER = CallRecorder.from_env()
+# 长尾请求对冲 (LLM_HEDGE=1): 超过历史 p95 延迟仍未返回时补发一份, 先到先用
+HEDGER = Hedger.from_env()
+if LLM_RECORDER.replaying:
+    # 回放时对冲请求会多消耗一条录像
+    HEDGER.enabled = False
+# 按阶段 / 周 / 公司 / 部门 / prompt 汇总 token 用量与延迟 (LLM_PRICE_* 配置单价)
+USAGE_LEDGER = UsageLedger.from_env()
+# 按 prompt 类型学习输出长度, 自动设置 max_tokens; 被截断时放大预算重试
+TOKEN_BUDGET = TokenBudget.from_env(notify=LOGGER.log_status)
+# 发送前离线估算每个 prompt 模板的体积, 超出 PROMPT_TOKEN_LIMIT 时按字段优先级截断 (configs/prompts.py)
+PROMPT_SIZER = PromptSizer(PROMPT_TOKEN_LIMIT, PROMPT_FIELD_PRIORITY, PROMPT_FIELD_MIN_TOKENS, notify=LOGGER.log_status)
+# 流式调用的首 token 时间 / 决策字段可解析时间 (LLM_STREAM_CEO 开启 CEO 流式输出)
+STREAM_MONITOR = StreamMonitor(DECISION_FIELDS)
+# CEO 智能体的 output_content_type: json_object + schema 提示, 不合法的字段交给 JSON_REPAIRER 追问
+STRUCTURED_OUTPUT = StructuredOutput(lambda raw, model, defaults, request: JSON_REPAIRER.repair(raw, model, defaults, request))
+# 统一重试: 按阶段的超时 / 尝试次数 (configs/models.py), 全局重试预算不超过请求量的 LLM_RETRY_BUDGET_RATIO
+RETRIER = Retrier(
+    {phase: RetryPolicy(**cfg) for phase, cfg in RETRY_POLICIES.items()},
+    RetryPolicy(**DEFAULT_RETRY_POLICY),
+    RetryBudget.from_env(),
+    enabled=os.getenv("LLM_RETRY", "1") == "1",
+    notify=LOGGER.log_status,
 )
-JSON_MODEL_CLIENT = OpenAIChatCompletionClient(
-    model="glm-4.5", 
-    api_key=ZHIPU_API_KEY,
-    base_url="https://open.bigmodel.cn/api/paas/v4/",
-    model_info={**MODEL_INFO, "json_output": True}, 
-    max_retries=3,
-    response_format={"type": "json_object"}, 
-    extra_body={
-        "thinking": {
-            "type": "disabled",
-        },
-    }
+# 端点持续报错时熔断, 快速失败并切换到备用端点 (LLM_BREAKER_* 调节阈值); 这一对只用于 async_call_glm 的直连调用,
+# 智能体的各条路由在 MODEL_ROUTER 中各有自己的一对 (route_failover)
+FAILOVER = Failover(
+    CircuitBreaker.from_env("primary"),
+    CircuitBreaker.from_env("fallback") if FALLBACK_ENABLED else None,
 )
 
+def glm_model_client(model="glm-4.5", base_url=GLM_BASE_URL, api_key=ZHIPU_API_KEY, json_output=False):
+    if json_output:
+        return OpenAIChatCompletionClient(
+            model=model, 
+            api_key=api_key,
+            base_url=base_url,
+            http_client=HTTP_TRANSPORT.async_client,
+            model_info={**MODEL_INFO, "json_output": True}, 
+            max_retries=0,
+            timeout=SDK_TIMEOUT,
+            response_format={"type": "json_object"}, 
+            extra_body={
+                "thinking": {
+                    "type": "disabled",
+                },
+            }
+        )
+    return OpenAIChatCompletionClient(
+        model=model,
+        api_key=api_key,
+        base_url=base_url,
+        http_client=HTTP_TRANSPORT.async_client,
+        model_info=MODEL_INFO,
+        max_retries=0,
+        timeout=SDK_TIMEOUT,
+        extra_body={
+            "thinking": {
+                "type": "disabled",
+            },
+        }
+    )
+
+def route_fallback(route: ModelRoute) -> Optional[ModelRoute]:
+    """路由的备用端点: 路由自己的 fallback_* 优先, 其次全局 GLM_FALLBACK_*, 模型默认与路由相同; 都未配置时不切换"""
+    if not (route.fallback_model or route.fallback_base_url or FALLBACK_ENABLED):
+        return None
+    return ModelRoute(
+        name=f"{route.name}_fallback",
+        model=route.fallback_model or GLM_FALLBACK_MODEL or route.model,
+        base_url=route.fallback_base_url or GLM_FALLBACK_BASE_URL or route.base_url or GLM_BASE_URL,
+        api_key=route.fallback_api_key or GLM_FALLBACK_API_KEY,
+    )
+
+def route_failover(route: ModelRoute) -> Failover:
+    fallback = route_fallback(route)
+    return Failover(
+        CircuitBreaker.from_env(route.name),
+        CircuitBreaker.from_env(fallback.name) if fallback else None,
+    )
+
+def route_fallback_client(route: ModelRoute, json_output=False):
+    fallback = route_fallback(route)
+    if fallback is None:
+        return None
+    return glm_model_client(
+        model=fallback.model,
+        base_url=fallback.base_url,
+        api_key=fallback.api_key,
+        json_output=json_output,
+    )
+
+def glm_json_valid(content: str) -> bool:
+    """JSON 模式下的输出至少要能解析出一个 JSON 对象, 否则按可重试错误处理"""
+    return bool(extract_json(content))
+
+# 每条路由客户端链上的中间件, 按 MIDDLEWARE_LAYERS (configs/models.py) 的顺序组装, 各层共享并发窗口 / 限流 / 缓存 / 熔断
+MIDDLEWARE = MiddlewareStack.from_env(MIDDLEWARE_LAYERS, {
+    "usage": lambda inner, route, json_output: UsageLedgerClient(inner, USAGE_LEDGER),
+    "structured": lambda inner, route, json_output: StructuredOutputClient(inner, STRUCTURED_OUTPUT),
+    "streaming": lambda inner, route, json_output: StreamingJsonClient(inner, STREAM_MONITOR),
+    "prompt_size": lambda inner, route, json_output: PromptSizeClient(inner, PROMPT_SIZER),
+    "cache": lambda inner, route, json_output: CachedChatCompletionClient(inner, LLM_CACHE),
+    "budget": lambda inner, route, json_output: BudgetedChatCompletionClient(inner, TOKEN_BUDGET),
+    "retry": lambda inner, route, json_output: RetryingChatCompletionClient(
+        inner, RETRIER, validate=glm_json_valid if json_output else None,
+    ),
+    "hedge": lambda inner, route, json_output: HedgedChatCompletionClient(
+        inner, HEDGER, route=f"{route.name}_json" if json_output else route.name,
+    ),
+    "ratelimit": lambda inner, route, json_output: RateLimitedChatCompletionClient(inner, RATE_LIMITER),
+    "concurrency": lambda inner, route, json_output: ConcurrencyGatedClient(inner, CONCURRENCY_LIMITER),
+    "replay": lambda inner, route, json_output: RecordReplayChatCompletionClient(inner, LLM_RECORDER),
+    "wire_usage": lambda inner, route, json_output: WireUsageClient(inner, USAGE_LEDGER),
+    "cutoff": lambda inner, route, json_output: JsonCutoffClient(inner, STREAM_MONITOR, enabled=json_output),
+    "failover": lambda inner, route, json_output: FailoverChatCompletionClient(
+        inner, MODEL_ROUTER.failover_for(route), route_fallback_client(route, json_output=json_output),
+    ),
+})
+
+def build_route_client(route: ModelRoute, json_output=False):
+    """一条路由的完整客户端链: 模型客户端外包 MIDDLEWARE 的各层"""
+    raw = glm_model_client(
+        model=route.model,
+        base_url=route.base_url or GLM_BASE_URL,
+        api_key=route.api_key or ZHIPU_API_KEY,
+        json_output=json_output,
+    )
+    return MIDDLEWARE.build(raw, route, json_output)
+
+# 按角色选择模型: 部门顾问走小模型, CEO 走大模型 (configs/models.py)
+MODEL_ROUTER = ModelRouter(
+    routes={name: ModelRoute(name=name, **cfg) for name, cfg in MODEL_ROUTES.items()},
+    role_routes=ROLE_ROUTES,
+    default_route=DEFAULT_ROUTE,
+    build=build_route_client,
+    failover=route_failover,
+)
+
+def routed_model_client(role: str, json_output=False):
+    return MODEL_ROUTER.client_for(role, json_output=json_output)
+
+MODEL_CLIENT = routed_model_client(None)
+JSON_MODEL_CLIENT = routed_model_client(None, json_output=True)
+
 client = ZhipuAiClient(
     api_key=ZHIPU_API_KEY,
-    base_url="https://open.bigmodel.cn/api/paas/v4/"
+    base_url=GLM_BASE_URL,
+    http_client=HTTP_TRANSPORT.sync_client,
+    max_retries=0,
 )
 async_client = AsyncOpenAI(
     api_key=ZHIPU_API_KEY,
-    base_url="https://open.bigmodel.cn/api/paas/v4/",
-    max_retries=5,
-    timeout=12
+    base_url=GLM_BASE_URL,
+    http_client=HTTP_TRANSPORT.async_client,
+    max_retries=0,
+    timeout=SDK_TIMEOUT
 )
+async_fallback_client = AsyncOpenAI(
+    api_key=GLM_FALLBACK_API_KEY,
+    base_url=GLM_FALLBACK_BASE_URL or GLM_BASE_URL,
+    http_client=HTTP_TRANSPORT.async_client,
+    max_retries=0,
+    timeout=SDK_TIMEOUT
+) if FALLBACK_ENABLED else None
+
+def render_prompt(name: str, template: str, fields: dict) -> str:
+    """template.format(**fields), 超出体积上限时先截断低优先级字段"""
+    return PROMPT_SIZER.render(name, template, fields)
 
 def get_schema_prompt(model_class) -> str:
     schema = model_class.model_json_schema()
-    return json.dumps(schema, ensure_ascii=False)
+    return dumps(schema)
+
+def glm_cache_key(model, messages, schema, **params) -> str:
+    return request_key({
+        "model": model,
+        "messages": messages,
+        "schema": schema.model_json_schema() if schema else None,
+        **params,
+    })
+
+def glm_prompt_type(schema) -> str:
+    """预算按调用方设置的 prompt 模板归类, 没有时按输出 schema 归类"""
+    return current_context().prompt or (schema.__name__ if schema else "text")
+
+def glm_checked(completion, schema):
+    """带 schema 的调用完整输出却解析不出 JSON 时, 抛出可重试错误交给 RETRIER"""
+    choice = completion.choices[0]
+    if schema and choice.finish_reason != "length" and not extract_json(choice.message.content or ""):
+        raise RetryableOutputError(f"{schema.__name__} output is not JSON: {(choice.message.content or '')[:80]!r}")
+    return completion
+
+def llm_stats_summary() -> str:
+    """各 LLM 组件的统计信息, 打印在各阶段的总结中"""
+    return "\n".join([
+        LLM_CACHE.summary(),
+        HTTP_TRANSPORT.summary(),
+        CONCURRENCY_LIMITER.summary(),
+        RATE_LIMITER.summary(),
+        LLM_RECORDER.summary(),
+        HEDGER.summary(),
+        RETRIER.summary(),
+        "Circuit Breaker: " + " | ".join([FAILOVER.status(), *MODEL_ROUTER.failover_status()]),
+        MODEL_ROUTER.summary(),
+        TOKEN_BUDGET.summary(),
+        PROMPT_SIZER.summary(),
+        STREAM_MONITOR.summary(),
+        JSON_REPAIRER.summary(),
+        STRUCTURED_OUTPUT.summary(),
+        MIDDLEWARE.summary(),
+        USAGE_LEDGER.summary(),
+    ])
 
 def call_glm(user_prompt, schema: object = None, sys_prompt="你是一个商业分析专家。", temperature=0.3, max_tokens=4096):
     try:
@@ -64,20 +278,54 @@ def call_glm(user_prompt, schema: object = None, sys_prompt="你是一个商业
         if schema:
             response_format = {"type": "json_object"}
             sys_prompt += f"\n\n【重要】请严格按照以下 JSON Schema 格式输出结果，不要包含 markdown 标记：\n{get_schema_prompt(schema)}"
-        completion = client.chat.completions.create(
-            model="glm-4.5",
-            messages=[
-                {"role": "system", "content": sys_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
-            thinking={
-                "type": "disabled",
-            },
-            temperature=temperature, 
-            max_tokens=max_tokens,
-            response_format=response_format
-        )
-        return completion.choices[0].message.content.strip()
+        messages = [
+            {"role": "system", "content": sys_prompt},
+            {"role": "user", "content": user_prompt}
+        ]
+        prompt_type = glm_prompt_type(schema)
+        messages = PROMPT_SIZER.fit_chat(prompt_type, messages)
+        cache_key = glm_cache_key("glm-4.5", messages, schema, temperature=temperature,
+                                  max_tokens=max_tokens, response_format=response_format)
+        cached = LLM_CACHE.get(cache_key)
+        if cached is not None:
+            return cached
+        replay_key = glm_cache_key("glm-4.5", messages, schema)
+        if LLM_RECORDER.replaying:
+            try:
+                response, latency = LLM_RECORDER.take(replay_key)
+                time.sleep(latency)
+                return response["content"]
+            except ReplayMissError:
+                if not LLM_RECORDER.live_on_miss:
+                    raise
+
+        budget = TOKEN_BUDGET.budget(prompt_type, cap=max_tokens)
+        start = time.perf_counter()
+        while True:
+            completion = RETRIER.run_sync(lambda policy: glm_checked(client.chat.completions.create(
+                model="glm-4.5",
+                messages=messages,
+                thinking={
+                    "type": "disabled",
+                },
+                temperature=temperature, 
+                max_tokens=budget or max_tokens,
+                response_format=response_format,
+                timeout=policy.timeout,
+            ), schema))
+            if budget is None or completion.choices[0].finish_reason != "length":
+                break
+            budget = TOKEN_BUDGET.retry_budget(budget, cap=max_tokens)
+            if budget is None:
+                break
+        if completion.choices[0].finish_reason != "length" and completion.usage:
+            TOKEN_BUDGET.observe(prompt_type, completion.usage.completion_tokens)
+        content = completion.choices[0].message.content.strip()
+        if LLM_RECORDER.recording:
+            LLM_RECORDER.record(replay_key, "glm", {"messages": messages}, {"content": content}, time.perf_counter() - start)
+        if completion.choices[0].finish_reason == "stop":
+            LLM_CACHE.put(cache_key, content)
+        return content
 
     except Exception as e:
         return f"failed:{str(e)}"
@@ -88,24 +336,91 @@ async def async_call_glm(user_prompt, schema: object = None, sys_prompt="你是
         if schema:
             response_format = {"type": "json_object"}
             sys_prompt += f"\n\n【重要】请严格按照以下 JSON Schema 格式输出结果，不要包含 markdown 标记：\n{get_schema_prompt(schema)}"
+        messages = [
+            {"role": "system", "content": sys_prompt},
+            {"role": "user", "content": user_prompt}
+        ]
+        prompt_type = glm_prompt_type(schema)
+        messages = PROMPT_SIZER.fit_chat(prompt_type, messages)
+        cache_key = glm_cache_key("GLM-4.5", messages, schema, temperature=temperature,
+                                  max_tokens=max_tokens, response_format=response_format, top_p=0.9)
+        cached = LLM_CACHE.get(cache_key)
+        if cached is not None:
+            USAGE_LEDGER.record(0, 0, 0.0, cached=True)
+            return cached
+        replay_key = glm_cache_key("GLM-4.5", messages, schema)
+        if LLM_RECORDER.replaying:
+            try:
+                return (await LLM_RECORDER.replay(replay_key))["content"]
+            except ReplayMissError:
+                if not LLM_RECORDER.live_on_miss:
+                    raise
 
-        completion = await async_client.chat.completions.create(
-            model="GLM-4.5",
-            messages=[
-                {"role": "system", "content": sys_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
-            temperature=temperature, 
-            max_tokens=max_tokens,  
-            response_format=response_format,
-            extra_body={
-                "thinking": {
-                    "type": "disabled"
-                }
-            },
-            top_p=0.9,  
-        )
-        return completion.choices[0].message.content.strip()
+        async def attempt(limit):
+            reservation = await RATE_LIMITER.acquire(estimate_chat_tokens(messages), limit)
+            def request(openai_client, model):
+                return lambda: openai_client.chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    temperature=temperature, 
+                    max_tokens=limit,  
+                    response_format=response_format,
+                    extra_body={
+                        "thinking": {
+                            "type": "disabled"
+                        }
+                    },
+                    top_p=0.9,  
+                )
+
+            async with CONCURRENCY_LIMITER:
+                start = time.perf_counter()
+                try:
+                    completion = await FAILOVER.run(
+                        request(async_client, "GLM-4.5"),
+                        request(async_fallback_client, GLM_FALLBACK_MODEL or "GLM-4.5") if FALLBACK_ENABLED else None,
+                    )
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    CONCURRENCY_LIMITER.record_failure(e)
+                    raise
+            latency = time.perf_counter() - start
+            CONCURRENCY_LIMITER.record_success(latency)
+            RATE_LIMITER.settle(reservation, completion.usage.total_tokens if completion.usage else None)
+            if completion.usage:
+                USAGE_LEDGER.record_attempt(completion.usage.prompt_tokens, completion.usage.completion_tokens, latency)
+            return completion, latency
+
+        async def checked_attempt(limit):
+            completion, latency = await HEDGER.run(lambda: attempt(limit), route="glm")
+            return glm_checked(completion, schema), latency
+
+        budget = TOKEN_BUDGET.budget(prompt_type, cap=max_tokens)
+        call_start = time.perf_counter()
+        while True:
+            completion, latency = await RETRIER.run(lambda: checked_attempt(budget or max_tokens))
+            if budget is None or completion.choices[0].finish_reason != "length":
+                break
+            budget = TOKEN_BUDGET.retry_budget(budget, cap=max_tokens)
+            if budget is None:
+                break
+        USAGE_LEDGER.record(0, 0, time.perf_counter() - call_start)
+        if completion.choices[0].finish_reason != "length" and completion.usage:
+            TOKEN_BUDGET.observe(prompt_type, completion.usage.completion_tokens)
+        content = completion.choices[0].message.content.strip()
+        if LLM_RECORDER.recording:
+            LLM_RECORDER.record(replay_key, "glm", {"messages": messages}, {"content": content}, latency)
+        if completion.choices[0].finish_reason == "stop":
+            LLM_CACHE.put(cache_key, content)
+        return content
 
     except Exception as e:
-        return f"failed:{str(e)}"
\ No newline at end of file
+        return f"failed:{str(e)}"
+
+# 结构化输出校验失败时只追问缺失 / 不合法的字段, 不重跑整个团队 (LLM_REPAIR=0 关闭)
+JSON_REPAIRER = JsonRepairer.from_env(
+    lambda prompt, schema: async_call_glm(prompt, schema=schema, max_tokens=2048),
+    REPAIR_PROMPT,
+    notify=LOGGER.log_status,
+)
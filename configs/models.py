@@ -0,0 +1,95 @@
+import os
+
+# ==============================================================================
+# 模型路由表: 每条路由对应一个模型 / 端点, base_url 与 api_key 留空时使用 api.py 的默认配置
+# ==============================================================================
+
+# 每条路由各有一对熔断器; fallback_* 为空时使用全局 GLM_FALLBACK_*, 备用模型默认与路由自身相同
+MODEL_ROUTES = {
+    # 输出最终 JSON 决策的 CEO 使用大模型
+    "ceo": {
+        "model": os.getenv("GLM_CEO_MODEL", "glm-4.5"),
+        "base_url": os.getenv("GLM_CEO_BASE_URL", ""),
+        "api_key": os.getenv("GLM_CEO_API_KEY", ""),
+        "fallback_model": os.getenv("GLM_CEO_FALLBACK_MODEL", ""),
+        "fallback_base_url": os.getenv("GLM_CEO_FALLBACK_BASE_URL", ""),
+        "fallback_api_key": os.getenv("GLM_CEO_FALLBACK_API_KEY", ""),
+    },
+    # 并行的部门顾问只给出评估意见, 使用更便宜、更快的模型
+    "consultant": {
+        "model": os.getenv("GLM_CONSULTANT_MODEL", "glm-4.5-air"),
+        "base_url": os.getenv("GLM_CONSULTANT_BASE_URL", ""),
+        "api_key": os.getenv("GLM_CONSULTANT_API_KEY", ""),
+        "fallback_model": os.getenv("GLM_CONSULTANT_FALLBACK_MODEL", ""),
+        "fallback_base_url": os.getenv("GLM_CONSULTANT_FALLBACK_BASE_URL", ""),
+        "fallback_api_key": os.getenv("GLM_CONSULTANT_FALLBACK_API_KEY", ""),
+    },
+}
+
+# 智能体角色 (agent name 中公司 id 之前的部分) -> 路由
+ROLE_ROUTES = {
+    "CEO": "ceo",
+    "Producer_SA": "ceo",
+    "Demander_SA": "ceo",
+    "Business_Dept": "consultant",
+    "Tech_Dept": "consultant",
+    "Resource_Dept": "consultant",
+    "Sales_Dept": "consultant",
+    "Product_Dept": "consultant",
+}
+
+# 未在 ROLE_ROUTES 中出现的角色 (以及 MODEL_CLIENT / JSON_MODEL_CLIENT) 使用的路由
+DEFAULT_ROUTE = "ceo"
+
+# ==============================================================================
+# 重试策略: 按阶段设置单次请求超时 (秒) 与最大尝试次数, 退避为 decorrelated jitter
+# 超时只计请求在线上的时间 (限流 / 并发窗口的排队不算), 由 failover 层的熔断器执行
+# ==============================================================================
+
+RETRY_POLICIES = {
+    # 初始化 / 刷新只输出一段战略 JSON
+    "initialization": {"timeout": 60, "max_attempts": 3},
+    "refresh": {"timeout": 60, "max_attempts": 3},
+    # 批量初始化输出随批大小增长; 失败的条目会回退到单条调用, 少重试一次
+    "initialization_batch": {"timeout": 300, "max_attempts": 2},
+    "match": {"timeout": 90, "max_attempts": 3},
+    # 交互阶段的方案 / 审阅输出最长
+    "interaction": {"timeout": 180, "max_attempts": 3},
+}
+
+# 未设置阶段的调用使用的策略
+DEFAULT_RETRY_POLICY = {"timeout": 120, "max_attempts": 3}
+
+# ==============================================================================
+# 流式输出: CEO 智能体边生成边解析 JSON, 决策字段一可解析即上报, JSON 闭合后停止生成
+# ==============================================================================
+
+STREAM_CEO = os.getenv("LLM_STREAM_CEO", "0") == "1"
+
+# prompt 模板 -> 需要尽早上报的顶层决策字段 (configs/roles.py)
+DECISION_FIELDS = {
+    "PRODUCER_CEO_PROMPT_MATCH": "decision",
+    "DEMANDER_CEO_PROMPT_INTERACTION": "overall_satisfaction",
+}
+
+# ==============================================================================
+# 客户端中间件: 每条路由的客户端按此顺序逐层包装 (从外到内), 名称见 api.py 的 MIDDLEWARE
+# LLM_MIDDLEWARE=usage,cache,retry,wire_usage,failover 可覆盖; 去掉 structured 后 CEO 智能体的结构化输出不可用
+# ==============================================================================
+
+MIDDLEWARE_LAYERS = [
+    "usage",        # 用量台账
+    "structured",   # output_content_type -> json_object + schema 提示
+    "streaming",    # 流式增量解析 JSON
+    "prompt_size",  # prompt 体积估算 / 截断
+    "cache",        # 响应缓存
+    "budget",       # 按 prompt 学习 max_tokens
+    "retry",        # 按阶段重试
+    "hedge",        # 长尾对冲
+    "ratelimit",    # RPM / TPM 令牌桶
+    "concurrency",  # AIMD 并发窗口
+    "replay",       # 录制 / 回放
+    "wire_usage",   # 每次上线请求的 token 用量 (重试 / 对冲 / 预算重发都计入); usage 层只记调用次数与延迟
+    "cutoff",       # JSON 模式的流在对象闭合后断开; 放在缓存 / 预算 / 限流 / 回放之下, 断开后的结果照常经过这些层
+    "failover",     # 熔断与备用端点
+]
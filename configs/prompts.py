@@ -1,3 +1,5 @@
+import os
+
 # ==============================================================================
 # 【Phase 0】: Initialization Prompts
 # ==============================================================================
@@ -33,6 +35,46 @@ INIT_PROMPT = """
 }}
 """
 
+# 批量初始化: 一次请求补全多家企业, 共用同一段任务说明 (--batch_size > 1 时使用)
+INIT_BATCH_PROMPT = """
+请根据以下提供的 {count} 家企业的原始数据，分别完成每家企业属性的初始化补全工作。各企业相互独立，不要混用信息。
+
+{companies}
+
+【任务要求】
+对每一家企业分别完成：
+1. **Tags (标签)**: 提炼 3-5 个关键行业或技术标签（如 "人工智能", "销售中间商", "物流平台", "Web3"）。
+2. **Strategy (战略)**: 请根据企业的介绍和业务，生成一段完整的战略发展规划。方案应该包含：
+   - 企业当前的核心业务和发展状况
+   - 短期发展目标（1年内）和长期战略规划（3-5年）
+   - 可能的业务拓展方向或技术升级需求
+   - 在供应链中的定位（是更偏向需求采购还是生产供给）
+
+3. **Current Role (当前轮次角色)**: 根据生成的战略规划内容，判断该企业在**当前模拟轮次**中应该扮演的角色：
+   - **Demander (需求方)**: 战略中体现需要外部技术/服务支持，有明确采购或外包需求
+   - **Producer (供给方)**: 战略中体现对外提供服务/产品，有明确的技术输出能力
+
+【输出格式】
+必须且仅输出一个标准的 JSON 对象，不要包含 Markdown 标记或额外分析，并再三检查确保不要有多余的逗号或标点符号。
+companies 中每家输入企业对应一项，index 与输入中的企业编号一致。格式如下：
+{{
+    "companies": [
+        {{
+            "index": 1,
+            "tags": ["Tag1", "Tag2"],
+            "strategy_content": "完整的战略发展规划内容...",
+            "current_role": "Demander"
+        }}
+    ]
+}}
+"""
+
+INIT_BATCH_ITEM = """【企业 #{index}】
+- 公司名称: {name}
+- 公司介绍: {description}
+- 产品/服务: {details}
+"""
+
 REFRESH_PROMPT = """
 你现在扮演企业的决策大脑。
 【企业原始信息】
@@ -354,3 +396,44 @@ JSON 结构如下：
     "risk_analysis": "风险分析..."
 }}
 """
+
+
+# ==============================================================================
+# JSON 修复: 输出缺字段 / 字段不合法时, 只追问这些字段
+# ==============================================================================
+
+REPAIR_PROMPT = """
+你上一次输出的 {model_name} JSON 中，以下字段缺失或不合法：
+{errors}
+
+【原始请求】
+{request}
+
+【你上一次的输出】
+{previous}
+
+请只补全 / 修正上述字段，其余字段不要输出。必须且仅输出一个标准的 JSON 对象，不要包含 Markdown 标记或额外分析。
+"""
+
+# ==============================================================================
+# Prompt 体积控制: 发送前离线估算 token 数, 超出上限时按字段优先级截断
+# ==============================================================================
+
+# 单次请求 (system + 对话消息) 的 token 上限, 0 表示只统计不截断
+PROMPT_TOKEN_LIMIT = int(os.getenv("PROMPT_TOKEN_LIMIT", "6000"))
+# 字段被截断后至少保留的 token 数
+PROMPT_FIELD_MIN_TOKENS = int(os.getenv("PROMPT_FIELD_MIN_TOKENS", "200"))
+
+# 模板字段的截断优先级: 数值越小越先被截断, 未列出的字段 (公司名、id、轮次等) 永不截断
+PROMPT_FIELD_PRIORITY = {
+    # 产品服务详情往往是整段原始资料, 最先截断
+    "company_details": 1,
+    "details": 1,
+    # 历史记录 / 上一轮审阅只作参考
+    "history_summary": 2,
+    "last_review_content": 3,
+    "company_description": 4,
+    "description": 4,
+    # 待审阅的方案本身, 最后才截断
+    "proposal_content": 5,
+}
@@ -68,6 +68,11 @@ class CompanyInfo(BaseModel):
 class CompanyRefreshInfo(BaseModel):
     strategy_content: str = Field(..., description="完整的战略发展规划内容...")
     current_role: CompanyRole = Field(..., description="当前角色, 例如 'Demander' 或 'Producer'")
+class CompanyInfoBatchItem(CompanyInfo):
+    index: int = Field(..., description="输入中企业的编号 (# 后的数字)")
+class CompanyInfoBatch(BaseModel):
+    """批量初始化: 一次请求补全多家企业"""
+    companies: List[CompanyInfoBatchItem] = Field(..., description="每家输入企业对应一项")
 
 # Interaction Roles
 class ProducerProposal(BaseModel):
@@ -99,8 +104,8 @@ class InteractionRound:
         return {
             "round_id": self.round_id,
             "timestamp": self.timestamp,
-            "producer_proposal": self.producer_proposal.__dict__,
-            "demander_review": self.demander_review.__dict__
+            "producer_proposal": self.producer_proposal.model_dump(mode="json"),
+            "demander_review": self.demander_review.model_dump(mode="json")
         }
 
 @dataclass
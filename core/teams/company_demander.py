@@ -9,9 +9,9 @@ from group.agents.assistant_agent import AssistantAgent
 from group.group_chat.round_robin_group_chat import RoundRobinGroupChat
 from autogen_agentchat.conditions import TextMentionTermination, MaxMessageTermination
 from autogen_ext.models.openai import OpenAIChatCompletionClient
-from autogen_agentchat.messages import TextMessage
-from api import MODEL_CLIENT
-from api import JSON_MODEL_CLIENT
+from autogen_agentchat.messages import StructuredMessage, TextMessage
+from api import routed_model_client, render_prompt
+from configs.models import STREAM_CEO
 from core.teams.team import ParallelTeam
 
 from configs.roles import *
@@ -33,8 +33,6 @@ class DemanderTeamFactory_match:
         创建一个包含 Business, Tech, Resource, CEO 四个角色的轮询工作流团队。
         用于 Phase 1 的需求生成。
         """
-        model_client = MODEL_CLIENT
-        json_model_client = JSON_MODEL_CLIENT
         base_info = {
             "company_name": company.name,
             "company_id": company.company_id,
@@ -46,26 +44,32 @@ class DemanderTeamFactory_match:
 
         business_agent = AssistantAgent(
             name=f"Business_Dept_{company.company_id}",
-            system_message=DEMANDER_BUSINESS_PROMPT_MATCH.format(**base_info),
-            model_client=model_client,
+            system_message=render_prompt("DEMANDER_BUSINESS_PROMPT_MATCH", DEMANDER_BUSINESS_PROMPT_MATCH, base_info),
+            model_client=routed_model_client("Business_Dept"),
+            metadata={"prompt": "DEMANDER_BUSINESS_PROMPT_MATCH"},
         )
 
         tech_agent = AssistantAgent(
             name=f"Tech_Dept_{company.company_id}",
-            system_message=DEMANDER_TECH_PROMPT_MATCH.format(**base_info),
-            model_client=model_client,
+            system_message=render_prompt("DEMANDER_TECH_PROMPT_MATCH", DEMANDER_TECH_PROMPT_MATCH, base_info),
+            model_client=routed_model_client("Tech_Dept"),
+            metadata={"prompt": "DEMANDER_TECH_PROMPT_MATCH"},
         )
 
         resource_agent = AssistantAgent(
             name=f"Resource_Dept_{company.company_id}",
-            system_message=DEMANDER_RESOURCE_PROMPT_MATCH.format(**base_info),
-            model_client=model_client,
+            system_message=render_prompt("DEMANDER_RESOURCE_PROMPT_MATCH", DEMANDER_RESOURCE_PROMPT_MATCH, base_info),
+            model_client=routed_model_client("Resource_Dept"),
+            metadata={"prompt": "DEMANDER_RESOURCE_PROMPT_MATCH"},
         )
 
         ceo_agent = AssistantAgent(
             name=f"CEO_{company.company_id}",
-            system_message=DEMANDER_CEO_PROMPT_MATCH.format(**base_info),
-            model_client=json_model_client,
+            system_message=render_prompt("DEMANDER_CEO_PROMPT_MATCH", DEMANDER_CEO_PROMPT_MATCH, base_info),
+            model_client=routed_model_client("CEO", json_output=True),
+            model_client_stream=STREAM_CEO,
+            output_content_type=ActiveProject,
+            metadata={"prompt": "DEMANDER_CEO_PROMPT_MATCH"},
         )
 
         participants = [
@@ -85,7 +89,8 @@ class DemanderTeamFactory_match:
 
         team = RoundRobinGroupChat(
             participants=participants,
-            termination_condition=termination_condition
+            termination_condition=termination_condition,
+            custom_message_types=[StructuredMessage[ActiveProject]],
         )
 
         return team
@@ -93,8 +98,6 @@ class DemanderTeamFactory_match:
 class DemanderTeamFactory_interaction:
     @staticmethod
     def create_team(company: Company, proposal_str: str, last_review_str: str) -> RoundRobinGroupChat:
-        model_client = MODEL_CLIENT
-        json_model_client = JSON_MODEL_CLIENT
         base_info = {
             "company_name": company.name,
             "company_id": company.company_id,
@@ -108,26 +111,32 @@ class DemanderTeamFactory_interaction:
 
         business_agent = AssistantAgent(
             name=f"Business_Dept_{company.company_id}",
-            system_message=DEMANDER_BUSINESS_PROMPT_INTERACTION.format(**base_info),
-            model_client=model_client,
+            system_message=render_prompt("DEMANDER_BUSINESS_PROMPT_INTERACTION", DEMANDER_BUSINESS_PROMPT_INTERACTION, base_info),
+            model_client=routed_model_client("Business_Dept"),
+            metadata={"prompt": "DEMANDER_BUSINESS_PROMPT_INTERACTION"},
         )
 
         tech_agent = AssistantAgent(
             name=f"Tech_Dept_{company.company_id}",
-            system_message=DEMANDER_TECH_PROMPT_INTERACTION.format(**base_info),
-            model_client=model_client,
+            system_message=render_prompt("DEMANDER_TECH_PROMPT_INTERACTION", DEMANDER_TECH_PROMPT_INTERACTION, base_info),
+            model_client=routed_model_client("Tech_Dept"),
+            metadata={"prompt": "DEMANDER_TECH_PROMPT_INTERACTION"},
         )
 
         resource_agent = AssistantAgent(
             name=f"Resource_Dept_{company.company_id}",
-            system_message=DEMANDER_RESOURCE_PROMPT_INTERACTION.format(**base_info),
-            model_client=model_client,
+            system_message=render_prompt("DEMANDER_RESOURCE_PROMPT_INTERACTION", DEMANDER_RESOURCE_PROMPT_INTERACTION, base_info),
+            model_client=routed_model_client("Resource_Dept"),
+            metadata={"prompt": "DEMANDER_RESOURCE_PROMPT_INTERACTION"},
         )
 
         ceo_agent = AssistantAgent(
             name=f"CEO_{company.company_id}",
-            system_message=DEMANDER_CEO_PROMPT_INTERACTION.format(**base_info),
-            model_client=json_model_client,
+            system_message=render_prompt("DEMANDER_CEO_PROMPT_INTERACTION", DEMANDER_CEO_PROMPT_INTERACTION, base_info),
+            model_client=routed_model_client("CEO", json_output=True),
+            model_client_stream=STREAM_CEO,
+            output_content_type=DemanderReview,
+            metadata={"prompt": "DEMANDER_CEO_PROMPT_INTERACTION"},
         )
 
         participants = [
@@ -185,10 +194,8 @@ class DemanderAgentFactory:
             "tags": ["Python", "LLM"],
         }}
         """
-        model_client = MODEL_CLIENT
-        json_model_client = JSON_MODEL_CLIENT
         return AssistantAgent(
             name=f"Demander_SA_{company.company_id}",
             system_message=system_message,
-            model_client=model_client,
+            model_client=routed_model_client("Demander_SA"),
         )
\ No newline at end of file
@@ -9,9 +9,9 @@ from group.agents.assistant_agent import AssistantAgent
 from group.group_chat.round_robin_group_chat import RoundRobinGroupChat
 from autogen_agentchat.conditions import TextMentionTermination, MaxMessageTermination
 from autogen_ext.models.openai import OpenAIChatCompletionClient
-from autogen_agentchat.messages import TextMessage
-from api import MODEL_CLIENT
-from api import JSON_MODEL_CLIENT
+from autogen_agentchat.messages import StructuredMessage, TextMessage
+from api import routed_model_client, render_prompt
+from configs.models import STREAM_CEO
 from core.teams.team import ParallelTeam
 
 from configs.roles import *
@@ -34,8 +34,6 @@ class ProducerTeamFactory_match:
         创建一个包含 Sales, Product, Tech, CEO 四个角色的轮询工作流团队。
         用于 Phase 1 的竞标决策。
         """
-        model_client = MODEL_CLIENT
-        json_model_client = JSON_MODEL_CLIENT
         base_info = {
             "company_name": company.name,
             "company_id": company.company_id,
@@ -47,26 +45,32 @@ class ProducerTeamFactory_match:
         
         sales_agent = AssistantAgent(
             name=f"Sales_Dept_{company.company_id}",
-            system_message=PRODUCER_SALES_PROMPT_MATCH.format(**base_info),
-            model_client=model_client,
+            system_message=render_prompt("PRODUCER_SALES_PROMPT_MATCH", PRODUCER_SALES_PROMPT_MATCH, base_info),
+            model_client=routed_model_client("Sales_Dept"),
+            metadata={"prompt": "PRODUCER_SALES_PROMPT_MATCH"},
         )
 
         product_agent = AssistantAgent(
             name=f"Product_Dept_{company.company_id}",
-            system_message=PRODUCER_PRODUCT_PROMPT_MATCH.format(**base_info),
-            model_client=model_client,
+            system_message=render_prompt("PRODUCER_PRODUCT_PROMPT_MATCH", PRODUCER_PRODUCT_PROMPT_MATCH, base_info),
+            model_client=routed_model_client("Product_Dept"),
+            metadata={"prompt": "PRODUCER_PRODUCT_PROMPT_MATCH"},
         )
 
         tech_agent = AssistantAgent(
             name=f"Tech_Dept_{company.company_id}",
-            system_message=PRODUCER_TECH_PROMPT_MATCH.format(**base_info),
-            model_client=model_client,
+            system_message=render_prompt("PRODUCER_TECH_PROMPT_MATCH", PRODUCER_TECH_PROMPT_MATCH, base_info),
+            model_client=routed_model_client("Tech_Dept"),
+            metadata={"prompt": "PRODUCER_TECH_PROMPT_MATCH"},
         )
 
         ceo_agent = AssistantAgent(
             name=f"CEO_{company.company_id}",
-            system_message=PRODUCER_CEO_PROMPT_MATCH.format(**base_info),
-            model_client=json_model_client,
+            system_message=render_prompt("PRODUCER_CEO_PROMPT_MATCH", PRODUCER_CEO_PROMPT_MATCH, base_info),
+            model_client=routed_model_client("CEO", json_output=True),
+            model_client_stream=STREAM_CEO,
+            output_content_type=ProducerDecision,
+            metadata={"prompt": "PRODUCER_CEO_PROMPT_MATCH"},
         )
 
         participants = [
@@ -99,8 +103,6 @@ class ProducerTeamFactory_match:
 class ProducerTeamFactory_interaction:
     @staticmethod
     def create_team(company: Company, round_id: int, last_review_str: str) -> RoundRobinGroupChat:
-        model_client = MODEL_CLIENT
-        json_model_client = JSON_MODEL_CLIENT
         base_info = {
             "company_name": company.name,
             "company_id": company.company_id,
@@ -114,26 +116,32 @@ class ProducerTeamFactory_interaction:
         
         sales_agent = AssistantAgent(
             name=f"Sales_Dept_{company.company_id}",
-            system_message=PRODUCER_SALES_PROMPT_INTERACTION.format(**base_info),
-            model_client=model_client,
+            system_message=render_prompt("PRODUCER_SALES_PROMPT_INTERACTION", PRODUCER_SALES_PROMPT_INTERACTION, base_info),
+            model_client=routed_model_client("Sales_Dept"),
+            metadata={"prompt": "PRODUCER_SALES_PROMPT_INTERACTION"},
         )
 
         product_agent = AssistantAgent(
             name=f"Product_Dept_{company.company_id}",
-            system_message=PRODUCER_PRODUCT_PROMPT_INTERACTION.format(**base_info),
-            model_client=model_client,
+            system_message=render_prompt("PRODUCER_PRODUCT_PROMPT_INTERACTION", PRODUCER_PRODUCT_PROMPT_INTERACTION, base_info),
+            model_client=routed_model_client("Product_Dept"),
+            metadata={"prompt": "PRODUCER_PRODUCT_PROMPT_INTERACTION"},
         )
 
         tech_agent = AssistantAgent(
             name=f"Tech_Dept_{company.company_id}",
-            system_message=PRODUCER_TECH_PROMPT_INTERACTION.format(**base_info),
-            model_client=model_client,
+            system_message=render_prompt("PRODUCER_TECH_PROMPT_INTERACTION", PRODUCER_TECH_PROMPT_INTERACTION, base_info),
+            model_client=routed_model_client("Tech_Dept"),
+            metadata={"prompt": "PRODUCER_TECH_PROMPT_INTERACTION"},
         )
 
         ceo_agent = AssistantAgent(
             name=f"CEO_{company.company_id}",
-            system_message=PRODUCER_CEO_PROMPT_INTERACTION.format(**base_info),
-            model_client=json_model_client,
+            system_message=render_prompt("PRODUCER_CEO_PROMPT_INTERACTION", PRODUCER_CEO_PROMPT_INTERACTION, base_info),
+            model_client=routed_model_client("CEO", json_output=True),
+            model_client_stream=STREAM_CEO,
+            output_content_type=ProducerProposal,
+            metadata={"prompt": "PRODUCER_CEO_PROMPT_INTERACTION"},
         )
 
         participants = [
@@ -153,7 +161,8 @@ class ProducerTeamFactory_interaction:
 
         team = RoundRobinGroupChat(
             participants=participants,
-            termination_condition=termination_condition
+            termination_condition=termination_condition,
+            custom_message_types=[StructuredMessage[ProducerProposal]],
         )
 
         return team
@@ -193,11 +202,9 @@ class ProducerAgentFactory:
         - decision: "ACCEPT" 或 "REJECT"
         - reason: 简短的决策理由 (如果拒绝，请说明具体原因)
         """
-        model_client = MODEL_CLIENT
-        json_model_client = JSON_MODEL_CLIENT
         
         return AssistantAgent(
             name=f"Producer_SA_{company.company_id}",
             system_message=system_message,
-            model_client=model_client,
+            model_client=routed_model_client("Producer_SA"),
         )
\ No newline at end of file
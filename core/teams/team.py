@@ -1,13 +1,23 @@
 import asyncio
-from typing import List
+from typing import List, TypeVar
 from dataclasses import dataclass
+from pydantic import BaseModel
 from autogen_agentchat.base import TaskResult
-from autogen_agentchat.messages import TextMessage
+from autogen_agentchat.messages import BaseChatMessage, StructuredMessage, TextMessage
 from group.agents.assistant_agent import AssistantAgent
 
+T = TypeVar("T", bound=BaseModel)
+
 @dataclass
 class MockResponse:
-    messages: List[TextMessage]
+    messages: List[BaseChatMessage]
+
+def team_output(result, model: type[T]) -> T:
+    """团队最后一条消息的结构化输出 (CEO 的 output_content_type), 类型不符时报错"""
+    message = result.messages[-1]
+    if not isinstance(message, StructuredMessage) or not isinstance(message.content, model):
+        raise ValueError(f"Team did not return a {model.__name__} (last message: {type(message).__name__})")
+    return message.content
 
 class ParallelTeam:
     def __init__(self, consultants: List[AssistantAgent], ceo: AssistantAgent):
@@ -20,7 +30,7 @@ class ParallelTeam:
         1. 并行调用所有 consultants (Business, Tech, Resource)
         2. 收集他们的回复
         3. 将汇总后的意见交给 CEO
-        4. 返回 CEO 的最终决策
+        4. 返回 CEO 的最终决策 (CEO 设置了 output_content_type 时为 StructuredMessage)
         """
         input_msg = TextMessage(content=task, source="user")
 
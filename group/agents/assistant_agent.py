@@ -58,6 +58,7 @@ from autogen_agentchat.messages import (
 )
 from autogen_agentchat.state import AssistantAgentState
 from autogen_agentchat.utils import remove_images
+from llm.context import call_context
 from autogen_agentchat.agents import BaseChatAgent
 
 event_logger = logging.getLogger(EVENT_LOGGER_NAME)
@@ -961,6 +962,7 @@ class AssistantAgent(BaseChatAgent, Component[AssistantAgentConfig]):
             cancellation_token=cancellation_token,
             output_content_type=output_content_type,
             message_id=message_id,
+            agent_metadata=self._metadata,
         ):
             if isinstance(inference_output, CreateResult):
                 model_result = inference_output
@@ -1065,6 +1067,7 @@ class AssistantAgent(BaseChatAgent, Component[AssistantAgentConfig]):
         cancellation_token: CancellationToken,
         output_content_type: type[BaseModel] | None,
         message_id: str,
+        agent_metadata: Dict[str, str] | None = None,
     ) -> AsyncGenerator[Union[CreateResult, ModelClientStreamingChunkEvent], None]:
         """Call the language model with given context and configuration.
 
@@ -1078,6 +1081,7 @@ class AssistantAgent(BaseChatAgent, Component[AssistantAgentConfig]):
             agent_name: Name of the agent
             cancellation_token: Token for cancelling operation
             output_content_type: Optional type for structured output
+            agent_metadata: Agent metadata, its "prompt" entry tags the call in the usage ledger
 
         Returns:
             Generator yielding model results or streaming chunks
@@ -1090,28 +1094,32 @@ class AssistantAgent(BaseChatAgent, Component[AssistantAgentConfig]):
         if model_client_stream:
             model_result: Optional[CreateResult] = None
 
-            async for chunk in model_client.create_stream(
-                llm_messages,
-                tools=tools,
-                json_output=output_content_type,
-                cancellation_token=cancellation_token,
-            ):
-                if isinstance(chunk, CreateResult):
-                    model_result = chunk
-                elif isinstance(chunk, str):
-                    yield ModelClientStreamingChunkEvent(content=chunk, source=agent_name, full_message_id=message_id)
-                else:
-                    raise RuntimeError(f"Invalid chunk type: {type(chunk)}")
+            # 流式调用同样按部门 / prompt 模板归类, 并据此解析决策字段
+            with call_context(agent=agent_name, prompt=(agent_metadata or {}).get("prompt")):
+                async for chunk in model_client.create_stream(
+                    llm_messages,
+                    tools=tools,
+                    json_output=output_content_type,
+                    cancellation_token=cancellation_token,
+                ):
+                    if isinstance(chunk, CreateResult):
+                        model_result = chunk
+                    elif isinstance(chunk, str):
+                        yield ModelClientStreamingChunkEvent(content=chunk, source=agent_name, full_message_id=message_id)
+                    else:
+                        raise RuntimeError(f"Invalid chunk type: {type(chunk)}")
             if model_result is None:
                 raise RuntimeError("No final model result in streaming mode.")
             yield model_result
         else:
-            model_result = await model_client.create(
-                llm_messages,
-                tools=tools,
-                cancellation_token=cancellation_token,
-                json_output=output_content_type,
-            )
+            # 供用量台账按部门 / prompt 模板归类
+            with call_context(agent=agent_name, prompt=(agent_metadata or {}).get("prompt")):
+                model_result = await model_client.create(
+                    llm_messages,
+                    tools=tools,
+                    cancellation_token=cancellation_token,
+                    json_output=output_content_type,
+                )
             yield model_result
 
     @classmethod
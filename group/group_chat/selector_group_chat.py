@@ -35,6 +35,7 @@ from autogen_agentchat.state import SelectorManagerState
 from .base_group_chat import BaseGroupChat
 from .base_group_chat_manager import BaseGroupChatManager
 from .events import GroupChatTermination
+from llm.context import call_context
 
 trace_logger = logging.getLogger(TRACE_LOGGER_NAME)
 
@@ -247,26 +248,28 @@ class SelectorGroupChatManager(BaseGroupChatManager):
         num_attempts = 0
         while num_attempts < max_attempts:
             num_attempts += 1
-            if self._model_client_streaming:
-                chunk: CreateResult | str = ""
-                async for _chunk in self._model_client.create_stream(messages=select_speaker_messages):
-                    chunk = _chunk
-                    if self._emit_team_events:
-                        if isinstance(chunk, str):
-                            await self._output_message_queue.put(
-                                ModelClientStreamingChunkEvent(content=cast(str, _chunk), source=self._name)
-                            )
-                        else:
-                            assert isinstance(chunk, CreateResult)
-                            assert isinstance(chunk.content, str)
-                            await self._output_message_queue.put(
-                                SelectorEvent(content=chunk.content, source=self._name)
-                            )
-                # The last chunk must be CreateResult.
-                assert isinstance(chunk, CreateResult)
-                response = chunk
-            else:
-                response = await self._model_client.create(messages=select_speaker_messages)
+            # 供用量台账 / 中间件统计归类
+            with call_context(agent=self._name, prompt="SELECTOR_PROMPT"):
+                if self._model_client_streaming:
+                    chunk: CreateResult | str = ""
+                    async for _chunk in self._model_client.create_stream(messages=select_speaker_messages):
+                        chunk = _chunk
+                        if self._emit_team_events:
+                            if isinstance(chunk, str):
+                                await self._output_message_queue.put(
+                                    ModelClientStreamingChunkEvent(content=cast(str, _chunk), source=self._name)
+                                )
+                            else:
+                                assert isinstance(chunk, CreateResult)
+                                assert isinstance(chunk.content, str)
+                                await self._output_message_queue.put(
+                                    SelectorEvent(content=chunk.content, source=self._name)
+                                )
+                    # The last chunk must be CreateResult.
+                    assert isinstance(chunk, CreateResult)
+                    response = chunk
+                else:
+                    response = await self._model_client.create(messages=select_speaker_messages)
             assert isinstance(response.content, str)
             select_speaker_messages.append(AssistantMessage(content=response.content, source="selector"))
             # NOTE: we use all participant names to check for mentions, even if the previous speaker is not allowed.
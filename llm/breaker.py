@@ -0,0 +1,326 @@
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Any, AsyncGenerator, Awaitable, Callable, Dict, Literal, Mapping, Optional, Sequence, TypeVar, Union
+
+from autogen_core import CancellationToken
+from autogen_core.models import ChatCompletionClient, CreateResult, LLMMessage
+from autogen_core.tools import Tool, ToolSchema
+from pydantic import BaseModel
+
+from llm.client import WrappedChatCompletionClient
+from llm.concurrency import is_overload_error
+from llm.context import wire_timeout
+
+T = TypeVar("T")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(RuntimeError):
+    """The endpoint's breaker is open; the call was rejected without reaching the network."""
+
+
+def is_provider_error(exc: BaseException) -> bool:
+    """5xx, 429, timeouts and connection failures; a 4xx means the endpoint itself is up."""
+    if is_overload_error(exc):
+        return True
+    status = getattr(exc, "status_code", None)
+    if status is not None:
+        return status >= 500
+    return type(exc).__name__ in (
+        "APIConnectionError", "InternalServerError", "ConnectError", "RemoteProtocolError", "ReadError",
+    )
+
+
+class CircuitBreaker:
+    """
+    Per-endpoint circuit breaker.
+
+    - closed: calls go through; `failure_threshold` consecutive provider errors, or an
+      error rate above `error_rate_threshold` over the last `window` calls, trips it
+    - open: calls fail immediately with CircuitOpenError for `open_seconds`
+    - half_open: up to `half_open_probes` calls are let through; a success closes the
+      breaker, a failure re-opens it
+
+    `call` also enforces the current retry attempt's timeout (llm.context.wire_timeout)
+    around the request itself, so a timeout counts as a provider error here and time spent
+    waiting for rate-limit tokens or a concurrency slot never does. `stream` does the same
+    bookkeeping for a streamed call, recording the outcome once the stream has ended; there
+    the timeout bounds the wait for the first chunk and every gap between chunks.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, error_rate_threshold: float = 0.5,
+                 window: int = 20, open_seconds: float = 30.0, half_open_probes: int = 1):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.error_rate_threshold = error_rate_threshold
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.trips = 0
+        self.rejected = 0
+        self.successes = 0
+        self.failures = 0
+        self._outcomes = deque(maxlen=window)
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+
+    @classmethod
+    def from_env(cls, name: str) -> "CircuitBreaker":
+        return cls(
+            name=name,
+            failure_threshold=int(os.getenv("LLM_BREAKER_FAILURES", "5")),
+            error_rate_threshold=float(os.getenv("LLM_BREAKER_ERROR_RATE", "0.5")),
+            open_seconds=float(os.getenv("LLM_BREAKER_OPEN_SECONDS", "30")),
+        )
+
+    def _error_rate(self) -> float:
+        if len(self._outcomes) < self._outcomes.maxlen // 2:
+            return 0.0
+        return self._outcomes.count(False) / len(self._outcomes)
+
+    def _trip(self):
+        self.state = OPEN
+        self.trips += 1
+        self._opened_at = time.monotonic()
+
+    def allow(self) -> bool:
+        if self.state == OPEN:
+            if time.monotonic() - self._opened_at < self.open_seconds:
+                return False
+            self.state = HALF_OPEN
+        if self.state == HALF_OPEN:
+            if self._probes_in_flight >= self.half_open_probes:
+                return False
+            self._probes_in_flight += 1
+        return True
+
+    def record_success(self):
+        self.successes += 1
+        self.consecutive_failures = 0
+        self._outcomes.append(True)
+        if self.state == HALF_OPEN:
+            self.state = CLOSED
+            self._outcomes.clear()
+
+    def record_failure(self):
+        self.failures += 1
+        self.consecutive_failures += 1
+        self._outcomes.append(False)
+        if self.state == HALF_OPEN:
+            self._trip()
+        elif self.state == CLOSED and (
+            self.consecutive_failures >= self.failure_threshold
+            or self._error_rate() > self.error_rate_threshold
+        ):
+            self._trip()
+
+    async def call(self, attempt: Callable[[], Awaitable[T]]) -> T:
+        if not self.allow():
+            self.rejected += 1
+            raise CircuitOpenError(f"Circuit '{self.name}' is open, retry in {self.retry_in():.0f}s")
+        probing = self.state == HALF_OPEN
+        timeout = wire_timeout()
+        try:
+            if timeout:
+                result = await asyncio.wait_for(attempt(), timeout)
+            else:
+                result = await attempt()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if is_provider_error(e):
+                self.record_failure()
+            else:
+                # 请求本身有问题 (4xx / 解析失败), 说明端点是通的
+                self.record_success()
+            raise
+        finally:
+            if probing:
+                self._probes_in_flight -= 1
+        self.record_success()
+        return result
+
+    async def stream(self, open_stream: Callable[[], AsyncGenerator[T, None]]) -> AsyncGenerator[T, None]:
+        if not self.allow():
+            self.rejected += 1
+            raise CircuitOpenError(f"Circuit '{self.name}' is open, retry in {self.retry_in():.0f}s")
+        probing = self.state == HALF_OPEN
+        stream = open_stream()
+        ok = None
+        try:
+            while True:
+                timeout = wire_timeout()
+                try:
+                    if timeout:
+                        async with asyncio.timeout(timeout):
+                            chunk = await stream.__anext__()
+                    else:
+                        chunk = await stream.__anext__()
+                except StopAsyncIteration:
+                    break
+                yield chunk
+            ok = True
+        except GeneratorExit:
+            # 调用方提前结束 (如 JSON 已闭合后停止读取), 端点是通的
+            ok = True
+            raise
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            ok = not is_provider_error(e)
+            raise
+        finally:
+            await stream.aclose()
+            if probing:
+                self._probes_in_flight -= 1
+            if ok is True:
+                self.record_success()
+            elif ok is False:
+                self.record_failure()
+
+    def retry_in(self) -> float:
+        if self.state != OPEN:
+            return 0.0
+        return max(0.0, self.open_seconds - (time.monotonic() - self._opened_at))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "trips": self.trips,
+            "rejected": self.rejected,
+            "successes": self.successes,
+            "failures": self.failures,
+        }
+
+    def summary(self) -> str:
+        s = self.stats()
+        return (
+            f"{self.name}={s['state']} (trips={s['trips']} rejected={s['rejected']} "
+            f"ok={s['successes']} errors={s['failures']})"
+        )
+
+
+class Failover:
+    """Routes calls to the primary endpoint and falls back to the secondary one when it is down."""
+
+    def __init__(self, primary: CircuitBreaker, fallback: Optional[CircuitBreaker] = None):
+        self.primary = primary
+        self.fallback = fallback
+        self.failovers = 0
+
+    async def run(self, primary_attempt: Callable[[], Awaitable[T]],
+                  fallback_attempt: Optional[Callable[[], Awaitable[T]]] = None) -> T:
+        if self.fallback is None:
+            fallback_attempt = None
+        try:
+            return await self.primary.call(primary_attempt)
+        except CircuitOpenError:
+            if fallback_attempt is None:
+                raise
+        except Exception as e:
+            if fallback_attempt is None or not is_provider_error(e):
+                raise
+        self.failovers += 1
+        return await self.fallback.call(fallback_attempt)
+
+    async def stream(self, primary_stream: Callable[[], AsyncGenerator[T, None]],
+                     fallback_stream: Optional[Callable[[], AsyncGenerator[T, None]]] = None) -> AsyncGenerator[T, None]:
+        """Like `run` for a streamed call; it only fails over before the first chunk has been yielded."""
+        if self.fallback is None:
+            fallback_stream = None
+        started = False
+        stream = self.primary.stream(primary_stream)
+        try:
+            async for chunk in stream:
+                started = True
+                yield chunk
+            return
+        except CircuitOpenError:
+            if fallback_stream is None:
+                raise
+        except Exception as e:
+            if started or fallback_stream is None or not is_provider_error(e):
+                raise
+        finally:
+            await stream.aclose()
+        self.failovers += 1
+        stream = self.fallback.stream(fallback_stream)
+        try:
+            async for chunk in stream:
+                yield chunk
+        finally:
+            await stream.aclose()
+
+    def status(self) -> str:
+        parts = [self.primary.summary()]
+        if self.fallback is not None:
+            parts.append(self.fallback.summary())
+            parts.append(f"failovers={self.failovers}")
+        return " ".join(parts)
+
+    def summary(self) -> str:
+        return "Circuit Breaker: " + self.status()
+
+
+class FailoverChatCompletionClient(WrappedChatCompletionClient):
+    """
+    Calls the wrapped client behind the primary breaker and the fallback client behind
+    the secondary one. Streams go through the same breakers and fail over as long as no
+    chunk has been yielded yet.
+    """
+
+    def __init__(self, inner: ChatCompletionClient, failover: Failover,
+                 fallback: Optional[ChatCompletionClient] = None):
+        super().__init__(inner)
+        self._failover = failover
+        self._fallback = fallback
+
+    async def create(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools: Sequence[Tool | ToolSchema] = [],
+        tool_choice: Tool | Literal["auto", "required", "none"] = "auto",
+        json_output: Optional[bool | type[BaseModel]] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> CreateResult:
+        kwargs = dict(
+            tools=tools, tool_choice=tool_choice, json_output=json_output,
+            extra_create_args=extra_create_args, cancellation_token=cancellation_token,
+        )
+        fallback_attempt = None
+        if self._fallback is not None:
+            fallback_attempt = lambda: self._fallback.create(messages, **kwargs)
+        return await self._failover.run(lambda: self._inner.create(messages, **kwargs), fallback_attempt)
+
+    async def create_stream(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools: Sequence[Tool | ToolSchema] = [],
+        tool_choice: Tool | Literal["auto", "required", "none"] = "auto",
+        json_output: Optional[bool | type[BaseModel]] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> AsyncGenerator[Union[str, CreateResult], None]:
+        kwargs = dict(
+            tools=tools, tool_choice=tool_choice, json_output=json_output,
+            extra_create_args=extra_create_args, cancellation_token=cancellation_token,
+        )
+        fallback_stream = None
+        if self._fallback is not None:
+            fallback_stream = lambda: self._fallback.create_stream(messages, **kwargs)
+        stream = self._failover.stream(lambda: self._inner.create_stream(messages, **kwargs), fallback_stream)
+        try:
+            async for chunk in stream:
+                yield chunk
+        finally:
+            await stream.aclose()
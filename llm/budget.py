@@ -0,0 +1,226 @@
+import atexit
+import json
+import math
+import os
+import threading
+from collections import defaultdict, deque
+from typing import Any, AsyncGenerator, Callable, Deque, Dict, Literal, Mapping, Optional, Sequence, Union
+
+from autogen_core import CancellationToken
+from autogen_core.models import ChatCompletionClient, CreateResult, LLMMessage
+from autogen_core.tools import Tool, ToolSchema
+from pydantic import BaseModel
+
+from llm.client import WrappedChatCompletionClient
+from llm.context import current_context
+
+
+class TokenBudget:
+    """
+    Per-prompt-type max_tokens learned from observed completion lengths.
+
+    The budget for a prompt is the `percentile` of its last `sample_size` completion
+    lengths times `headroom`, clamped to [min_tokens, max_tokens]. Until a prompt has
+    `min_samples` observations no budget is applied. A cap passed by the caller (e.g. a
+    batched request that needs more room) replaces `max_tokens`. Truncated completions are not
+    observed (their real length is unknown); the caller retries them with
+    `retry_budget`. Samples are persisted as JSON so budgets carry over between runs.
+
+    `max_tokens` only bounds the learned budget and its retries; it is not a hard limit
+    on agent replies, which are re-requested without max_tokens once the cap is cut off
+    too (`lifted`). An unreadable samples file is reported through `notify`.
+    """
+
+    def __init__(self, path: Optional[str] = None, enabled: bool = True, percentile: float = 0.99,
+                 headroom: float = 1.3, min_tokens: int = 256, max_tokens: int = 4096,
+                 min_samples: int = 10, sample_size: int = 200, save_every: int = 20,
+                 notify: Optional[Callable[[str], None]] = None):
+        self.path = path
+        self.enabled = enabled
+        self.percentile = percentile
+        self.headroom = headroom
+        self.min_tokens = min_tokens
+        self.max_tokens = max_tokens
+        self.min_samples = min_samples
+        self.save_every = save_every
+        self.notify = notify
+
+        self.budgeted = 0
+        self.truncated = 0
+        self.exhausted = 0
+        self.lifted = 0
+
+        self._lock = threading.Lock()
+        self._samples: Dict[str, Deque[int]] = defaultdict(lambda: deque(maxlen=sample_size))
+        self._unsaved = 0
+        self._load()
+
+    @classmethod
+    def from_env(cls, notify: Optional[Callable[[str], None]] = None) -> "TokenBudget":
+        budget = cls(
+            path=os.getenv("LLM_BUDGET_PATH", "../cache/token_budgets.json"),
+            enabled=os.getenv("LLM_BUDGET", "1") == "1",
+            percentile=float(os.getenv("LLM_BUDGET_PERCENTILE", "0.99")),
+            headroom=float(os.getenv("LLM_BUDGET_HEADROOM", "1.3")),
+            max_tokens=int(os.getenv("LLM_BUDGET_MAX_TOKENS", "4096")),
+            min_samples=int(os.getenv("LLM_BUDGET_MIN_SAMPLES", "10")),
+            notify=notify,
+        )
+        atexit.register(budget.save)
+        return budget
+
+    def _load(self):
+        if not self.enabled or not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            if self.notify:
+                self.notify(f"⚠️ Token budget file {self.path} ignored: {e}")
+            return
+        for prompt, lengths in data.get("samples", {}).items():
+            self._samples[prompt].extend(int(n) for n in lengths)
+
+    def save(self):
+        if not self.enabled or not self.path:
+            return
+        with self._lock:
+            if not self._samples:
+                return
+            data = {"samples": {prompt: list(lengths) for prompt, lengths in self._samples.items()}}
+            self._unsaved = 0
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp, self.path)
+
+    def _learned(self, prompt: str, cap: int) -> Optional[int]:
+        samples = self._samples.get(prompt)
+        if not samples or len(samples) < self.min_samples:
+            return None
+        ordered = sorted(samples)
+        p = ordered[min(len(ordered) - 1, int(self.percentile * len(ordered)))]
+        return max(self.min_tokens, min(cap, math.ceil(p * self.headroom)))
+
+    def budget(self, prompt: Optional[str], cap: Optional[int] = None) -> Optional[int]:
+        """max_tokens to send for `prompt`, or None while it is still being learned."""
+        if not self.enabled or prompt is None:
+            return None
+        budget = self._learned(prompt, cap or self.max_tokens)
+        if budget is not None:
+            self.budgeted += 1
+        return budget
+
+    def retry_budget(self, budget: int, cap: Optional[int] = None) -> Optional[int]:
+        """Next budget after a truncated completion, None once the cap has been tried."""
+        cap = cap or self.max_tokens
+        self.truncated += 1
+        if budget >= cap:
+            self.exhausted += 1
+            return None
+        return min(cap, budget * 2)
+
+    def observe(self, prompt: Optional[str], completion_tokens: Optional[int]):
+        if not self.enabled or prompt is None or not completion_tokens:
+            return
+        with self._lock:
+            self._samples[prompt].append(completion_tokens)
+            self._unsaved += 1
+            due = self._unsaved >= self.save_every
+        if due:
+            self.save()
+
+    def budgets(self) -> Dict[str, Optional[int]]:
+        return {prompt: self._learned(prompt, self.max_tokens) for prompt in sorted(self._samples)}
+
+    def summary(self) -> str:
+        if not self.enabled:
+            return "Token Budget: off"
+        learned = sum(1 for b in self.budgets().values() if b is not None)
+        return (
+            f"Token Budget: p{self.percentile * 100:g}x{self.headroom:g} learned={learned}/{len(self._samples)} prompts "
+            f"budgeted={self.budgeted} truncated={self.truncated} (at cap {self.exhausted}, uncapped {self.lifted})"
+        )
+
+
+class BudgetedChatCompletionClient(WrappedChatCompletionClient):
+    """
+    Sets max_tokens from the TokenBudget of the calling agent's prompt template
+    (CallContext.prompt) and retries truncated completions with a larger budget, and
+    once the cap is cut off too without max_tokens, as the call would have been sent
+    without a budget. Calls that already pass max_tokens are left alone.
+
+    A truncated stream cannot take back the chunks it has already yielded: its final
+    CreateResult is replaced by the complete reply of a non-streamed re-request.
+    """
+
+    def __init__(self, inner: ChatCompletionClient, budget: TokenBudget):
+        super().__init__(inner)
+        self._budget = budget
+
+    async def _request(self, messages: Sequence[LLMMessage], kwargs: Dict[str, Any],
+                       budget: Optional[int]) -> CreateResult:
+        create_args = dict(kwargs["extra_create_args"])
+        if budget is not None:
+            create_args["max_tokens"] = budget
+        return await super().create(messages, **{**kwargs, "extra_create_args": create_args})
+
+    async def _refit(self, messages: Sequence[LLMMessage], kwargs: Dict[str, Any],
+                     budget: Optional[int], result: CreateResult) -> CreateResult:
+        while budget is not None and result.finish_reason == "length":
+            budget = self._budget.retry_budget(budget)
+            if budget is None:
+                self._budget.lifted += 1
+            result = await self._request(messages, kwargs, budget)
+        return result
+
+    def _observe(self, prompt: Optional[str], result: CreateResult):
+        if not result.cached and result.finish_reason != "length" and result.usage:
+            self._budget.observe(prompt, result.usage.completion_tokens)
+
+    async def create(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools: Sequence[Tool | ToolSchema] = [],
+        tool_choice: Tool | Literal["auto", "required", "none"] = "auto",
+        json_output: Optional[bool | type[BaseModel]] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> CreateResult:
+        kwargs = dict(
+            tools=tools, tool_choice=tool_choice, json_output=json_output,
+            extra_create_args=extra_create_args, cancellation_token=cancellation_token,
+        )
+        prompt = current_context().prompt
+        budget = None if "max_tokens" in extra_create_args else self._budget.budget(prompt)
+        result = await self._refit(messages, kwargs, budget, await self._request(messages, kwargs, budget))
+        self._observe(prompt, result)
+        return result
+
+    async def create_stream(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools: Sequence[Tool | ToolSchema] = [],
+        tool_choice: Tool | Literal["auto", "required", "none"] = "auto",
+        json_output: Optional[bool | type[BaseModel]] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> AsyncGenerator[Union[str, CreateResult], None]:
+        kwargs = dict(
+            tools=tools, tool_choice=tool_choice, json_output=json_output,
+            extra_create_args=extra_create_args, cancellation_token=cancellation_token,
+        )
+        prompt = current_context().prompt
+        budget = None if "max_tokens" in extra_create_args else self._budget.budget(prompt)
+        create_args = dict(extra_create_args)
+        if budget is not None:
+            create_args["max_tokens"] = budget
+        async for chunk in super().create_stream(messages, **{**kwargs, "extra_create_args": create_args}):
+            if isinstance(chunk, CreateResult):
+                chunk = await self._refit(messages, kwargs, budget, chunk)
+                self._observe(prompt, chunk)
+            yield chunk
@@ -0,0 +1,284 @@
+import atexit
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, AsyncGenerator, Dict, Literal, Mapping, Optional, Sequence, Union
+
+from autogen_core import CancellationToken
+from autogen_core.models import ChatCompletionClient, CreateResult, LLMMessage
+from autogen_core.tools import Tool, ToolSchema
+from pydantic import BaseModel
+
+from llm.client import WrappedChatCompletionClient, describe_request, request_key
+
+CACHE_MODES = ("off", "readwrite", "replay")
+
+
+class ResponseCache:
+    """
+    Disk-backed, content-addressed store for LLM responses (sqlite).
+
+    mode:
+        off       -> never read or write
+        readwrite -> serve hits, store misses
+        replay    -> serve hits only, the cache file is never modified
+    Entries older than ttl seconds are treated as misses; once the store exceeds
+    max_entries / max_bytes the least recently used entries are evicted.
+
+    Hits run on the caller's thread (the event loop), so they only read: access times are
+    kept in memory and written in one transaction every `touch_batch` hits, before each
+    write / eviction and on close.
+    """
+
+    def __init__(self, path: str, mode: str = "off", max_entries: int = 20000,
+                 max_bytes: int = 512 * 1024 * 1024, ttl: Optional[float] = None, touch_batch: int = 64):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"Unknown cache mode: {mode} (expected one of {CACHE_MODES})")
+        self.path = path
+        self.mode = mode
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.touch_batch = touch_batch
+
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self.expired = 0
+
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._count = 0
+        self._bytes = 0
+        self._touched: Dict[str, float] = {}
+        self._touches = 0
+
+    @classmethod
+    def from_env(cls) -> "ResponseCache":
+        ttl_hours = float(os.getenv("LLM_CACHE_TTL_HOURS", "0"))
+        cache = cls(
+            path=os.getenv("LLM_CACHE_PATH", "../cache/llm_cache.sqlite"),
+            mode=os.getenv("LLM_CACHE_MODE", "off"),
+            max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", "20000")),
+            max_bytes=int(float(os.getenv("LLM_CACHE_MAX_MB", "512")) * 1024 * 1024),
+            ttl=ttl_hours * 3600 if ttl_hours > 0 else None,
+        )
+        atexit.register(cache.close)
+        return cache
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off"
+
+    @property
+    def writable(self) -> bool:
+        return self.mode == "readwrite"
+
+    def _connect(self) -> Optional[sqlite3.Connection]:
+        if self._conn is not None:
+            return self._conn
+        if not self.writable:
+            if not os.path.exists(self.path):
+                return None
+            # replay: open read-only so a run can never mutate a recorded cache
+            self._conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+        else:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+                "created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_accessed ON entries(accessed)")
+            self._conn.commit()
+        count, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        self._count, self._bytes = count, size
+        return self._conn
+
+    def get(self, key: str) -> Optional[str]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            conn = self._connect()
+            row = None
+            if conn is not None:
+                row = conn.execute("SELECT value, size, created FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            value, size, created = row
+            now = time.time()
+            if self.ttl is not None and now - created > self.ttl:
+                self.expired += 1
+                self.misses += 1
+                if self.writable:
+                    conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                    conn.commit()
+                    self._count -= 1
+                    self._bytes -= size
+                return None
+
+            if self.writable:
+                self._touched[key] = now
+                self._touches += 1
+                if self._touches >= self.touch_batch:
+                    self._flush_touched(conn)
+                    conn.commit()
+            self.hits += 1
+            return value
+
+    def _flush_touched(self, conn: sqlite3.Connection):
+        if self._touched:
+            conn.executemany("UPDATE entries SET accessed = ? WHERE key = ?",
+                             [(accessed, key) for key, accessed in self._touched.items()])
+            self._touched.clear()
+        self._touches = 0
+
+    def put(self, key: str, value: str):
+        if not self.writable:
+            return
+        size = len(value.encode("utf-8"))
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            old = conn.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, value, size, now, now),
+            )
+            if old is None:
+                self._count += 1
+            else:
+                self._bytes -= old[0]
+            self._bytes += size
+            self.writes += 1
+            self._touched.pop(key, None)
+            self._flush_touched(conn)
+            self._evict(conn)
+            conn.commit()
+
+    def _evict(self, conn: sqlite3.Connection):
+        while self._count > self.max_entries or (self._bytes > self.max_bytes and self._count > 1):
+            row = conn.execute("SELECT key, size FROM entries ORDER BY accessed ASC LIMIT 1").fetchone()
+            if row is None:
+                break
+            conn.execute("DELETE FROM entries WHERE key = ?", (row[0],))
+            self._count -= 1
+            self._bytes -= row[1]
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "mode": self.mode,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "writes": self.writes,
+            "evictions": self.evictions,
+            "expired": self.expired,
+            "entries": self._count,
+            "size_mb": self._bytes / (1024 * 1024),
+        }
+
+    def summary(self) -> str:
+        s = self.stats()
+        if not self.enabled:
+            return "LLM Cache: off"
+        return (
+            f"LLM Cache [{s['mode']}]: hits={s['hits']} misses={s['misses']} "
+            f"hit_rate={s['hit_rate']:.1%} writes={s['writes']} evictions={s['evictions']} "
+            f"expired={s['expired']} entries={s['entries']} ({s['size_mb']:.1f} MB)"
+        )
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                if self.writable:
+                    self._flush_touched(self._conn)
+                    self._conn.commit()
+                self._conn.close()
+                self._conn = None
+
+
+class CachedChatCompletionClient(WrappedChatCompletionClient):
+    """Serves repeated requests from a ResponseCache instead of the provider."""
+
+    def __init__(self, inner: ChatCompletionClient, cache: ResponseCache):
+        super().__init__(inner)
+        self._cache = cache
+
+    @staticmethod
+    def _cacheable(result: CreateResult) -> bool:
+        # truncated ("length") or filtered replies must be re-requested, not replayed from disk
+        return result.finish_reason in ("stop", "function_calls")
+
+    def _key(self, messages, tools, json_output, extra_create_args) -> str:
+        return request_key(describe_request(self._inner, messages, tools, json_output, extra_create_args))
+
+    def _lookup(self, key: str) -> Optional[CreateResult]:
+        value = self._cache.get(key)
+        if value is None:
+            return None
+        result = CreateResult.model_validate_json(value)
+        result.cached = True
+        return result
+
+    async def create(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools: Sequence[Tool | ToolSchema] = [],
+        tool_choice: Tool | Literal["auto", "required", "none"] = "auto",
+        json_output: Optional[bool | type[BaseModel]] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> CreateResult:
+        if not self._cache.enabled:
+            return await super().create(
+                messages, tools=tools, tool_choice=tool_choice, json_output=json_output,
+                extra_create_args=extra_create_args, cancellation_token=cancellation_token,
+            )
+
+        key = self._key(messages, tools, json_output, extra_create_args)
+        cached = self._lookup(key)
+        if cached is not None:
+            return cached
+
+        result = await super().create(
+            messages, tools=tools, tool_choice=tool_choice, json_output=json_output,
+            extra_create_args=extra_create_args, cancellation_token=cancellation_token,
+        )
+        if self._cacheable(result):
+            self._cache.put(key, result.model_dump_json())
+        return result
+
+    async def create_stream(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools: Sequence[Tool | ToolSchema] = [],
+        tool_choice: Tool | Literal["auto", "required", "none"] = "auto",
+        json_output: Optional[bool | type[BaseModel]] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> AsyncGenerator[Union[str, CreateResult], None]:
+        key = self._key(messages, tools, json_output, extra_create_args) if self._cache.enabled else None
+        cached = self._lookup(key) if key else None
+        if cached is not None:
+            if isinstance(cached.content, str):
+                yield cached.content
+            yield cached
+            return
+
+        async for chunk in super().create_stream(
+            messages, tools=tools, tool_choice=tool_choice, json_output=json_output,
+            extra_create_args=extra_create_args, cancellation_token=cancellation_token,
+        ):
+            if key and isinstance(chunk, CreateResult) and self._cacheable(chunk):
+                self._cache.put(key, chunk.model_dump_json())
+            yield chunk
@@ -0,0 +1,124 @@
+import hashlib
+import json
+from typing import Any, AsyncGenerator, Dict, Literal, Mapping, Optional, Sequence, Union
+
+from autogen_core import CancellationToken
+from autogen_core.models import (
+    ChatCompletionClient,
+    CreateResult,
+    LLMMessage,
+    ModelCapabilities,
+    ModelInfo,
+    RequestUsage,
+)
+from autogen_core.tools import Tool, ToolSchema
+from pydantic import BaseModel
+
+
+class WrappedChatCompletionClient(ChatCompletionClient):
+    """
+    Delegates every call to an inner ChatCompletionClient.
+    Subclasses override create / create_stream to add behaviour around the model call.
+    """
+
+    def __init__(self, inner: ChatCompletionClient):
+        self._inner = inner
+
+    @property
+    def inner(self) -> ChatCompletionClient:
+        return self._inner
+
+    async def create(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools: Sequence[Tool | ToolSchema] = [],
+        tool_choice: Tool | Literal["auto", "required", "none"] = "auto",
+        json_output: Optional[bool | type[BaseModel]] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> CreateResult:
+        return await self._inner.create(
+            messages,
+            tools=tools,
+            tool_choice=tool_choice,
+            json_output=json_output,
+            extra_create_args=extra_create_args,
+            cancellation_token=cancellation_token,
+        )
+
+    def create_stream(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools: Sequence[Tool | ToolSchema] = [],
+        tool_choice: Tool | Literal["auto", "required", "none"] = "auto",
+        json_output: Optional[bool | type[BaseModel]] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> AsyncGenerator[Union[str, CreateResult], None]:
+        return self._inner.create_stream(
+            messages,
+            tools=tools,
+            tool_choice=tool_choice,
+            json_output=json_output,
+            extra_create_args=extra_create_args,
+            cancellation_token=cancellation_token,
+        )
+
+    async def close(self) -> None:
+        await self._inner.close()
+
+    def actual_usage(self) -> RequestUsage:
+        return self._inner.actual_usage()
+
+    def total_usage(self) -> RequestUsage:
+        return self._inner.total_usage()
+
+    def count_tokens(self, messages: Sequence[LLMMessage], *, tools: Sequence[Tool | ToolSchema] = []) -> int:
+        return self._inner.count_tokens(messages, tools=tools)
+
+    def remaining_tokens(self, messages: Sequence[LLMMessage], *, tools: Sequence[Tool | ToolSchema] = []) -> int:
+        return self._inner.remaining_tokens(messages, tools=tools)
+
+    @property
+    def capabilities(self) -> ModelCapabilities:  # type: ignore[override]
+        return self._inner.capabilities
+
+    @property
+    def model_info(self) -> ModelInfo:
+        return self._inner.model_info
+
+
+def base_create_args(client: ChatCompletionClient) -> Dict[str, Any]:
+    """Fixed create args (model, temperature, response_format, ...) of the innermost OpenAI client."""
+    while isinstance(client, WrappedChatCompletionClient):
+        client = client.inner
+    return dict(getattr(client, "_create_args", {}))
+
+
+def describe_request(
+    client: ChatCompletionClient,
+    messages: Sequence[LLMMessage],
+    tools: Sequence[Tool | ToolSchema] = [],
+    json_output: Optional[bool | type[BaseModel]] = None,
+    extra_create_args: Mapping[str, Any] = {},
+) -> Dict[str, Any]:
+    """JSON-able description of a model request, used for cache keys and recordings."""
+    if isinstance(json_output, type) and issubclass(json_output, BaseModel):
+        schema: Any = json_output.model_json_schema()
+    else:
+        schema = json_output
+    return {
+        "create_args": base_create_args(client),
+        "messages": [m.model_dump(mode="json") for m in messages],
+        "tools": [t.schema if isinstance(t, Tool) else t for t in tools],
+        "schema": schema,
+        "extra_create_args": dict(extra_create_args),
+    }
+
+
+def request_key(payload: Mapping[str, Any]) -> str:
+    """Content address of a request description."""
+    raw = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
@@ -0,0 +1,268 @@
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Any, AsyncGenerator, Dict, Literal, Mapping, Optional, Sequence, Union
+
+from autogen_core import CancellationToken
+from autogen_core.models import ChatCompletionClient, CreateResult, LLMMessage
+from autogen_core.tools import Tool, ToolSchema
+from pydantic import BaseModel
+
+from llm.client import WrappedChatCompletionClient
+
+
+def is_overload_error(exc: BaseException) -> bool:
+    """429 / timeouts mean the provider is saturated, as opposed to a bad request."""
+    if isinstance(exc, (asyncio.TimeoutError, TimeoutError)):
+        return True
+    if getattr(exc, "status_code", None) == 429:
+        return True
+    name = type(exc).__name__
+    if name in ("RateLimitError", "APITimeoutError", "ReadTimeout", "ConnectTimeout", "PoolTimeout"):
+        return True
+    text = str(exc)
+    return "429" in text or "rate limit" in text.lower()
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    AIMD concurrency window shared by all phases.
+
+    - additive increase: every success with healthy latency adds `increase / window`,
+      i.e. roughly +increase per window's worth of requests
+    - multiplicative decrease: a 429 / timeout, or an error rate above
+      `error_rate_threshold` over the last `sample_size` calls, multiplies the window
+      by `decrease` (at most once per `cooldown` seconds, so a burst of failures from
+      requests that were already in flight counts as a single congestion event)
+
+    Latency is healthy when it stays under `latency_target` seconds or, without a target,
+    under `latency_tolerance` x the best latency observed so far.
+
+    Slots are taken per model request (ConcurrencyGatedClient / async_call_glm), never
+    around a whole team run, so `in_flight` is the number of requests on the wire.
+    """
+
+    def __init__(self, initial: int = 5, min_limit: int = 1, max_limit: int = 32,
+                 increase: float = 1.0, decrease: float = 0.5,
+                 latency_target: Optional[float] = None, latency_tolerance: float = 2.0,
+                 error_rate_threshold: float = 0.2, sample_size: int = 50, cooldown: float = 2.0):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_target = latency_target
+        self.latency_tolerance = latency_tolerance
+        self.error_rate_threshold = error_rate_threshold
+        self.cooldown = cooldown
+
+        self.window = float(max(min_limit, min(initial, max_limit)))
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.waiting = 0
+        self.peak_waiting = 0
+        self.acquired = 0
+        self.total_wait = 0.0
+        self.min_window = self.window
+        self.max_window = self.window
+
+        self.successes = 0
+        self.failures = 0
+        self.overloads = 0
+        self.increases = 0
+        self.decreases = 0
+        self._outcomes = deque(maxlen=sample_size)
+        self._best_latency: Optional[float] = None
+        self._last_decrease = 0.0
+        self._condition: Optional[asyncio.Condition] = None
+
+    @classmethod
+    def from_env(cls) -> "AdaptiveConcurrencyLimiter":
+        latency_target = float(os.getenv("LLM_LATENCY_TARGET", "0"))
+        return cls(
+            initial=int(os.getenv("LLM_CONCURRENCY_INITIAL", "5")),
+            min_limit=int(os.getenv("LLM_CONCURRENCY_MIN", "1")),
+            max_limit=int(os.getenv("LLM_CONCURRENCY_MAX", "32")),
+            latency_target=latency_target if latency_target > 0 else None,
+        )
+
+    @property
+    def limit(self) -> int:
+        return max(self.min_limit, int(self.window))
+
+    def _cond(self) -> asyncio.Condition:
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        return self._condition
+
+    async def acquire(self):
+        cond = self._cond()
+        start = time.perf_counter()
+        async with cond:
+            self.waiting += 1
+            self.peak_waiting = max(self.peak_waiting, self.waiting)
+            try:
+                await cond.wait_for(lambda: self.in_flight < self.limit)
+            finally:
+                self.waiting -= 1
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            self.acquired += 1
+            self.total_wait += time.perf_counter() - start
+
+    async def release(self):
+        cond = self._cond()
+        async with cond:
+            self.in_flight -= 1
+            cond.notify_all()
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.release()
+
+    def _latency_healthy(self, latency: float) -> bool:
+        if self._best_latency is None or latency < self._best_latency:
+            self._best_latency = latency
+        if self.latency_target is not None:
+            return latency <= self.latency_target
+        return latency <= self._best_latency * self.latency_tolerance
+
+    def _error_rate(self) -> float:
+        if not self._outcomes:
+            return 0.0
+        return self._outcomes.count(False) / len(self._outcomes)
+
+    def _set_window(self, window: float):
+        self.window = max(float(self.min_limit), min(float(self.max_limit), window))
+        self.min_window = min(self.min_window, self.window)
+        self.max_window = max(self.max_window, self.window)
+        if self._condition is not None:
+            # 窗口变大时唤醒等待者 (不在锁内, 交给事件循环调度)
+            try:
+                asyncio.get_running_loop().create_task(self._notify())
+            except RuntimeError:
+                pass
+
+    async def _notify(self):
+        cond = self._cond()
+        async with cond:
+            cond.notify_all()
+
+    def _backoff(self):
+        now = time.monotonic()
+        if now - self._last_decrease < self.cooldown:
+            return
+        self._last_decrease = now
+        self.decreases += 1
+        self._set_window(self.window * self.decrease)
+
+    def record_success(self, latency: float):
+        self.successes += 1
+        self._outcomes.append(True)
+        if self._latency_healthy(latency) and self._error_rate() <= self.error_rate_threshold:
+            if self.window < self.max_limit:
+                self.increases += 1
+                self._set_window(self.window + self.increase / self.window)
+
+    def record_failure(self, exc: BaseException):
+        self.failures += 1
+        self._outcomes.append(False)
+        if is_overload_error(exc):
+            self.overloads += 1
+            self._backoff()
+        elif len(self._outcomes) >= 10 and self._error_rate() > self.error_rate_threshold:
+            self._backoff()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "window": self.window,
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            "peak_waiting": self.peak_waiting,
+            "avg_wait": self.total_wait / self.acquired if self.acquired else 0.0,
+            "min_window": self.min_window,
+            "max_window": self.max_window,
+            "successes": self.successes,
+            "failures": self.failures,
+            "overloads": self.overloads,
+            "increases": self.increases,
+            "decreases": self.decreases,
+            "error_rate": self._error_rate(),
+        }
+
+    def summary(self) -> str:
+        s = self.stats()
+        return (
+            f"Concurrency: window={s['window']:.2f} (range {s['min_window']:.1f}-{s['max_window']:.1f}) "
+            f"in_flight={s['in_flight']} peak={s['peak_in_flight']} queued_peak={s['peak_waiting']} "
+            f"avg_wait={s['avg_wait']:.2f}s ok={s['successes']} "
+            f"errors={s['failures']} (429/timeout {s['overloads']}) backoffs={s['decreases']}"
+        )
+
+
+class ConcurrencyGatedClient(WrappedChatCompletionClient):
+    """
+    Holds a slot of the shared limiter while a request is on the wire and reports its
+    latency / failure back to it. Sits inside the rate limiter and the hedger, so neither
+    waiting for tokens nor a hedged duplicate holds a slot it is not using.
+    """
+
+    def __init__(self, inner: ChatCompletionClient, limiter: AdaptiveConcurrencyLimiter):
+        super().__init__(inner)
+        self._limiter = limiter
+
+    async def create(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools: Sequence[Tool | ToolSchema] = [],
+        tool_choice: Tool | Literal["auto", "required", "none"] = "auto",
+        json_output: Optional[bool | type[BaseModel]] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> CreateResult:
+        async with self._limiter:
+            start = time.perf_counter()
+            try:
+                result = await super().create(
+                    messages, tools=tools, tool_choice=tool_choice, json_output=json_output,
+                    extra_create_args=extra_create_args, cancellation_token=cancellation_token,
+                )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._limiter.record_failure(e)
+                raise
+        if not result.cached:
+            self._limiter.record_success(time.perf_counter() - start)
+        return result
+
+    async def create_stream(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools: Sequence[Tool | ToolSchema] = [],
+        tool_choice: Tool | Literal["auto", "required", "none"] = "auto",
+        json_output: Optional[bool | type[BaseModel]] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> AsyncGenerator[Union[str, CreateResult], None]:
+        async with self._limiter:
+            start = time.perf_counter()
+            try:
+                async for chunk in super().create_stream(
+                    messages, tools=tools, tool_choice=tool_choice, json_output=json_output,
+                    extra_create_args=extra_create_args, cancellation_token=cancellation_token,
+                ):
+                    if isinstance(chunk, CreateResult) and not chunk.cached:
+                        self._limiter.record_success(time.perf_counter() - start)
+                    yield chunk
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._limiter.record_failure(e)
+                raise
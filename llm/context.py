@@ -0,0 +1,67 @@
+import contextvars
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, replace
+from typing import Any, Dict, List, Optional
+
+
+@dataclass(frozen=True)
+class CallContext:
+    """Who is making the current model call; copied into every asyncio task it spawns."""
+    phase: Optional[str] = None
+    week: Optional[int] = None
+    company: Optional[str] = None
+    agent: Optional[str] = None
+    prompt: Optional[str] = None
+
+    def as_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+_CALL_CONTEXT: contextvars.ContextVar[CallContext] = contextvars.ContextVar("llm_call_context", default=CallContext())
+
+_WIRE_TIMEOUT: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("llm_wire_timeout", default=None)
+
+# phases currently inside a call_context block, innermost last; readable from other threads
+_ACTIVE_PHASES: List[str] = []
+
+
+def current_context() -> CallContext:
+    return _CALL_CONTEXT.get()
+
+
+def update_call_context(**fields) -> contextvars.Token:
+    """Overwrites fields for the rest of the current task (e.g. the week in a simulation loop)."""
+    return _CALL_CONTEXT.set(replace(_CALL_CONTEXT.get(), **fields))
+
+
+def active_phase() -> Optional[str]:
+    """Process-wide: the phase most recently entered with call_context that has not exited yet."""
+    return _ACTIVE_PHASES[-1] if _ACTIVE_PHASES else None
+
+
+def wire_timeout() -> Optional[float]:
+    """Timeout of the retry attempt in progress, applied by the breaker to the request on the wire only."""
+    return _WIRE_TIMEOUT.get()
+
+
+@contextmanager
+def attempt_timeout(seconds: Optional[float]):
+    token = _WIRE_TIMEOUT.set(seconds)
+    try:
+        yield
+    finally:
+        _WIRE_TIMEOUT.reset(token)
+
+
+@contextmanager
+def call_context(**fields):
+    token = update_call_context(**{k: v for k, v in fields.items() if v is not None})
+    phase = fields.get("phase")
+    if phase:
+        _ACTIVE_PHASES.append(phase)
+    try:
+        yield _CALL_CONTEXT.get()
+    finally:
+        _CALL_CONTEXT.reset(token)
+        if phase:
+            _ACTIVE_PHASES.remove(phase)
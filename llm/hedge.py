@@ -0,0 +1,160 @@
+import asyncio
+import os
+import time
+from collections import defaultdict, deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Literal, Mapping, Optional, Sequence, TypeVar
+
+from autogen_core import CancellationToken
+from autogen_core.models import ChatCompletionClient, CreateResult, LLMMessage
+from autogen_core.tools import Tool, ToolSchema
+from pydantic import BaseModel
+
+from llm.client import WrappedChatCompletionClient
+
+T = TypeVar("T")
+
+
+class Hedger:
+    """
+    Hedged requests: when a call is still running after the `percentile` latency
+    observed for its route, a duplicate is fired and whichever finishes first wins;
+    the other one is cancelled.
+
+    - latency samples are kept per route (text agents, JSON agents, async_call_glm)
+    - no hedging until a route has `min_samples` successful calls
+    - hedges are capped at `max_extra_ratio` x primary calls, so a slow provider
+      costs at most that much extra traffic
+    - if the first attempt to finish failed, the other one is still awaited
+    """
+
+    def __init__(self, enabled: bool = False, percentile: float = 0.95, max_extra_ratio: float = 0.1,
+                 min_samples: int = 20, min_delay: float = 1.0, sample_size: int = 200):
+        self.enabled = enabled
+        self.percentile = percentile
+        self.max_extra_ratio = max_extra_ratio
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+
+        self.calls = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.primary_wins = 0
+        self.skipped_budget = 0
+        self._latencies: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=sample_size))
+
+    @classmethod
+    def from_env(cls) -> "Hedger":
+        return cls(
+            enabled=os.getenv("LLM_HEDGE", "0") == "1",
+            percentile=float(os.getenv("LLM_HEDGE_PERCENTILE", "0.95")),
+            max_extra_ratio=float(os.getenv("LLM_HEDGE_MAX_RATIO", "0.1")),
+            min_samples=int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20")),
+            min_delay=float(os.getenv("LLM_HEDGE_MIN_DELAY", "1.0")),
+        )
+
+    def hedge_delay(self, route: str) -> Optional[float]:
+        samples = self._latencies[route]
+        if len(samples) < self.min_samples:
+            return None
+        ordered = sorted(samples)
+        index = min(len(ordered) - 1, int(self.percentile * len(ordered)))
+        return max(self.min_delay, ordered[index])
+
+    def _within_budget(self) -> bool:
+        return self.hedged < self.max_extra_ratio * self.calls
+
+    async def run(self, attempt: Callable[[], Awaitable[T]], route: str = "default") -> T:
+        if not self.enabled:
+            return await attempt()
+
+        self.calls += 1
+        start = time.perf_counter()
+        delay = self.hedge_delay(route)
+        primary = asyncio.ensure_future(attempt())
+        hedge: Optional[asyncio.Future] = None
+        if delay is None:
+            result = await primary
+            self._latencies[route].append(time.perf_counter() - start)
+            return result
+
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+            if done:
+                result = primary.result()
+                self._latencies[route].append(time.perf_counter() - start)
+                return result
+            if not self._within_budget():
+                self.skipped_budget += 1
+                result = await primary
+                self._latencies[route].append(time.perf_counter() - start)
+                return result
+
+            self.hedged += 1
+            hedge = asyncio.ensure_future(attempt())
+            pending = {primary, hedge}
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        error = task.exception()
+                        continue
+                    if task is hedge:
+                        self.hedge_wins += 1
+                    else:
+                        self.primary_wins += 1
+                    # 被取消的主请求至少耗时这么久, 作为样本保留长尾
+                    self._latencies[route].append(time.perf_counter() - start)
+                    return task.result()
+            raise error
+        finally:
+            for task in (primary, hedge):
+                if task is not None and not task.done():
+                    task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "primary_wins": self.primary_wins,
+            "skipped_budget": self.skipped_budget,
+            "delays": {route: self.hedge_delay(route) for route in self._latencies},
+        }
+
+    def summary(self) -> str:
+        if not self.enabled:
+            return "Hedging: off"
+        s = self.stats()
+        delays = " ".join(f"{route}={d:.1f}s" for route, d in s["delays"].items() if d is not None) or "warming up"
+        return (
+            f"Hedging: p{self.percentile * 100:g} [{delays}] calls={s['calls']} hedged={s['hedged']} "
+            f"(hedge won {s['hedge_wins']}, primary won {s['primary_wins']}, over budget {s['skipped_budget']})"
+        )
+
+
+class HedgedChatCompletionClient(WrappedChatCompletionClient):
+    """Hedges `create`; streams are passed through untouched."""
+
+    def __init__(self, inner: ChatCompletionClient, hedger: Hedger, route: str):
+        super().__init__(inner)
+        self._hedger = hedger
+        self._route = route
+
+    async def create(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools: Sequence[Tool | ToolSchema] = [],
+        tool_choice: Tool | Literal["auto", "required", "none"] = "auto",
+        json_output: Optional[bool | type[BaseModel]] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> CreateResult:
+        return await self._hedger.run(
+            lambda: super(HedgedChatCompletionClient, self).create(
+                messages, tools=tools, tool_choice=tool_choice, json_output=json_output,
+                extra_create_args=extra_create_args, cancellation_token=cancellation_token,
+            ),
+            route=self._route,
+        )
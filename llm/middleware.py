@@ -0,0 +1,202 @@
+import os
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+from typing import Any, AsyncGenerator, Callable, Dict, List, Literal, Mapping, Optional, Sequence, Tuple, Union
+
+from autogen_core import CancellationToken
+from autogen_core.models import ChatCompletionClient, CreateResult, LLMMessage
+from autogen_core.tools import Tool, ToolSchema
+from pydantic import BaseModel
+
+from llm.client import WrappedChatCompletionClient
+
+# factory(inner, route, json_output) -> client wrapping `inner`
+LayerFactory = Callable[..., ChatCompletionClient]
+
+# name under which the unwrapped provider client is timed
+MODEL_LAYER = "model"
+
+# (start, end) of every timed call made directly below the layer currently running
+_CHILD_SPANS: ContextVar[Optional[List[Tuple[float, float]]]] = ContextVar("llm_layer_child_spans", default=None)
+
+
+def _covered(spans: List[Tuple[float, float]]) -> float:
+    """Length of the union of `spans` (hedged duplicates overlap)."""
+    total, reached = 0.0, float("-inf")
+    for start, end in sorted(spans):
+        if end > reached:
+            total += end - max(start, reached)
+            reached = end
+    return total
+
+
+class LayerTimer:
+    """
+    Cumulative time spent inside each layer (the layer plus everything it wraps) and the
+    time it adds itself: per call, its wall time minus the time covered by the calls it
+    made to the layer below. A layer that calls down several times (retries, budget
+    refits, hedged duplicates) is only charged for the gaps between them, so queueing in
+    a limiter or a backoff sleep shows up on the layer that caused it.
+    """
+
+    def __init__(self):
+        self._stats: Dict[str, Dict[str, float]] = defaultdict(
+            lambda: {"calls": 0, "errors": 0, "time": 0.0, "self": 0.0}
+        )
+
+    def record(self, name: str, elapsed: float, own: float, ok: bool):
+        s = self._stats[name]
+        s["calls"] += 1
+        s["time"] += elapsed
+        s["self"] += own
+        if not ok:
+            s["errors"] += 1
+
+    def report(self, order: Sequence[str]) -> Dict[str, Dict[str, float]]:
+        """Per layer, outermost first: calls, errors, avg total and avg self time (seconds)."""
+        report = {}
+        for name in order:
+            s = self._stats.get(name)
+            if not s or not s["calls"]:
+                continue
+            report[name] = {
+                "calls": s["calls"],
+                "errors": s["errors"],
+                "avg_total": s["time"] / s["calls"],
+                "avg_self": s["self"] / s["calls"],
+            }
+        return report
+
+
+class TimedLayerClient(WrappedChatCompletionClient):
+    """Records the wall time of every create / create_stream under `name`."""
+
+    def __init__(self, inner: ChatCompletionClient, timer: LayerTimer, name: str):
+        super().__init__(inner)
+        self._timer = timer
+        self._name = name
+
+    def _enter(self) -> Tuple[Optional[List[Tuple[float, float]]], List[Tuple[float, float]], float]:
+        parent = _CHILD_SPANS.get()
+        spans: List[Tuple[float, float]] = []
+        _CHILD_SPANS.set(spans)
+        return parent, spans, time.perf_counter()
+
+    def _exit(self, parent: Optional[List[Tuple[float, float]]], spans: List[Tuple[float, float]],
+              start: float, ok: bool):
+        end = time.perf_counter()
+        # set rather than reset: a stream may be finalized outside the context it started in
+        _CHILD_SPANS.set(parent)
+        if parent is not None:
+            parent.append((start, end))
+        self._timer.record(self._name, end - start, end - start - _covered(spans), ok)
+
+    async def create(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools: Sequence[Tool | ToolSchema] = [],
+        tool_choice: Tool | Literal["auto", "required", "none"] = "auto",
+        json_output: Optional[bool | type[BaseModel]] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> CreateResult:
+        parent, spans, start = self._enter()
+        ok = False
+        try:
+            result = await super().create(
+                messages, tools=tools, tool_choice=tool_choice, json_output=json_output,
+                extra_create_args=extra_create_args, cancellation_token=cancellation_token,
+            )
+            ok = True
+            return result
+        finally:
+            self._exit(parent, spans, start, ok)
+
+    async def create_stream(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools: Sequence[Tool | ToolSchema] = [],
+        tool_choice: Tool | Literal["auto", "required", "none"] = "auto",
+        json_output: Optional[bool | type[BaseModel]] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> AsyncGenerator[Union[str, CreateResult], None]:
+        parent, spans, start = self._enter()
+        ok = False
+        try:
+            async for chunk in super().create_stream(
+                messages, tools=tools, tool_choice=tool_choice, json_output=json_output,
+                extra_create_args=extra_create_args, cancellation_token=cancellation_token,
+            ):
+                yield chunk
+            ok = True
+        except GeneratorExit:
+            # 上层提前结束流 (例如 JsonCutoffClient 在 JSON 闭合后断开) 不算错误
+            ok = True
+            raise
+        finally:
+            self._exit(parent, spans, start, ok)
+
+
+class MiddlewareStack:
+    """
+    An ordered chain of client layers declared by name (outermost first), e.g.
+    configs/models.py MIDDLEWARE_LAYERS or LLM_MIDDLEWARE=usage,cache,retry,failover.
+    `build(raw, *args)` wraps a provider client in every layer, calling
+    `factories[name](inner, *args)` from the innermost layer out; with `timing` each
+    layer (and the provider client itself, as "model") is wrapped in a TimedLayerClient.
+    """
+
+    def __init__(self, layers: Sequence[str], factories: Mapping[str, LayerFactory], timing: bool = True):
+        unknown = [name for name in layers if name not in factories]
+        if unknown:
+            raise ValueError(f"Unknown middleware layer(s) {unknown}; available: {sorted(factories)}")
+        if len(set(layers)) != len(layers):
+            raise ValueError(f"Middleware layers listed twice: {list(layers)}")
+        self.layers = list(layers)
+        self.factories = dict(factories)
+        self.timer = LayerTimer() if timing else None
+
+    @classmethod
+    def from_env(cls, layers: Sequence[str], factories: Mapping[str, LayerFactory]) -> "MiddlewareStack":
+        override = os.getenv("LLM_MIDDLEWARE", "")
+        if override:
+            layers = [name.strip() for name in override.split(",") if name.strip()]
+        return cls(layers, factories, timing=os.getenv("LLM_MIDDLEWARE_TIMING", "1") == "1")
+
+    def build(self, raw: ChatCompletionClient, *args) -> ChatCompletionClient:
+        client = raw
+        if self.timer is not None:
+            client = TimedLayerClient(client, self.timer, MODEL_LAYER)
+        for name in reversed(self.layers):
+            client = self.factories[name](client, *args)
+            if self.timer is not None:
+                client = TimedLayerClient(client, self.timer, name)
+        return client
+
+    def report(self) -> Dict[str, Dict[str, float]]:
+        if self.timer is None:
+            return {}
+        return self.timer.report(self.layers + [MODEL_LAYER])
+
+    def log_report(self, logger):
+        columns = ["Layer", "Calls", "Errors", "Avg Total", "Avg Self"]
+        rows = [
+            [name, r["calls"], r["errors"], f"{r['avg_total'] * 1000:.1f}ms", f"{r['avg_self'] * 1000:.1f}ms"]
+            for name, r in self.report().items()
+        ]
+        if rows:
+            logger.log_table("Middleware Latency", columns, rows)
+
+    def summary(self) -> str:
+        if self.timer is None:
+            return f"Middleware: {' > '.join(self.layers)} (timing off)"
+        report = self.report()
+        if not report:
+            return f"Middleware: {' > '.join(self.layers)}"
+        return "Middleware (avg self time): " + " ".join(
+            f"{name}={r['avg_self'] * 1000:.1f}ms" for name, r in report.items()
+        )
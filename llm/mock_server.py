@@ -0,0 +1,436 @@
+"""
+Local OpenAI-compatible stand-in for the GLM chat-completions endpoint.
+
+Used for offline load testing of the whole pipeline:
+
+    python llm/mock_server.py --port 8000 --latency lognormal:0.0,0.5 --rate_limit_rate 0.02
+    GLM_BASE_URL=http://127.0.0.1:8000/api/paas/v4/ python simulation/simulation_single.py
+
+JSON requests (response_format = json_object) get a schema-valid CompanyInfo,
+CompanyRefreshInfo, ActiveProject, ProducerDecision, ProducerProposal or DemanderReview,
+chosen from the field names in the system prompt; everything else gets filler text.
+Batched INIT requests (CompanyInfoBatch) get one item per 【企业 #n】 block in the prompt,
+with --batch_drop_rate of the items left out to exercise the single-call fallback.
+Other JSON requests that carry a JSON Schema in the system prompt (e.g. the follow-ups of
+llm/repair.py) are answered from that schema; --field_drop_rate leaves one field out of
+structured replies to exercise the repair step; --trailing_chars appends commentary after
+structured replies, the way chat models often do, to exercise the streaming cut-off.
+"""
+import argparse
+import json
+import math
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from enum import Enum
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pydantic import BaseModel
+
+from configs.roles import (
+    ActiveProject,
+    CompanyInfo,
+    CompanyInfoBatch,
+    CompanyRefreshInfo,
+    DemanderReview,
+    ProducerDecision,
+    ProducerProposal,
+)
+from llm.tokens import estimate_chat_tokens, estimate_tokens
+
+# (系统提示词中出现的字段, 对应的输出结构), 按顺序匹配
+SHAPE_MARKERS: List[Tuple[Tuple[str, ...], type[BaseModel]]] = [
+    (("companies", "index"), CompanyInfoBatch),
+    (("overall_satisfaction",), DemanderReview),
+    (("technical_design",), ProducerProposal),
+    (("decision",), ProducerDecision),
+    (("project_content",), ActiveProject),
+    (("tags", "strategy_content"), CompanyInfo),
+    (("strategy_content",), CompanyRefreshInfo),
+]
+
+BATCH_ITEM_RE = re.compile(r"【企业 #(\d+)】")
+
+FILLER = (
+    "基于当前市场环境与企业战略，我们建议分阶段推进项目，优先交付核心功能，"
+    "同时控制成本与技术风险，确保团队资源与交付周期相匹配。"
+)
+
+
+class LatencyModel:
+    """
+    Parses latency specs such as
+        constant:0.5 | uniform:0.2,1.5 | lognormal:<mu>,<sigma> | exponential:<mean>
+    (seconds; lognormal median is e^mu) plus an optional per-output-token cost.
+    """
+
+    def __init__(self, spec: str = "constant:0", per_token_ms: float = 0.0, rng: Optional[random.Random] = None):
+        kind, _, args = spec.partition(":")
+        self.kind = kind
+        self.args = [float(a) for a in args.split(",") if a]
+        self.per_token = per_token_ms / 1000.0
+        self.rng = rng or random.Random()
+        if kind not in ("constant", "uniform", "lognormal", "exponential"):
+            raise ValueError(f"Unknown latency distribution: {spec}")
+
+    def sample(self, completion_tokens: int = 0) -> float:
+        a = self.args
+        if self.kind == "constant":
+            base = a[0] if a else 0.0
+        elif self.kind == "uniform":
+            base = self.rng.uniform(a[0], a[1])
+        elif self.kind == "lognormal":
+            base = self.rng.lognormvariate(a[0], a[1])
+        else:
+            base = self.rng.expovariate(1.0 / a[0]) if a and a[0] > 0 else 0.0
+        return max(0.0, base) + completion_tokens * self.per_token
+
+
+class MockBehaviour:
+    def __init__(self, latency: LatencyModel, error_rate: float = 0.0, rate_limit_rate: float = 0.0,
+                 rpm: float = 0.0, accept_rate: float = 0.7, text_chars: int = 300, seed: Optional[int] = None,
+                 batch_drop_rate: float = 0.0, field_drop_rate: float = 0.0, trailing_chars: int = 0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.rpm = rpm
+        self.accept_rate = accept_rate
+        self.text_chars = text_chars
+        self.batch_drop_rate = batch_drop_rate
+        self.field_drop_rate = field_drop_rate
+        self.trailing_chars = trailing_chars
+        self.rng = random.Random(seed)
+
+        self.lock = threading.Lock()
+        self.window: List[float] = []
+        self.counters: Dict[str, int] = {"requests": 0, "ok": 0, "errors_500": 0, "rate_limited_429": 0}
+        self.shapes: Dict[str, int] = {}
+        self.latency_total = 0.0
+        self.started = time.time()
+
+    def admit(self) -> Optional[int]:
+        """Returns an HTTP error status to inject, or None to serve the request."""
+        with self.lock:
+            self.counters["requests"] += 1
+            now = time.monotonic()
+            if self.rpm > 0:
+                self.window = [t for t in self.window if now - t < 60.0]
+                if len(self.window) >= self.rpm:
+                    self.counters["rate_limited_429"] += 1
+                    return 429
+                self.window.append(now)
+            roll = self.rng.random()
+            if roll < self.rate_limit_rate:
+                self.counters["rate_limited_429"] += 1
+                return 429
+            if roll < self.rate_limit_rate + self.error_rate:
+                self.counters["errors_500"] += 1
+                return 500
+        return None
+
+    def record(self, shape: str, latency: float):
+        with self.lock:
+            self.counters["ok"] += 1
+            self.shapes[shape] = self.shapes.get(shape, 0) + 1
+            self.latency_total += latency
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            elapsed = time.time() - self.started
+            ok = self.counters["ok"]
+            return {
+                **self.counters,
+                "shapes": dict(self.shapes),
+                "avg_latency": self.latency_total / ok if ok else 0.0,
+                "uptime": elapsed,
+                "throughput_rps": ok / elapsed if elapsed > 0 else 0.0,
+            }
+
+    # ------------------------------------------------------------------
+    # Content generation
+    # ------------------------------------------------------------------
+    def text(self, chars: Optional[int] = None) -> str:
+        chars = chars or self.text_chars
+        return (FILLER * (chars // len(FILLER) + 1))[:chars]
+
+    def _value(self, name: str, prop: Dict[str, Any], defs: Dict[str, Any]) -> Any:
+        if "$ref" in prop:
+            prop = defs[prop["$ref"].split("/")[-1]]
+        if "allOf" in prop:
+            return self._value(name, prop["allOf"][0], defs)
+        if "enum" in prop:
+            return self.rng.choice(prop["enum"])
+
+        if name == "decision":
+            return "ACCEPT" if self.rng.random() < self.accept_rate else "REJECT"
+        if name == "overall_satisfaction":
+            if self.rng.random() < self.accept_rate:
+                return "accepted"
+            return self.rng.choice(["needs_minor_revision", "needs_major_revision"])
+        if name == "project_id":
+            return f"mock_{uuid.uuid4().hex[:8]}"
+        if name == "weeks":
+            return self.rng.randint(5, 20)
+
+        kind = prop.get("type")
+        if kind == "integer":
+            return self.rng.randint(1, 10)
+        if kind == "number":
+            return round(self.rng.uniform(0, 10), 2)
+        if kind == "boolean":
+            return self.rng.random() < 0.5
+        if kind == "array":
+            return [f"{name}_{i + 1}" for i in range(self.rng.randint(2, 4))]
+        return self.text(self.rng.randint(self.text_chars // 3, self.text_chars))
+
+    def from_schema(self, schema: Dict[str, Any]) -> Dict[str, Any]:
+        defs = schema.get("$defs", {})
+        return {name: self._value(name, prop, defs) for name, prop in schema.get("properties", {}).items()}
+
+    def structured(self, model: type[BaseModel], drop_fields: bool = False) -> str:
+        instance = model.model_validate(self.from_schema(model.model_json_schema()))
+        data = json.loads(instance.model_dump_json())
+        if drop_fields and len(data) > 1 and self.rng.random() < self.field_drop_rate:
+            data.pop(self.rng.choice(list(data)))
+        return json.dumps(data, ensure_ascii=False)
+
+    def company_batch(self, indices: List[int]) -> str:
+        items = [
+            {"index": index, **json.loads(self.structured(CompanyInfo))}
+            for index in indices if self.rng.random() >= self.batch_drop_rate
+        ]
+        return json.dumps({"companies": items}, ensure_ascii=False)
+
+
+def detect_shape(messages: List[Dict[str, Any]]) -> Optional[type[BaseModel]]:
+    system = "\n".join(str(m.get("content") or "") for m in messages if m.get("role") == "system")
+    for markers, model in SHAPE_MARKERS:
+        if all(f'"{m}"' in system or f"{m}:" in system for m in markers):
+            return model
+    return None
+
+
+def schema_in_prompt(messages: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """The JSON Schema appended by api.call_glm / async_call_glm, if any."""
+    system = "\n".join(str(m.get("content") or "") for m in messages if m.get("role") == "system")
+    marker = system.find("JSON Schema")
+    brace = system.find("{", marker) if marker >= 0 else -1
+    if brace < 0:
+        return None
+    try:
+        schema, _ = json.JSONDecoder().raw_decode(system[brace:])
+    except ValueError:
+        return None
+    return schema if isinstance(schema, dict) and "properties" in schema else None
+
+
+def build_completion(behaviour: MockBehaviour, body: Dict[str, Any]) -> Tuple[str, str, str, Dict[str, int]]:
+    messages = body.get("messages", [])
+    wants_json = (body.get("response_format") or {}).get("type") == "json_object"
+    model = detect_shape(messages) if wants_json else None
+    if model is CompanyInfoBatch:
+        prompt = "\n".join(str(m.get("content") or "") for m in messages if m.get("role") == "user")
+        content, shape = behaviour.company_batch([int(i) for i in BATCH_ITEM_RE.findall(prompt)]), model.__name__
+    elif model is not None:
+        content, shape = behaviour.structured(model, drop_fields=True), model.__name__
+        if behaviour.trailing_chars:
+            content += "\n\n" + behaviour.text(behaviour.trailing_chars)
+    elif wants_json and schema_in_prompt(messages) is not None:
+        schema = schema_in_prompt(messages)
+        content, shape = json.dumps(behaviour.from_schema(schema), ensure_ascii=False), schema.get("title", "schema")
+    elif wants_json:
+        content, shape = json.dumps({"result": behaviour.text()}, ensure_ascii=False), "json"
+    else:
+        content, shape = behaviour.text(), "text"
+
+    finish_reason = "stop"
+    completion_tokens = estimate_tokens(content)
+    max_tokens = body.get("max_tokens")
+    if max_tokens and completion_tokens > max_tokens:
+        content = content[: int(len(content) * max_tokens / completion_tokens)]
+        completion_tokens = max_tokens
+        finish_reason = "length"
+
+    prompt_tokens = estimate_chat_tokens(messages)
+    usage = {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
+    return content, shape, finish_reason, usage
+
+
+class MockGLMHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    behaviour: MockBehaviour = None  # set by make_server
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/stats"):
+            self._send_json(200, self.behaviour.stats())
+        else:
+            self._send_json(404, {"error": {"message": "not found"}})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", "0"))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": f"unknown path {self.path}"}})
+            return
+
+        status = self.behaviour.admit()
+        if status == 429:
+            self._send_json(429, {"error": {"code": "1302", "message": "mock rate limit"}}, {"Retry-After": "1"})
+            return
+        if status == 500:
+            self._send_json(500, {"error": {"code": "500", "message": "mock internal error"}})
+            return
+
+        content, shape, finish_reason, usage = build_completion(self.behaviour, body)
+        latency = self.behaviour.latency.sample(usage["completion_tokens"])
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        model = body.get("model", "glm-4.5")
+
+        if body.get("stream"):
+            self._stream(completion_id, model, content, finish_reason, usage, latency, body)
+        else:
+            time.sleep(latency)
+            self._send_json(200, {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": finish_reason,
+                }],
+                "usage": usage,
+            })
+        self.behaviour.record(shape, latency)
+
+    def _stream(self, completion_id, model, content, finish_reason, usage, latency, body):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        pieces = [content[i:i + 8] for i in range(0, len(content), 8)] or [""]
+        # 首 token 前等待一半延迟, 其余均摊到每个分片
+        time.sleep(latency / 2)
+        per_piece = (latency / 2) / len(pieces)
+
+        def send(payload):
+            self.wfile.write(f"data: {json.dumps(payload, ensure_ascii=False)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        base = {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()), "model": model}
+        try:
+            for i, piece in enumerate(pieces):
+                delta = {"content": piece}
+                if i == 0:
+                    delta["role"] = "assistant"
+                send({**base, "choices": [{"index": 0, "delta": delta, "finish_reason": None}]})
+                time.sleep(per_piece)
+            send({**base, "choices": [{"index": 0, "delta": {}, "finish_reason": finish_reason}]})
+            if (body.get("stream_options") or {}).get("include_usage"):
+                send({**base, "choices": [], "usage": usage})
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # 客户端提前断开 (例如 JSON 已完整后主动取消)
+            pass
+
+
+def make_server(host: str, port: int, behaviour: MockBehaviour) -> ThreadingHTTPServer:
+    handler = type("BoundMockGLMHandler", (MockGLMHandler,), {"behaviour": behaviour})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def generate_companies(n: int, seed: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Synthetic companies_info.json records for load tests."""
+    rng = random.Random(seed)
+    sectors = ["人工智能", "电商平台", "物流", "金融科技", "在线教育", "医疗健康", "智能制造", "网络安全"]
+    records = []
+    for i in range(n):
+        sector = rng.choice(sectors)
+        records.append({
+            "id": f"mock_{i:05d}",
+            "公司名称": f"{sector}样例公司{i}",
+            "公司介绍": f"一家专注于{sector}领域的企业。" + FILLER,
+            "产品服务": f"{sector}相关的产品与技术服务。",
+        })
+    return records
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Local OpenAI-compatible GLM stand-in for load testing")
+    parser.add_argument('--host', type=str, default="127.0.0.1")
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--latency', type=str, default="lognormal:0.0,0.5",
+                        help='constant:<s> | uniform:<lo>,<hi> | lognormal:<mu>,<sigma> | exponential:<mean>')
+    parser.add_argument('--per_token_ms', type=float, default=0.0, help='Extra latency per completion token')
+    parser.add_argument('--error_rate', type=float, default=0.0, help='Fraction of requests answered with HTTP 500')
+    parser.add_argument('--rate_limit_rate', type=float, default=0.0, help='Fraction of requests answered with HTTP 429')
+    parser.add_argument('--rpm', type=float, default=0.0, help='Hard requests-per-minute cap before returning 429 (0 = off)')
+    parser.add_argument('--accept_rate', type=float, default=0.7, help='Probability of ACCEPT / accepted decisions')
+    parser.add_argument('--text_chars', type=int, default=300, help='Length of generated free-text replies')
+    parser.add_argument('--batch_drop_rate', type=float, default=0.0, help='Fraction of items left out of batched INIT replies')
+    parser.add_argument('--field_drop_rate', type=float, default=0.0, help='Fraction of structured replies missing one field')
+    parser.add_argument('--trailing_chars', type=int, default=0, help='Commentary appended after structured replies')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--gen_companies', type=int, default=0, help='Write N synthetic companies to --out and exit')
+    parser.add_argument('--out', type=str, default="../data/companies_mock.json")
+    args = parser.parse_args()
+
+    if args.gen_companies:
+        os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(generate_companies(args.gen_companies, args.seed), f, ensure_ascii=False, indent=2)
+        print(f"📁 {args.gen_companies} companies written to {args.out}")
+        sys.exit(0)
+
+    behaviour = MockBehaviour(
+        latency=LatencyModel(args.latency, args.per_token_ms, random.Random(args.seed)),
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        rpm=args.rpm,
+        accept_rate=args.accept_rate,
+        text_chars=args.text_chars,
+        seed=args.seed,
+        batch_drop_rate=args.batch_drop_rate,
+        field_drop_rate=args.field_drop_rate,
+        trailing_chars=args.trailing_chars,
+    )
+    server = make_server(args.host, args.port, behaviour)
+    print(f"🧪 Mock GLM listening on http://{args.host}:{args.port}/api/paas/v4/ (stats: /stats)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(json.dumps(behaviour.stats(), ensure_ascii=False, indent=2))
@@ -0,0 +1,193 @@
+from collections import defaultdict
+from typing import Any, AsyncGenerator, Callable, Dict, List, Literal, Mapping, Optional, Sequence, Union
+
+from autogen_core import CancellationToken
+from autogen_core.models import ChatCompletionClient, CreateResult, LLMMessage, SystemMessage
+from autogen_core.tools import Tool, ToolSchema
+from pydantic import BaseModel
+
+from llm.client import WrappedChatCompletionClient
+from llm.context import current_context
+from llm.tokens import MESSAGE_OVERHEAD_TOKENS, estimate_tokens
+
+ELISION = "\n……(已省略 {} 字)……\n"
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Keeps the head (2/3) and tail (1/3) of `text` so that it fits in about `max_tokens`."""
+    tokens = estimate_tokens(text)
+    if tokens <= max_tokens:
+        return text
+    keep = int(len(text) * max_tokens / tokens)
+    while keep > 0:
+        head, tail = keep * 2 // 3, keep // 3
+        trimmed = text[:head] + ELISION.format(len(text) - head - tail) + (text[-tail:] if tail else "")
+        if estimate_tokens(trimmed) <= max_tokens:
+            return trimmed
+        keep = int(keep * 0.9)
+    return ELISION.format(len(text))
+
+
+class PromptSizer:
+    """
+    Offline prompt-size estimate (llm/tokens.py) for every prompt template.
+
+    `render` formats a template and, when the result exceeds `limit` tokens, truncates
+    its fields in `field_priority` order (lowest first, never below `min_field_tokens`)
+    until it fits; fields without a priority are never touched. `fit_messages` / `fit_chat`
+    run right before dispatch, record the request size under the template name and trim
+    the longest non-system messages of requests that are still over the limit.
+    A limit of 0 only measures. Templates still over the limit after trimming are
+    reported through `notify`.
+    """
+
+    def __init__(self, limit: int = 6000, field_priority: Optional[Mapping[str, int]] = None,
+                 min_field_tokens: int = 200, notify: Optional[Callable[[str], None]] = None):
+        self.limit = limit
+        self.field_priority = dict(field_priority or {})
+        self.min_field_tokens = min_field_tokens
+        self.notify = notify
+        self._stats: Dict[str, Dict[str, Any]] = defaultdict(
+            lambda: {"requests": 0, "tokens": 0, "max_tokens": 0, "trimmed_requests": 0,
+                     "renders": 0, "trimmed_renders": 0, "trimmed_tokens": 0}
+        )
+
+    def render(self, name: str, template: str, fields: Mapping[str, Any]) -> str:
+        prompt = template.format(**fields)
+        s = self._stats[name]
+        s["renders"] += 1
+        excess = estimate_tokens(prompt) - self.limit
+        if self.limit <= 0 or excess <= 0:
+            return prompt
+
+        fields = dict(fields)
+        before = estimate_tokens(prompt)
+        for field in sorted((f for f in fields if f in self.field_priority), key=self.field_priority.get):
+            value = fields[field]
+            if not isinstance(value, str):
+                continue
+            tokens = estimate_tokens(value)
+            target = max(self.min_field_tokens, tokens - excess)
+            if target >= tokens:
+                continue
+            fields[field] = truncate_to_tokens(value, target)
+            prompt = template.format(**fields)
+            excess = estimate_tokens(prompt) - self.limit
+            if excess <= 0:
+                break
+        s["trimmed_renders"] += 1
+        s["trimmed_tokens"] += before - estimate_tokens(prompt)
+        if excess > 0 and self.notify:
+            self.notify(f"⚠️ Prompt {name} still ~{excess} tokens over the limit after trimming")
+        return prompt
+
+    def _fit(self, name: Optional[str], contents: List[Any], trimmable: List[bool]) -> List[Any]:
+        """Trims the longest trimmable string contents until the request fits the limit."""
+        sizes = [estimate_tokens(c if isinstance(c, str) else str(c)) + MESSAGE_OVERHEAD_TOKENS for c in contents]
+        total = sum(sizes)
+        s = self._stats[name or "-"]
+        s["requests"] += 1
+        if self.limit <= 0 or total <= self.limit:
+            s["tokens"] += total
+            s["max_tokens"] = max(s["max_tokens"], total)
+            return contents
+
+        contents = list(contents)
+        before = total
+        candidates = [i for i, c in enumerate(contents) if trimmable[i] and isinstance(c, str)]
+        while total > self.limit and candidates:
+            i = max(candidates, key=lambda j: sizes[j])
+            candidates.remove(i)
+            target = max(self.min_field_tokens, sizes[i] - MESSAGE_OVERHEAD_TOKENS - (total - self.limit))
+            if target >= sizes[i] - MESSAGE_OVERHEAD_TOKENS:
+                continue
+            contents[i] = truncate_to_tokens(contents[i], target)
+            new_size = estimate_tokens(contents[i]) + MESSAGE_OVERHEAD_TOKENS
+            total -= sizes[i] - new_size
+            sizes[i] = new_size
+        s["tokens"] += total
+        s["max_tokens"] = max(s["max_tokens"], total)
+        s["trimmed_requests"] += 1
+        s["trimmed_tokens"] += before - total
+        return contents
+
+    def fit_messages(self, name: Optional[str], messages: Sequence[LLMMessage]) -> Sequence[LLMMessage]:
+        contents = [getattr(m, "content", "") for m in messages]
+        fitted = self._fit(name, contents, [not isinstance(m, SystemMessage) for m in messages])
+        if fitted is contents:
+            return messages
+        return [m if c is m.content else m.model_copy(update={"content": c}) for m, c in zip(messages, fitted)]
+
+    def fit_chat(self, name: Optional[str], messages: List[dict]) -> List[dict]:
+        """Same as fit_messages for raw OpenAI-style {"role", "content"} dicts."""
+        contents = [m.get("content") or "" for m in messages]
+        fitted = self._fit(name, contents, [m.get("role") != "system" for m in messages])
+        if fitted is contents:
+            return messages
+        return [{**m, "content": c} for m, c in zip(messages, fitted)]
+
+    def report(self) -> Dict[str, Dict[str, Any]]:
+        """Per-template sizes, largest average first."""
+        report = {}
+        for name, s in self._stats.items():
+            report[name] = {**s, "avg_tokens": s["tokens"] / s["requests"] if s["requests"] else 0.0}
+        return dict(sorted(report.items(), key=lambda kv: kv[1]["avg_tokens"], reverse=True))
+
+    def log_report(self, logger):
+        columns = ["Prompt", "Requests", "Avg Tokens", "Max Tokens", "Trimmed Requests", "Trimmed Renders", "Tokens Cut"]
+        rows = [
+            [name, r["requests"], f"{r['avg_tokens']:.0f}", r["max_tokens"], r["trimmed_requests"],
+             f"{r['trimmed_renders']}/{r['renders']}", r["trimmed_tokens"]]
+            for name, r in self.report().items()
+        ]
+        if rows:
+            logger.log_table(f"Prompt Size (limit {self.limit or 'off'})", columns, rows)
+
+    def summary(self) -> str:
+        report = self.report().values()
+        requests = sum(r["requests"] for r in report)
+        tokens = sum(r["tokens"] for r in report)
+        largest = max((r["max_tokens"] for r in report), default=0)
+        trimmed = sum(r["trimmed_requests"] + r["trimmed_renders"] for r in report)
+        return (
+            f"Prompt Size: limit={self.limit or 'off'} requests={requests} "
+            f"avg={tokens / requests if requests else 0:.0f} max={largest} trimmed={trimmed}"
+        )
+
+
+class PromptSizeClient(WrappedChatCompletionClient):
+    """Measures (and if needed trims) every request under the caller's prompt template before dispatch."""
+
+    def __init__(self, inner: ChatCompletionClient, sizer: PromptSizer):
+        super().__init__(inner)
+        self._sizer = sizer
+
+    async def create(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools: Sequence[Tool | ToolSchema] = [],
+        tool_choice: Tool | Literal["auto", "required", "none"] = "auto",
+        json_output: Optional[bool | type[BaseModel]] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> CreateResult:
+        return await super().create(
+            self._sizer.fit_messages(current_context().prompt, messages), tools=tools, tool_choice=tool_choice,
+            json_output=json_output, extra_create_args=extra_create_args, cancellation_token=cancellation_token,
+        )
+
+    def create_stream(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools: Sequence[Tool | ToolSchema] = [],
+        tool_choice: Tool | Literal["auto", "required", "none"] = "auto",
+        json_output: Optional[bool | type[BaseModel]] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> AsyncGenerator[Union[str, CreateResult], None]:
+        return super().create_stream(
+            self._sizer.fit_messages(current_context().prompt, messages), tools=tools, tool_choice=tool_choice,
+            json_output=json_output, extra_create_args=extra_create_args, cancellation_token=cancellation_token,
+        )
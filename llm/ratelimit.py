@@ -0,0 +1,207 @@
+import asyncio
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, AsyncGenerator, Dict, Literal, Mapping, Optional, Sequence, Union
+
+from autogen_core import CancellationToken
+from autogen_core.models import ChatCompletionClient, CreateResult, LLMMessage
+from autogen_core.tools import Tool, ToolSchema
+from pydantic import BaseModel
+
+from llm.client import WrappedChatCompletionClient
+from llm.tokens import estimate_messages_tokens
+
+
+class TokenBucket:
+    """Continuously refilled bucket; `rate_per_minute <= 0` means unlimited."""
+
+    def __init__(self, rate_per_minute: float, burst_seconds: float = 10.0):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = max(1.0, self.rate * burst_seconds) if rate_per_minute > 0 else 0.0
+        self.tokens = self.capacity
+        self._last = time.monotonic()
+
+    @property
+    def unlimited(self) -> bool:
+        return self.rate <= 0
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def wait_time(self, amount: float) -> float:
+        if self.unlimited:
+            return 0.0
+        self._refill()
+        # 单个请求超过桶容量时按满桶处理, 否则会永远等不到
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def take(self, amount: float):
+        if not self.unlimited:
+            self.tokens -= min(amount, self.capacity)
+
+    def give_back(self, amount: float):
+        """Positive amount refunds an over-estimate, negative records extra usage as debt."""
+        if not self.unlimited:
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+
+@dataclass
+class Reservation:
+    estimated_tokens: int
+    waited: float
+
+
+class RateLimiter:
+    """
+    Process-wide requests-per-minute and tokens-per-minute limiter.
+
+    Each call reserves one request and its estimated prompt + completion tokens up front;
+    once the response arrives `settle` corrects the token bucket with the real usage.
+    Waiters are served in FIFO order.
+    """
+
+    def __init__(self, rpm: float = 0, tpm: float = 0, burst_seconds: float = 10.0,
+                 completion_estimate: int = 512):
+        self.requests = TokenBucket(rpm, burst_seconds)
+        self.tokens = TokenBucket(tpm, burst_seconds)
+        self.rpm = rpm
+        self.tpm = tpm
+        self.completion_estimate = completion_estimate
+
+        self.acquired = 0
+        self.throttled = 0
+        self.total_wait = 0.0
+        self.estimated_tokens = 0
+        self.actual_tokens = 0
+        self._lock: Optional[asyncio.Lock] = None
+
+    @classmethod
+    def from_env(cls) -> "RateLimiter":
+        return cls(
+            rpm=float(os.getenv("LLM_RPM", "0")),
+            tpm=float(os.getenv("LLM_TPM", "0")),
+            burst_seconds=float(os.getenv("LLM_RATE_BURST_SECONDS", "10")),
+            completion_estimate=int(os.getenv("LLM_TPM_COMPLETION_ESTIMATE", "512")),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return not (self.requests.unlimited and self.tokens.unlimited)
+
+    async def acquire(self, prompt_tokens: int, max_completion_tokens: Optional[int] = None) -> Reservation:
+        completion = self.completion_estimate
+        if max_completion_tokens:
+            completion = min(completion, max_completion_tokens)
+        estimate = prompt_tokens + completion
+        if not self.enabled:
+            return Reservation(estimated_tokens=estimate, waited=0.0)
+
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        start = time.monotonic()
+        async with self._lock:
+            while True:
+                wait = max(self.requests.wait_time(1), self.tokens.wait_time(estimate))
+                if wait <= 0:
+                    break
+                await asyncio.sleep(wait)
+            self.requests.take(1)
+            self.tokens.take(estimate)
+
+        waited = time.monotonic() - start
+        self.acquired += 1
+        self.estimated_tokens += estimate
+        if waited > 0.001:
+            self.throttled += 1
+            self.total_wait += waited
+        return Reservation(estimated_tokens=estimate, waited=waited)
+
+    def settle(self, reservation: Reservation, actual_tokens: Optional[int]):
+        if actual_tokens is None:
+            return
+        self.actual_tokens += actual_tokens
+        if self.enabled:
+            self.tokens.give_back(reservation.estimated_tokens - actual_tokens)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "rpm": self.rpm,
+            "tpm": self.tpm,
+            "acquired": self.acquired,
+            "throttled": self.throttled,
+            "total_wait": self.total_wait,
+            "estimated_tokens": self.estimated_tokens,
+            "actual_tokens": self.actual_tokens,
+        }
+
+    def summary(self) -> str:
+        if not self.enabled:
+            return "Rate Limit: off"
+        s = self.stats()
+        return (
+            f"Rate Limit: rpm={s['rpm']:g} tpm={s['tpm']:g} requests={s['acquired']} "
+            f"throttled={s['throttled']} wait={s['total_wait']:.1f}s "
+            f"tokens est/actual={s['estimated_tokens']}/{s['actual_tokens']}"
+        )
+
+
+def _usage_tokens(result: CreateResult) -> Optional[int]:
+    if result.cached or result.usage is None:
+        return None
+    return result.usage.prompt_tokens + result.usage.completion_tokens
+
+
+class RateLimitedChatCompletionClient(WrappedChatCompletionClient):
+    """Takes a RateLimiter reservation before every model call."""
+
+    def __init__(self, inner: ChatCompletionClient, limiter: RateLimiter):
+        super().__init__(inner)
+        self._limiter = limiter
+
+    async def _reserve(self, messages, extra_create_args) -> Reservation:
+        return await self._limiter.acquire(
+            estimate_messages_tokens(messages), extra_create_args.get("max_tokens")
+        )
+
+    async def create(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools: Sequence[Tool | ToolSchema] = [],
+        tool_choice: Tool | Literal["auto", "required", "none"] = "auto",
+        json_output: Optional[bool | type[BaseModel]] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> CreateResult:
+        reservation = await self._reserve(messages, extra_create_args)
+        result = await super().create(
+            messages, tools=tools, tool_choice=tool_choice, json_output=json_output,
+            extra_create_args=extra_create_args, cancellation_token=cancellation_token,
+        )
+        self._limiter.settle(reservation, _usage_tokens(result))
+        return result
+
+    async def create_stream(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools: Sequence[Tool | ToolSchema] = [],
+        tool_choice: Tool | Literal["auto", "required", "none"] = "auto",
+        json_output: Optional[bool | type[BaseModel]] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> AsyncGenerator[Union[str, CreateResult], None]:
+        reservation = await self._reserve(messages, extra_create_args)
+        async for chunk in super().create_stream(
+            messages, tools=tools, tool_choice=tool_choice, json_output=json_output,
+            extra_create_args=extra_create_args, cancellation_token=cancellation_token,
+        ):
+            if isinstance(chunk, CreateResult):
+                self._limiter.settle(reservation, _usage_tokens(chunk))
+            yield chunk
@@ -0,0 +1,137 @@
+import os
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from pydantic import BaseModel, ValidationError, create_model
+
+from llm.context import call_context
+from utils import extract_json
+
+
+def validation_errors(model: type[BaseModel], data: Dict[str, Any]) -> Dict[str, str]:
+    """{field: message} for every top-level field of `data` that fails `model`."""
+    try:
+        model.model_validate(data)
+    except ValidationError as e:
+        errors: Dict[str, str] = {}
+        for err in e.errors():
+            field = str(err["loc"][0]) if err["loc"] else None
+            if field is None:
+                return {name: err["msg"] for name in model.model_fields}
+            errors.setdefault(field, err["msg"])
+        return errors
+    return {}
+
+
+class JsonRepairer:
+    """
+    Validates a model reply against a pydantic model (configs/roles.py). When fields are
+    missing or invalid it asks again for only those fields with a short follow-up prompt,
+    `ask(prompt, patch_model) -> reply`, and merges the answer into the original, so a single
+    bad field does not cost a whole team run. The follow-up carries the original request
+    (`prompt`) so the fields are answered from the same data. After `max_rounds` failed
+    follow-ups the best partial result is returned and the caller's own defaults apply as before
+    (llm.structured.output_fallbacks for agent replies).
+
+    A reply that yields no JSON object at all (empty, a "failed:..." error string, prose)
+    is not repaired: asking for every field without the conversation would invent them.
+    Progress is reported through `notify`, if given.
+    """
+
+    def __init__(self, ask: Callable[[str, type[BaseModel]], Awaitable[str]], template: str,
+                 max_rounds: int = 1, enabled: bool = True, previous_chars: int = 2000,
+                 request_chars: int = 4000, notify: Optional[Callable[[str], None]] = None):
+        self._ask = ask
+        self.notify = notify
+        self.template = template
+        self.max_rounds = max_rounds
+        self.enabled = enabled
+        self.previous_chars = previous_chars
+        self.request_chars = request_chars
+        self._patch_models: Dict[Tuple[type[BaseModel], Tuple[str, ...]], type[BaseModel]] = {}
+
+        self.checked = 0
+        self.valid = 0
+        self.repaired = 0
+        self.failed = 0
+        self.skipped = 0
+        self.calls = 0
+
+    @classmethod
+    def from_env(cls, ask: Callable[[str, type[BaseModel]], Awaitable[str]], template: str,
+                 notify: Optional[Callable[[str], None]] = None) -> "JsonRepairer":
+        return cls(
+            ask,
+            template,
+            max_rounds=int(os.getenv("LLM_REPAIR_ROUNDS", "1")),
+            enabled=os.getenv("LLM_REPAIR", "1") == "1",
+            notify=notify,
+        )
+
+    def _patch_model(self, model: type[BaseModel], fields: List[str]) -> type[BaseModel]:
+        key = (model, tuple(fields))
+        if key not in self._patch_models:
+            self._patch_models[key] = create_model(
+                f"{model.__name__}Patch",
+                **{name: (model.model_fields[name].annotation, model.model_fields[name]) for name in fields},
+            )
+        return self._patch_models[key]
+
+    @staticmethod
+    def _parse(raw: Optional[str]) -> Dict[str, Any]:
+        if not raw or raw.startswith("failed:"):
+            return {}
+        data = extract_json(raw)
+        return data if isinstance(data, dict) else {}
+
+    async def repair(self, raw: Optional[str], model: type[BaseModel],
+                     defaults: Optional[Dict[str, Any]] = None, prompt: str = "") -> Dict[str, Any]:
+        data = self._parse(raw)
+        parsed = bool(data)
+        for name, value in (defaults or {}).items():
+            data.setdefault(name, value)
+        errors = validation_errors(model, data)
+        self.checked += 1
+        if not errors:
+            self.valid += 1
+            return data
+        if not parsed:
+            self.skipped += 1
+            return data
+        if not self.enabled:
+            self.failed += 1
+            return data
+
+        previous = raw or ""
+        for _ in range(self.max_rounds):
+            fields = [name for name in model.model_fields if name in errors]
+            follow_up = self.template.format(
+                model_name=model.__name__,
+                errors="\n".join(f"- {name}: {errors[name]}" for name in fields),
+                request=prompt[: self.request_chars] or "（未提供）",
+                previous=previous[: self.previous_chars],
+            )
+            self.calls += 1
+            if self.notify:
+                self.notify(f"🩹 Repairing {model.__name__} fields: {', '.join(fields)}")
+            try:
+                with call_context(prompt=f"REPAIR_{model.__name__}"):
+                    reply = await self._ask(follow_up, self._patch_model(model, fields))
+            except Exception as e:
+                if self.notify:
+                    self.notify(f"⚠️ Repair of {model.__name__} failed: {e}")
+                break
+            patch = self._parse(reply)
+            data.update({name: value for name, value in patch.items() if name in errors})
+            errors = validation_errors(model, data)
+            if not errors:
+                self.repaired += 1
+                return data
+            previous = reply or previous
+        self.failed += 1
+        return data
+
+    def summary(self) -> str:
+        return (
+            f"JSON Repair: checked={self.checked} valid={self.valid} repaired={self.repaired} "
+            f"failed={self.failed} skipped={self.skipped} follow_up_calls={self.calls}"
+        )
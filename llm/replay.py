@@ -0,0 +1,222 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Any, AsyncGenerator, Deque, Dict, Literal, Mapping, Optional, Sequence, Tuple, Union
+
+from autogen_core import CancellationToken
+from autogen_core.models import ChatCompletionClient, CreateResult, LLMMessage
+from autogen_core.tools import Tool, ToolSchema
+from pydantic import BaseModel
+
+from llm.client import WrappedChatCompletionClient, describe_request, request_key
+
+RECORD_MODES = ("off", "record", "replay")
+
+
+class ReplayMissError(KeyError):
+    """A replayed run issued a request that was never recorded."""
+
+
+class CallRecorder:
+    """
+    Persists every model request / response with its wall-clock latency as JSONL
+    (record mode) and serves them back without touching the network (replay mode).
+
+    Requests are matched by content key; identical requests are answered in the
+    order they were recorded. latency="original" sleeps for the recorded latency,
+    latency="zero" answers immediately (framework overhead only).
+
+    Matching is decided by completion order (the first ACCEPT makes a producer BUSY),
+    so a replay can ask for requests the recording never saw. on_miss="error" fails
+    those calls, on_miss="live" sends them to the real client and counts them.
+    """
+
+    def __init__(self, path: str, mode: str = "off", latency: str = "original", on_miss: str = "error"):
+        if mode not in RECORD_MODES:
+            raise ValueError(f"Unknown record mode: {mode} (expected one of {RECORD_MODES})")
+        if latency not in ("original", "zero"):
+            raise ValueError(f"Unknown replay latency: {latency} (expected 'original' or 'zero')")
+        if on_miss not in ("error", "live"):
+            raise ValueError(f"Unknown replay miss policy: {on_miss} (expected 'error' or 'live')")
+        self.path = path
+        self.mode = mode
+        self.latency = latency
+        self.on_miss = on_miss
+
+        self.recorded = 0
+        self.replayed = 0
+        self.misses = 0
+        self.replayed_latency = 0.0
+
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Deque[Dict[str, Any]]] = defaultdict(deque)
+        self._loaded = False
+
+    @classmethod
+    def from_env(cls) -> "CallRecorder":
+        return cls(
+            path=os.getenv("LLM_RECORD_PATH", "../logs/llm_recording.jsonl"),
+            mode=os.getenv("LLM_RECORD_MODE", "off"),
+            latency=os.getenv("LLM_REPLAY_LATENCY", "original"),
+            on_miss=os.getenv("LLM_REPLAY_MISS", "error"),
+        )
+
+    @property
+    def recording(self) -> bool:
+        return self.mode == "record"
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == "replay"
+
+    @property
+    def live_on_miss(self) -> bool:
+        return self.on_miss == "live"
+
+    def _load(self):
+        if self._loaded:
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self._entries[entry["key"]].append(entry)
+        self._loaded = True
+
+    def record(self, key: str, kind: str, request: Any, response: Any, latency: float):
+        entry = {
+            "key": key,
+            "kind": kind,
+            "ts": time.time(),
+            "latency": latency,
+            "request": request,
+            "response": response,
+        }
+        line = json.dumps(entry, ensure_ascii=False, default=str)
+        with self._lock:
+            if not self._loaded:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                # 每次录制覆盖旧文件, 保证一次运行对应一份录像
+                open(self.path, "w", encoding="utf-8").close()
+                self._loaded = True
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+            self.recorded += 1
+
+    def take(self, key: str) -> Tuple[Any, float]:
+        with self._lock:
+            self._load()
+            queue = self._entries.get(key)
+            if not queue:
+                self.misses += 1
+                raise ReplayMissError(f"No recorded response for request {key[:12]} in {self.path}")
+            entry = queue.popleft()
+            self.replayed += 1
+        latency = entry["latency"] if self.latency == "original" else 0.0
+        self.replayed_latency += latency
+        return entry["response"], latency
+
+    async def replay(self, key: str) -> Any:
+        response, latency = self.take(key)
+        if latency > 0:
+            await asyncio.sleep(latency)
+        return response
+
+    def summary(self) -> str:
+        if self.mode == "off":
+            return "Record/Replay: off"
+        if self.recording:
+            return f"Record/Replay [record -> {self.path}]: recorded={self.recorded}"
+        return (
+            f"Record/Replay [replay <- {self.path}, latency={self.latency}]: replayed={self.replayed} "
+            f"misses={self.misses} ({self.on_miss}) simulated_latency={self.replayed_latency:.1f}s"
+        )
+
+
+def replay_key(client: ChatCompletionClient, messages, tools, json_output) -> Tuple[str, Dict[str, Any]]:
+    """Key on model + conversation only, so tuning knobs (max_tokens, ...) don't break replays."""
+    request = describe_request(client, messages, tools, json_output)
+    identity = {
+        "model": request["create_args"].get("model"),
+        "messages": request["messages"],
+        "tools": request["tools"],
+        "schema": request["schema"],
+    }
+    return request_key(identity), request
+
+
+class RecordReplayChatCompletionClient(WrappedChatCompletionClient):
+    """Records the wrapped client's traffic, or replays a recording instead of calling it."""
+
+    def __init__(self, inner: ChatCompletionClient, recorder: CallRecorder):
+        super().__init__(inner)
+        self._recorder = recorder
+
+    async def create(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools: Sequence[Tool | ToolSchema] = [],
+        tool_choice: Tool | Literal["auto", "required", "none"] = "auto",
+        json_output: Optional[bool | type[BaseModel]] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> CreateResult:
+        if self._recorder.mode == "off":
+            return await super().create(
+                messages, tools=tools, tool_choice=tool_choice, json_output=json_output,
+                extra_create_args=extra_create_args, cancellation_token=cancellation_token,
+            )
+
+        key, request = replay_key(self._inner, messages, tools, json_output)
+        if self._recorder.replaying:
+            try:
+                return CreateResult.model_validate(await self._recorder.replay(key))
+            except ReplayMissError:
+                if not self._recorder.live_on_miss:
+                    raise
+
+        start = time.perf_counter()
+        result = await super().create(
+            messages, tools=tools, tool_choice=tool_choice, json_output=json_output,
+            extra_create_args=extra_create_args, cancellation_token=cancellation_token,
+        )
+        if self._recorder.recording:
+            self._recorder.record(key, "chat_client", request, result.model_dump(mode="json"), time.perf_counter() - start)
+        return result
+
+    async def create_stream(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools: Sequence[Tool | ToolSchema] = [],
+        tool_choice: Tool | Literal["auto", "required", "none"] = "auto",
+        json_output: Optional[bool | type[BaseModel]] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> AsyncGenerator[Union[str, CreateResult], None]:
+        if self._recorder.mode != "off":
+            key, request = replay_key(self._inner, messages, tools, json_output)
+        if self._recorder.replaying:
+            try:
+                result = CreateResult.model_validate(await self._recorder.replay(key))
+            except ReplayMissError:
+                if not self._recorder.live_on_miss:
+                    raise
+            else:
+                if isinstance(result.content, str):
+                    yield result.content
+                yield result
+                return
+
+        start = time.perf_counter()
+        async for chunk in super().create_stream(
+            messages, tools=tools, tool_choice=tool_choice, json_output=json_output,
+            extra_create_args=extra_create_args, cancellation_token=cancellation_token,
+        ):
+            if self._recorder.recording and isinstance(chunk, CreateResult):
+                self._recorder.record(key, "chat_client", request, chunk.model_dump(mode="json"), time.perf_counter() - start)
+            yield chunk
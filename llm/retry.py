@@ -0,0 +1,278 @@
+import asyncio
+import os
+import random
+import time
+from collections import defaultdict, deque
+from dataclasses import dataclass
+from typing import (
+    Any, AsyncGenerator, Awaitable, Callable, Dict, Literal, Mapping, Optional, Sequence, TypeVar, Union,
+)
+
+from autogen_core import CancellationToken
+from autogen_core.models import ChatCompletionClient, CreateResult, LLMMessage
+from autogen_core.tools import Tool, ToolSchema
+from pydantic import BaseModel
+
+from llm.breaker import CircuitOpenError, is_provider_error
+from llm.client import WrappedChatCompletionClient
+from llm.context import attempt_timeout, current_context
+
+T = TypeVar("T")
+
+
+class RetryableOutputError(ValueError):
+    """The model answered, but the answer is unusable (e.g. no JSON where JSON was required)."""
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """Provider errors, timeouts and unusable outputs; an open breaker fails fast instead."""
+    if isinstance(exc, CircuitOpenError):
+        return False
+    return isinstance(exc, RetryableOutputError) or is_provider_error(exc)
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    max_attempts: int = 3
+    timeout: Optional[float] = 120.0
+    base_delay: float = 0.5
+    max_delay: float = 20.0
+
+
+class RetryBudget:
+    """
+    Process-wide cap on retries: within the last `window` seconds at most `ratio` x the
+    number of first attempts (and never fewer than `min_retries`) may be retried, so an
+    outage cannot multiply traffic by max_attempts.
+    """
+
+    def __init__(self, ratio: float = 0.2, window: float = 60.0, min_retries: int = 3):
+        self.ratio = ratio
+        self.window = window
+        self.min_retries = min_retries
+        self.denied = 0
+        self._requests = deque()
+        self._retries = deque()
+
+    @classmethod
+    def from_env(cls) -> "RetryBudget":
+        return cls(
+            ratio=float(os.getenv("LLM_RETRY_BUDGET_RATIO", "0.2")),
+            window=float(os.getenv("LLM_RETRY_BUDGET_WINDOW", "60")),
+            min_retries=int(os.getenv("LLM_RETRY_BUDGET_MIN", "3")),
+        )
+
+    def _prune(self, now: float):
+        for q in (self._requests, self._retries):
+            while q and now - q[0] > self.window:
+                q.popleft()
+
+    def record_request(self):
+        self._requests.append(time.monotonic())
+
+    def try_spend(self) -> bool:
+        now = time.monotonic()
+        self._prune(now)
+        if len(self._retries) >= max(self.min_retries, self.ratio * len(self._requests)):
+            self.denied += 1
+            return False
+        self._retries.append(now)
+        return True
+
+
+class Retrier:
+    """
+    One retry layer for every model call. The policy (attempts, per-attempt timeout,
+    backoff bounds) is picked by the CallContext phase; delays use decorrelated jitter
+    (delay = U(base, 3 x previous delay), capped); every retry must fit the shared RetryBudget.
+    The timeout is not applied around the whole attempt: it is handed down via
+    llm.context.attempt_timeout and enforced by CircuitBreaker.call on the wire request.
+    Each retry is announced through `notify`, if given.
+    """
+
+    def __init__(self, policies: Mapping[str, RetryPolicy], default: RetryPolicy, budget: RetryBudget,
+                 enabled: bool = True, notify: Optional[Callable[[str], None]] = None):
+        self.policies = dict(policies)
+        self.default = default
+        self.budget = budget
+        self.enabled = enabled
+        self.notify = notify
+        self._stats: Dict[str, Dict[str, int]] = defaultdict(
+            lambda: {"calls": 0, "retries": 0, "timeouts": 0, "invalid": 0, "budget_denied": 0, "gave_up": 0}
+        )
+
+    def policy_for(self, phase: Optional[str]) -> RetryPolicy:
+        policy = self.policies.get(phase, self.default)
+        return policy if self.enabled else RetryPolicy(1, policy.timeout)
+
+    def _next_delay(self, policy: RetryPolicy, previous: float) -> float:
+        return min(policy.max_delay, random.uniform(policy.base_delay, max(policy.base_delay, previous * 3)))
+
+    def _should_retry(self, exc: BaseException, attempt: int, policy: RetryPolicy, s: Dict[str, int]) -> bool:
+        if isinstance(exc, (asyncio.TimeoutError, TimeoutError)):
+            s["timeouts"] += 1
+        elif isinstance(exc, RetryableOutputError):
+            s["invalid"] += 1
+        if not is_retryable(exc) or attempt >= policy.max_attempts:
+            if is_retryable(exc):
+                s["gave_up"] += 1
+            return False
+        if not self.budget.try_spend():
+            s["budget_denied"] += 1
+            s["gave_up"] += 1
+            return False
+        s["retries"] += 1
+        return True
+
+    def _announce(self, attempt: int, policy: RetryPolicy, phase: Optional[str], delay: float, exc: Exception):
+        if self.notify:
+            self.notify(f"🔁 Retry {attempt}/{policy.max_attempts - 1} ({phase or '-'}) in {delay:.1f}s: {type(exc).__name__}: {exc}")
+
+    async def run(self, attempt_factory: Callable[[], Awaitable[T]], phase: Optional[str] = None) -> T:
+        phase = phase or current_context().phase
+        policy = self.policy_for(phase)
+        s = self._stats[phase or "-"]
+        s["calls"] += 1
+        self.budget.record_request()
+        delay = policy.base_delay
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                with attempt_timeout(policy.timeout):
+                    return await attempt_factory()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if not self._should_retry(e, attempt, policy, s):
+                    raise
+                delay = self._next_delay(policy, delay)
+                self._announce(attempt, policy, phase, delay, e)
+                await asyncio.sleep(delay)
+
+    def run_sync(self, attempt_fn: Callable[[RetryPolicy], T], phase: Optional[str] = None) -> T:
+        """Blocking variant; `attempt_fn` receives the policy so it can pass the timeout to its client."""
+        phase = phase or current_context().phase
+        policy = self.policy_for(phase)
+        s = self._stats[phase or "-"]
+        s["calls"] += 1
+        self.budget.record_request()
+        delay = policy.base_delay
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                return attempt_fn(policy)
+            except Exception as e:
+                if not self._should_retry(e, attempt, policy, s):
+                    raise
+                delay = self._next_delay(policy, delay)
+                self._announce(attempt, policy, phase, delay, e)
+                time.sleep(delay)
+
+    async def stream(self, stream_factory: Callable[[], AsyncGenerator[T, None]],
+                     phase: Optional[str] = None) -> AsyncGenerator[T, None]:
+        """
+        Retries a stream only while nothing has been yielded. The attempt timeout is set
+        only while the next chunk is awaited, so the breaker applies it to the time to the
+        first chunk and to each gap between chunks, never to the caller's own work.
+        """
+        phase = phase or current_context().phase
+        policy = self.policy_for(phase)
+        s = self._stats[phase or "-"]
+        s["calls"] += 1
+        self.budget.record_request()
+        delay = policy.base_delay
+        attempt = 0
+        while True:
+            attempt += 1
+            started = False
+            stream = stream_factory()
+            try:
+                while True:
+                    with attempt_timeout(policy.timeout):
+                        try:
+                            chunk = await stream.__anext__()
+                        except StopAsyncIteration:
+                            return
+                    started = True
+                    yield chunk
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if started or not self._should_retry(e, attempt, policy, s):
+                    raise
+                delay = self._next_delay(policy, delay)
+                self._announce(attempt, policy, phase, delay, e)
+                await asyncio.sleep(delay)
+            finally:
+                await stream.aclose()
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {phase: dict(s) for phase, s in self._stats.items()}
+
+    def summary(self) -> str:
+        stats = self.stats()
+        calls = sum(s["calls"] for s in stats.values())
+        retries = sum(s["retries"] for s in stats.values())
+        text = (
+            f"Retry: calls={calls} retries={retries} ({retries / calls if calls else 0:.1%}) "
+            f"timeouts={sum(s['timeouts'] for s in stats.values())} invalid={sum(s['invalid'] for s in stats.values())} "
+            f"budget_denied={self.budget.denied} gave_up={sum(s['gave_up'] for s in stats.values())}"
+        )
+        per_phase = [f"{phase}={s['retries']}/{s['calls']}" for phase, s in stats.items() if s["retries"]]
+        if per_phase:
+            text += " | " + " ".join(per_phase)
+        return text
+
+
+class RetryingChatCompletionClient(WrappedChatCompletionClient):
+    """
+    Retries failed / timed-out requests under the current phase's policy. With `validate`,
+    a finished (not truncated) completion whose content fails it is retried as well.
+    """
+
+    def __init__(self, inner: ChatCompletionClient, retrier: Retrier,
+                 validate: Optional[Callable[[str], bool]] = None):
+        super().__init__(inner)
+        self._retrier = retrier
+        self._validate = validate
+
+    def _check(self, result: CreateResult) -> CreateResult:
+        if (self._validate is not None and result.finish_reason != "length"
+                and isinstance(result.content, str) and not self._validate(result.content)):
+            raise RetryableOutputError(f"Unusable model output: {result.content[:80]!r}")
+        return result
+
+    async def create(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools: Sequence[Tool | ToolSchema] = [],
+        tool_choice: Tool | Literal["auto", "required", "none"] = "auto",
+        json_output: Optional[bool | type[BaseModel]] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> CreateResult:
+        async def attempt() -> CreateResult:
+            return self._check(await self._inner.create(
+                messages, tools=tools, tool_choice=tool_choice, json_output=json_output,
+                extra_create_args=extra_create_args, cancellation_token=cancellation_token,
+            ))
+
+        return await self._retrier.run(attempt)
+
+    def create_stream(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools: Sequence[Tool | ToolSchema] = [],
+        tool_choice: Tool | Literal["auto", "required", "none"] = "auto",
+        json_output: Optional[bool | type[BaseModel]] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> AsyncGenerator[Union[str, CreateResult], None]:
+        return self._retrier.stream(lambda: self._inner.create_stream(
+            messages, tools=tools, tool_choice=tool_choice, json_output=json_output,
+            extra_create_args=extra_create_args, cancellation_token=cancellation_token,
+        ))
@@ -0,0 +1,155 @@
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Any, AsyncGenerator, Callable, Dict, List, Literal, Mapping, Optional, Sequence, Tuple, Union
+
+from autogen_core import CancellationToken
+from autogen_core.models import ChatCompletionClient, CreateResult, LLMMessage
+from autogen_core.tools import Tool, ToolSchema
+from pydantic import BaseModel
+
+from llm.breaker import Failover
+from llm.client import WrappedChatCompletionClient
+
+
+@dataclass(frozen=True)
+class ModelRoute:
+    name: str
+    model: str
+    base_url: Optional[str] = None
+    api_key: Optional[str] = None
+    fallback_model: Optional[str] = None
+    fallback_base_url: Optional[str] = None
+    fallback_api_key: Optional[str] = None
+
+
+class ModelRouter:
+    """
+    Binds agent roles to model routes (see configs/models.py) and keeps one client per
+    route and output mode, built on first use by `build(route, json_output)`.
+    Latency and token usage are tracked per route, and each route has its own circuit
+    breakers and fallback (`failover_for`, built by `failover(route)`), shared by its
+    plain and JSON clients.
+    """
+
+    def __init__(self, routes: Dict[str, ModelRoute], role_routes: Dict[str, str], default_route: str,
+                 build: Callable[[ModelRoute, bool], ChatCompletionClient],
+                 failover: Optional[Callable[[ModelRoute], Failover]] = None):
+        if default_route not in routes:
+            raise ValueError(f"Default route '{default_route}' is not in the routing table")
+        for role, route in role_routes.items():
+            if route not in routes:
+                raise ValueError(f"Role '{role}' is bound to unknown route '{route}'")
+        self.routes = routes
+        self.role_routes = role_routes
+        self.default_route = default_route
+        self._build = build
+        self._make_failover = failover
+        self._failovers: Dict[str, Failover] = {}
+        self._clients: Dict[Tuple[str, bool], ChatCompletionClient] = {}
+        self._stats: Dict[str, Dict[str, Any]] = defaultdict(
+            lambda: {"calls": 0, "errors": 0, "cached": 0, "latency": 0.0, "prompt_tokens": 0, "completion_tokens": 0}
+        )
+
+    def route_for(self, role: Optional[str]) -> ModelRoute:
+        return self.routes[self.role_routes.get(role, self.default_route)]
+
+    def client_for(self, role: Optional[str], json_output: bool = False) -> ChatCompletionClient:
+        route = self.route_for(role)
+        key = (route.name, json_output)
+        if key not in self._clients:
+            self._clients[key] = RouteStatsClient(self._build(route, json_output), self, route.name)
+        return self._clients[key]
+
+    def failover_for(self, route: ModelRoute) -> Failover:
+        if route.name not in self._failovers:
+            if self._make_failover is None:
+                raise ValueError("ModelRouter was created without a failover factory")
+            self._failovers[route.name] = self._make_failover(route)
+        return self._failovers[route.name]
+
+    def record(self, route: str, latency: float, result: Optional[CreateResult] = None):
+        s = self._stats[route]
+        s["calls"] += 1
+        if result is None:
+            s["errors"] += 1
+            return
+        if result.cached:
+            s["cached"] += 1
+            return
+        s["latency"] += latency
+        if result.usage:
+            s["prompt_tokens"] += result.usage.prompt_tokens
+            s["completion_tokens"] += result.usage.completion_tokens
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        stats = {}
+        for name, s in self._stats.items():
+            live = s["calls"] - s["cached"] - s["errors"]
+            stats[name] = {**s, "model": self.routes[name].model, "avg_latency": s["latency"] / live if live else 0.0}
+        return stats
+
+    def summary(self) -> str:
+        parts = [
+            f"{name}[{s['model']}] calls={s['calls']} avg={s['avg_latency']:.2f}s "
+            f"tokens={s['prompt_tokens']}+{s['completion_tokens']} errors={s['errors']}"
+            for name, s in self.stats().items()
+        ]
+        return "Routes: " + (" | ".join(parts) if parts else "no calls")
+
+    def failover_status(self) -> List[str]:
+        return [failover.status() for failover in self._failovers.values()]
+
+
+class RouteStatsClient(WrappedChatCompletionClient):
+    """Reports latency and usage of every call to the router under its route name."""
+
+    def __init__(self, inner: ChatCompletionClient, router: ModelRouter, route: str):
+        super().__init__(inner)
+        self._router = router
+        self._route = route
+
+    async def create(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools: Sequence[Tool | ToolSchema] = [],
+        tool_choice: Tool | Literal["auto", "required", "none"] = "auto",
+        json_output: Optional[bool | type[BaseModel]] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> CreateResult:
+        start = time.perf_counter()
+        try:
+            result = await super().create(
+                messages, tools=tools, tool_choice=tool_choice, json_output=json_output,
+                extra_create_args=extra_create_args, cancellation_token=cancellation_token,
+            )
+        except Exception:
+            self._router.record(self._route, time.perf_counter() - start)
+            raise
+        self._router.record(self._route, time.perf_counter() - start, result)
+        return result
+
+    async def create_stream(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools: Sequence[Tool | ToolSchema] = [],
+        tool_choice: Tool | Literal["auto", "required", "none"] = "auto",
+        json_output: Optional[bool | type[BaseModel]] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> AsyncGenerator[Union[str, CreateResult], None]:
+        start = time.perf_counter()
+        try:
+            async for chunk in super().create_stream(
+                messages, tools=tools, tool_choice=tool_choice, json_output=json_output,
+                extra_create_args=extra_create_args, cancellation_token=cancellation_token,
+            ):
+                if isinstance(chunk, CreateResult):
+                    self._router.record(self._route, time.perf_counter() - start, chunk)
+                yield chunk
+        except Exception:
+            self._router.record(self._route, time.perf_counter() - start)
+            raise
@@ -0,0 +1,323 @@
+import contextvars
+import json
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, AsyncGenerator, Callable, Dict, List, Literal, Mapping, Optional, Sequence, Tuple, Union
+
+from autogen_core import CancellationToken
+from autogen_core.models import ChatCompletionClient, CreateResult, LLMMessage, RequestUsage
+from autogen_core.tools import Tool, ToolSchema
+from pydantic import BaseModel
+
+from llm.client import WrappedChatCompletionClient
+from llm.context import CallContext, current_context
+from llm.tokens import estimate_messages_tokens, estimate_tokens
+
+# callback(field, value, seconds since the request was sent, call context)
+DecisionListener = Callable[[str, Any, float, CallContext], None]
+
+_DECISION_LISTENERS: contextvars.ContextVar[Tuple[DecisionListener, ...]] = contextvars.ContextVar(
+    "llm_decision_listeners", default=()
+)
+
+
+@contextmanager
+def on_early_decision(listener: DecisionListener):
+    """Calls `listener` for every decision field surfaced by a stream started inside this block."""
+    token = _DECISION_LISTENERS.set(_DECISION_LISTENERS.get() + (listener,))
+    try:
+        yield
+    finally:
+        _DECISION_LISTENERS.reset(token)
+
+
+class IncrementalJsonParser:
+    """
+    Follows the first top-level JSON object of a streamed reply one chunk at a time.
+    Every top-level field is reported by `feed` as soon as its value is complete and
+    `complete` turns True at the closing brace; text before the object (```json fences,
+    preambles) is skipped. Nested values are only tracked for depth, never parsed early.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.start = -1
+        self.end = -1
+        self.fields: Dict[str, Any] = {}
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        # key -> colon -> value -> (string | scalar | container) -> after
+        self._state = "key"
+        self._key: Optional[str] = None
+        self._token_start = -1
+
+    @property
+    def complete(self) -> bool:
+        return self.end >= 0
+
+    @property
+    def object_text(self) -> str:
+        return self.text[self.start:self.end] if self.complete else ""
+
+    def _field_done(self, end: int, done: List[Tuple[str, Any]]):
+        raw = self.text[self._token_start:end]
+        self._state = "after"
+        try:
+            value = json.loads(raw)
+        except ValueError:
+            return
+        self.fields[self._key] = value
+        done.append((self._key, value))
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        """Appends `chunk` and returns the (field, value) pairs it completed."""
+        done: List[Tuple[str, Any]] = []
+        offset = len(self.text)
+        self.text += chunk
+        if self.complete:
+            return done
+
+        for i in range(offset, len(self.text)):
+            c = self.text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    if self._depth == 1 and self._state == "key":
+                        try:
+                            self._key = json.loads(self.text[self._token_start:i + 1])
+                        except ValueError:
+                            self._key = None
+                        self._state = "colon"
+                    elif self._depth == 1 and self._state == "string":
+                        self._field_done(i + 1, done)
+                continue
+
+            if c == '"':
+                self._in_string = True
+                if self._depth == 1 and self._state in ("key", "value"):
+                    self._token_start = i
+                    if self._state == "value":
+                        self._state = "string"
+            elif c in "{[":
+                if self._depth == 0:
+                    if c == "{":
+                        self.start = i
+                        self._depth = 1
+                        self._state = "key"
+                    continue
+                if self._depth == 1 and self._state == "value":
+                    self._token_start = i
+                    self._state = "container"
+                self._depth += 1
+            elif c in "}]":
+                if self._depth == 0:
+                    continue
+                self._depth -= 1
+                if self._depth == 1 and self._state == "container":
+                    self._field_done(i + 1, done)
+                elif self._depth == 0:
+                    if self._state == "scalar":
+                        self._field_done(i, done)
+                    self.end = i + 1
+                    break
+            elif self._depth == 1:
+                if c == ":" and self._state == "colon":
+                    self._state = "value"
+                elif c == ",":
+                    if self._state == "scalar":
+                        self._field_done(i, done)
+                    self._state = "key"
+                elif self._state == "value" and not c.isspace():
+                    self._token_start = i
+                    self._state = "scalar"
+        return done
+
+
+class StreamMonitor:
+    """
+    Per-prompt streaming timings: time to first token, time until the prompt's decision
+    field (`decision_fields`, prompt template -> top-level field) was parseable, total
+    stream time, and how many streams were cut off once their JSON object closed.
+    """
+
+    def __init__(self, decision_fields: Optional[Mapping[str, str]] = None):
+        self.decision_fields = dict(decision_fields or {})
+        self._stats: Dict[str, Dict[str, float]] = defaultdict(
+            lambda: {"streams": 0, "ttft": 0.0, "first_tokens": 0, "decision": 0.0, "decisions": 0,
+                     "total": 0.0, "cut_off": 0, "saved": 0.0}
+        )
+
+    def record_cut_off(self, prompt: Optional[str]):
+        self._stats[prompt or "-"]["cut_off"] += 1
+
+    def record(self, prompt: Optional[str], ttft: Optional[float], time_to_decision: Optional[float], total: float):
+        s = self._stats[prompt or "-"]
+        s["streams"] += 1
+        s["total"] += total
+        if ttft is not None:
+            s["ttft"] += ttft
+            s["first_tokens"] += 1
+        if time_to_decision is not None:
+            s["decision"] += time_to_decision
+            s["decisions"] += 1
+            s["saved"] += total - time_to_decision
+
+    def report(self) -> Dict[str, Dict[str, float]]:
+        return {
+            prompt: {
+                "streams": s["streams"],
+                "avg_ttft": s["ttft"] / s["first_tokens"] if s["first_tokens"] else 0.0,
+                "avg_time_to_decision": s["decision"] / s["decisions"] if s["decisions"] else None,
+                "avg_total": s["total"] / s["streams"] if s["streams"] else 0.0,
+                "decision_lead": s["saved"] / s["decisions"] if s["decisions"] else None,
+                "cut_off": s["cut_off"],
+            }
+            for prompt, s in self._stats.items()
+        }
+
+    def log_report(self, logger):
+        columns = ["Prompt", "Streams", "Avg TTFT", "Avg Time To Decision", "Avg Total", "Cut Off"]
+        rows = [
+            [prompt, r["streams"], f"{r['avg_ttft']:.2f}s",
+             "-" if r["avg_time_to_decision"] is None else f"{r['avg_time_to_decision']:.2f}s",
+             f"{r['avg_total']:.2f}s", r["cut_off"]]
+            for prompt, r in self.report().items()
+        ]
+        if rows:
+            logger.log_table("Streaming", columns, rows)
+
+    def summary(self) -> str:
+        stats = list(self._stats.values())
+        streams = sum(s["streams"] for s in stats)
+        if not streams:
+            return "Streaming: no streamed calls"
+        first = sum(s["first_tokens"] for s in stats)
+        decisions = sum(s["decisions"] for s in stats)
+        text = (
+            f"Streaming: streams={streams} avg_ttft={sum(s['ttft'] for s in stats) / first if first else 0:.2f}s "
+            f"avg_total={sum(s['total'] for s in stats) / streams:.2f}s "
+            f"cut_off={sum(s['cut_off'] for s in stats)}"
+        )
+        if decisions:
+            text += (
+                f" decisions={decisions} avg_time_to_decision={sum(s['decision'] for s in stats) / decisions:.2f}s "
+                f"(lead {sum(s['saved'] for s in stats) / decisions:.2f}s)"
+            )
+        return text
+
+
+class StreamingJsonClient(WrappedChatCompletionClient):
+    """
+    Parses streamed replies as they arrive. The decision field of the calling prompt
+    (CallContext.prompt) is handed to the `on_early_decision` listeners as soon as it is
+    complete. Non-stream calls pass through untouched; cutting a reply off at the end of
+    its JSON object is JsonCutoffClient's job, further down the chain.
+    """
+
+    def __init__(self, inner: ChatCompletionClient, monitor: StreamMonitor):
+        super().__init__(inner)
+        self._monitor = monitor
+
+    async def create_stream(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools: Sequence[Tool | ToolSchema] = [],
+        tool_choice: Tool | Literal["auto", "required", "none"] = "auto",
+        json_output: Optional[bool | type[BaseModel]] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> AsyncGenerator[Union[str, CreateResult], None]:
+        context = current_context()
+        decision_field = self._monitor.decision_fields.get(context.prompt)
+        listeners = _DECISION_LISTENERS.get()
+        parser = IncrementalJsonParser()
+        ttft = time_to_decision = None
+        started = time.perf_counter()
+
+        stream = super().create_stream(
+            messages, tools=tools, tool_choice=tool_choice, json_output=json_output,
+            extra_create_args=extra_create_args, cancellation_token=cancellation_token,
+        )
+        try:
+            async for chunk in stream:
+                if isinstance(chunk, str):
+                    if ttft is None:
+                        ttft = time.perf_counter() - started
+                    for field, value in parser.feed(chunk):
+                        if field == decision_field and time_to_decision is None:
+                            time_to_decision = time.perf_counter() - started
+                            for listener in listeners:
+                                listener(field, value, time_to_decision, context)
+                yield chunk
+        finally:
+            await stream.aclose()
+        self._monitor.record(context.prompt, ttft, time_to_decision, time.perf_counter() - started)
+
+
+class JsonCutoffClient(WrappedChatCompletionClient):
+    """
+    Ends a streamed JSON reply at the close of its object: nothing after it is forwarded,
+    and a model that keeps talking past it is disconnected, the final CreateResult being
+    built from the object text (usage estimated). It sits below cache, budget, rate
+    limiting and replay (MIDDLEWARE_LAYERS), so those layers see the cut-off reply like
+    any other. With `enabled=False`, and for non-stream calls, it passes through.
+    """
+
+    def __init__(self, inner: ChatCompletionClient, monitor: StreamMonitor, enabled: bool = True):
+        super().__init__(inner)
+        self._monitor = monitor
+        self._enabled = enabled
+
+    async def create_stream(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools: Sequence[Tool | ToolSchema] = [],
+        tool_choice: Tool | Literal["auto", "required", "none"] = "auto",
+        json_output: Optional[bool | type[BaseModel]] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> AsyncGenerator[Union[str, CreateResult], None]:
+        stream = super().create_stream(
+            messages, tools=tools, tool_choice=tool_choice, json_output=json_output,
+            extra_create_args=extra_create_args, cancellation_token=cancellation_token,
+        )
+        parser = IncrementalJsonParser()
+        cut_off = False
+        try:
+            async for chunk in stream:
+                if not self._enabled or not isinstance(chunk, str):
+                    yield chunk
+                    continue
+                parser.feed(chunk)
+                if parser.complete:
+                    # 对象闭合后的内容不再转发; 模型仍在继续输出时直接断开
+                    trailing = parser.text[parser.end:]
+                    chunk = chunk[:max(0, len(chunk) - len(trailing))]
+                    cut_off = bool(trailing.strip())
+                if chunk:
+                    yield chunk
+                if cut_off:
+                    break
+        finally:
+            await stream.aclose()
+
+        if cut_off:
+            self._monitor.record_cut_off(current_context().prompt)
+            content = parser.object_text
+            yield CreateResult(
+                finish_reason="stop",
+                content=content,
+                usage=RequestUsage(
+                    prompt_tokens=estimate_messages_tokens(messages),
+                    completion_tokens=estimate_tokens(content),
+                ),
+                cached=False,
+            )
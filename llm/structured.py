@@ -0,0 +1,185 @@
+import contextvars
+import copy
+from contextlib import contextmanager
+from typing import Any, AsyncGenerator, Awaitable, Callable, Dict, List, Literal, Mapping, Optional, Sequence, TypeVar, Union
+
+from autogen_core import CancellationToken
+from autogen_core.models import ChatCompletionClient, CreateResult, LLMMessage, SystemMessage
+from autogen_core.tools import Tool, ToolSchema
+from pydantic import BaseModel, ValidationError
+
+from llm.client import WrappedChatCompletionClient
+from llm.repair import validation_errors
+from utils import extract_json
+from utils_json import dumps
+
+T = TypeVar("T", bound=BaseModel)
+
+SCHEMA_INSTRUCTION = "\n\n【重要】请严格按照以下 JSON Schema 格式输出结果，不要包含 markdown 标记：\n{schema}"
+
+# repair(raw reply, model, defaults, original request) -> best-effort dict (JsonRepairer.repair)
+Repair = Callable[[Optional[str], type[BaseModel], Dict[str, Any], str], Awaitable[Dict[str, Any]]]
+
+_OUTPUT_DEFAULTS: contextvars.ContextVar[Dict[str, Any]] = contextvars.ContextVar("llm_output_defaults", default={})
+_OUTPUT_FALLBACKS: contextvars.ContextVar[Dict[str, Any]] = contextvars.ContextVar("llm_output_fallbacks", default={})
+
+
+@contextmanager
+def output_defaults(**values):
+    """Field values the caller fills in itself when a structured reply leaves them out."""
+    token = _OUTPUT_DEFAULTS.set({**_OUTPUT_DEFAULTS.get(), **values})
+    try:
+        yield
+    finally:
+        _OUTPUT_DEFAULTS.reset(token)
+
+
+@contextmanager
+def output_fallbacks(**values):
+    """Field values used when a structured reply is still missing or invalid after repair."""
+    token = _OUTPUT_FALLBACKS.set({**_OUTPUT_FALLBACKS.get(), **values})
+    try:
+        yield
+    finally:
+        _OUTPUT_FALLBACKS.reset(token)
+
+
+def with_schema_instruction(messages: Sequence[LLMMessage], model: type[BaseModel]) -> List[LLMMessage]:
+    """Appends the JSON Schema of `model` to the first system message (or adds one)."""
+    instruction = SCHEMA_INSTRUCTION.format(schema=dumps(model.model_json_schema()))
+    messages = list(messages)
+    for i, m in enumerate(messages):
+        if isinstance(m, SystemMessage):
+            messages[i] = m.model_copy(update={"content": m.content + instruction})
+            return messages
+    return [SystemMessage(content=instruction.lstrip())] + messages
+
+
+def request_text(messages: Sequence[LLMMessage]) -> str:
+    """The text parts of a request, in order, as the original prompt for a repair follow-up."""
+    return "\n\n".join(m.content for m in messages if isinstance(getattr(m, "content", None), str))
+
+
+class StructuredOutput:
+    """
+    Turns model replies into valid instances of a pydantic model (configs/roles.py): the
+    reply is validated, run through `repair` when fields are missing or invalid, and
+    returned as the model's canonical JSON. Fields still invalid after repair take the
+    caller's `output_fallbacks`; a reply with no JSON object at all, or one the fallbacks
+    do not cover, raises ValueError.
+    """
+
+    def __init__(self, repair: Optional[Repair] = None):
+        self._repair = repair
+        self.replies = 0
+        self.repaired = 0
+        self.fell_back = 0
+        self.failed = 0
+
+    async def coerce(self, result: CreateResult, model: type[BaseModel], request: str = "") -> CreateResult:
+        if not isinstance(result.content, str):
+            return result
+        self.replies += 1
+        defaults = {k: v for k, v in _OUTPUT_DEFAULTS.get().items() if k in model.model_fields}
+        data = extract_json(result.content)
+        if not isinstance(data, dict):
+            data = {}
+        parsed = bool(data)
+        for name, value in defaults.items():
+            data.setdefault(name, value)
+        try:
+            instance = model.model_validate(data)
+        except ValidationError:
+            if self._repair is not None:
+                data = await self._repair(result.content, model, defaults, request)
+            try:
+                instance = model.model_validate(data)
+                self.repaired += 1
+            except ValidationError as e:
+                instance = self._fall_back(model, data, parsed, e)
+        return result.model_copy(update={"content": instance.model_dump_json()})
+
+    def _fall_back(self, model: type[T], data: Dict[str, Any], parsed: bool, error: ValidationError) -> T:
+        fallbacks = _OUTPUT_FALLBACKS.get()
+        if parsed:
+            for name in validation_errors(model, data):
+                if name in fallbacks:
+                    data[name] = copy.deepcopy(fallbacks[name])
+            try:
+                instance = model.model_validate(data)
+            except ValidationError as e:
+                error = e
+            else:
+                self.fell_back += 1
+                return instance
+        self.failed += 1
+        raise ValueError(f"Model reply is not a valid {model.__name__} after repair: {error}") from error
+
+    def summary(self) -> str:
+        return (
+            f"Structured Output: replies={self.replies} repaired={self.repaired} "
+            f"fallbacks={self.fell_back} failed={self.failed}"
+        )
+
+
+class StructuredOutputClient(WrappedChatCompletionClient):
+    """
+    Serves `json_output=<pydantic model>` (AssistantAgent.output_content_type) on providers
+    without json_schema response formats: the request goes out in json_object mode with the
+    model's schema in the system prompt and the reply goes through StructuredOutput, so the
+    agent's StructuredMessage always parses. Other calls pass through untouched.
+    """
+
+    def __init__(self, inner: ChatCompletionClient, structured: StructuredOutput):
+        super().__init__(inner)
+        self._structured = structured
+
+    @staticmethod
+    def _model(json_output) -> Optional[type[BaseModel]]:
+        if isinstance(json_output, type) and issubclass(json_output, BaseModel):
+            return json_output
+        return None
+
+    async def create(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools: Sequence[Tool | ToolSchema] = [],
+        tool_choice: Tool | Literal["auto", "required", "none"] = "auto",
+        json_output: Optional[bool | type[BaseModel]] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> CreateResult:
+        model = self._model(json_output)
+        if model is None:
+            return await super().create(
+                messages, tools=tools, tool_choice=tool_choice, json_output=json_output,
+                extra_create_args=extra_create_args, cancellation_token=cancellation_token,
+            )
+        result = await super().create(
+            with_schema_instruction(messages, model), tools=tools, tool_choice=tool_choice, json_output=True,
+            extra_create_args=extra_create_args, cancellation_token=cancellation_token,
+        )
+        return await self._structured.coerce(result, model, request_text(messages))
+
+    async def create_stream(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools: Sequence[Tool | ToolSchema] = [],
+        tool_choice: Tool | Literal["auto", "required", "none"] = "auto",
+        json_output: Optional[bool | type[BaseModel]] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> AsyncGenerator[Union[str, CreateResult], None]:
+        model = self._model(json_output)
+        request = request_text(messages)
+        if model is not None:
+            messages = with_schema_instruction(messages, model)
+        async for chunk in super().create_stream(
+            messages, tools=tools, tool_choice=tool_choice, json_output=True if model else json_output,
+            extra_create_args=extra_create_args, cancellation_token=cancellation_token,
+        ):
+            if model is not None and isinstance(chunk, CreateResult):
+                chunk = await self._structured.coerce(chunk, model, request)
+            yield chunk
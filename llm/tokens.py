@@ -0,0 +1,37 @@
+import re
+from typing import Sequence
+
+from autogen_core.models import LLMMessage
+
+_CJK_RE = re.compile(r"[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uff00-\uffef]")
+
+# GLM 分词器下中文约 0.7 token/字, 英文约 4 字符/token, 偏保守估计
+CJK_TOKENS_PER_CHAR = 0.7
+OTHER_CHARS_PER_TOKEN = 4.0
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Offline token estimate, no tokenizer download or network call needed."""
+    if not text:
+        return 0
+    cjk = len(_CJK_RE.findall(text))
+    other = len(text) - cjk
+    return int(cjk * CJK_TOKENS_PER_CHAR + other / OTHER_CHARS_PER_TOKEN) + 1
+
+
+def estimate_messages_tokens(messages: Sequence[LLMMessage]) -> int:
+    total = 0
+    for m in messages:
+        content = getattr(m, "content", "")
+        if isinstance(content, str):
+            total += estimate_tokens(content)
+        else:
+            total += estimate_tokens(str(content))
+        total += MESSAGE_OVERHEAD_TOKENS
+    return total
+
+
+def estimate_chat_tokens(messages: Sequence[dict]) -> int:
+    """Same estimate for raw OpenAI-style {"role", "content"} dicts."""
+    return sum(estimate_tokens(m.get("content") or "") + MESSAGE_OVERHEAD_TOKENS for m in messages)
@@ -0,0 +1,198 @@
+import asyncio
+import importlib.util
+import os
+import threading
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+import httpx
+
+
+def http2_available() -> bool:
+    return importlib.util.find_spec("h2") is not None
+
+
+@dataclass
+class TransportConfig:
+    """
+    Connection pool settings shared by every client in api.py.
+    max_per_host = 0 means only the pool-wide max_connections applies.
+    """
+    max_connections: int = 100
+    max_keepalive_connections: int = 20
+    keepalive_expiry: float = 60.0
+    max_per_host: int = 0
+    http2: bool = False
+    connect_timeout: float = 10.0
+
+    @classmethod
+    def from_env(cls) -> "TransportConfig":
+        http2_env = os.getenv("LLM_HTTP2", "auto").lower()
+        if http2_env == "auto":
+            http2 = http2_available()
+        else:
+            http2 = http2_env in ("1", "true", "on") and http2_available()
+        return cls(
+            max_connections=int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "100")),
+            max_keepalive_connections=int(os.getenv("LLM_HTTP_MAX_KEEPALIVE", "20")),
+            keepalive_expiry=float(os.getenv("LLM_HTTP_KEEPALIVE_EXPIRY", "60")),
+            max_per_host=int(os.getenv("LLM_HTTP_MAX_PER_HOST", "0")),
+            http2=http2,
+            connect_timeout=float(os.getenv("LLM_HTTP_CONNECT_TIMEOUT", "10")),
+        )
+
+    @property
+    def limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive_connections,
+            keepalive_expiry=self.keepalive_expiry,
+        )
+
+    @property
+    def timeout(self) -> httpx.Timeout:
+        # read/write 超时由各个 SDK 客户端按请求覆盖, 这里只约束建连
+        return httpx.Timeout(None, connect=self.connect_timeout)
+
+
+class _ReleasingAsyncStream(httpx.AsyncByteStream):
+    """Keeps the per-host slot until the response body has been consumed."""
+
+    def __init__(self, stream: httpx.AsyncByteStream, release):
+        self._stream = stream
+        self._release = release
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            self._release()
+
+
+class _ReleasingSyncStream(httpx.SyncByteStream):
+    def __init__(self, stream: httpx.SyncByteStream, release):
+        self._stream = stream
+        self._release = release
+
+    def __iter__(self):
+        for chunk in self._stream:
+            yield chunk
+
+    def close(self):
+        try:
+            self._stream.close()
+        finally:
+            self._release()
+
+
+def _once(fn):
+    done = False
+
+    def wrapper():
+        nonlocal done
+        if not done:
+            done = True
+            fn()
+    return wrapper
+
+
+class PooledAsyncTransport(httpx.AsyncBaseTransport):
+    """httpx transport with an optional in-flight limit per host on top of the shared pool."""
+
+    def __init__(self, config: TransportConfig):
+        self.config = config
+        self._transport = httpx.AsyncHTTPTransport(limits=config.limits, http2=config.http2, retries=0)
+        self._host_slots: Dict[str, asyncio.Semaphore] = {}
+        self.requests = 0
+        self.requests_per_host: Dict[str, int] = defaultdict(int)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        host = request.url.host
+        self.requests += 1
+        self.requests_per_host[host] += 1
+        if self.config.max_per_host <= 0:
+            return await self._transport.handle_async_request(request)
+
+        slot = self._host_slots.setdefault(host, asyncio.Semaphore(self.config.max_per_host))
+        await slot.acquire()
+        release = _once(slot.release)
+        try:
+            response = await self._transport.handle_async_request(request)
+        except BaseException:
+            release()
+            raise
+        response.stream = _ReleasingAsyncStream(response.stream, release)
+        return response
+
+    def open_connections(self) -> int:
+        pool = getattr(self._transport, "_pool", None)
+        return len(getattr(pool, "connections", []))
+
+    async def aclose(self):
+        await self._transport.aclose()
+
+
+class PooledSyncTransport(httpx.BaseTransport):
+    def __init__(self, config: TransportConfig):
+        self.config = config
+        self._transport = httpx.HTTPTransport(limits=config.limits, http2=config.http2, retries=0)
+        self._host_slots: Dict[str, threading.BoundedSemaphore] = {}
+        self._lock = threading.Lock()
+        self.requests = 0
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        self.requests += 1
+        if self.config.max_per_host <= 0:
+            return self._transport.handle_request(request)
+
+        with self._lock:
+            slot = self._host_slots.setdefault(request.url.host, threading.BoundedSemaphore(self.config.max_per_host))
+        slot.acquire()
+        release = _once(slot.release)
+        try:
+            response = self._transport.handle_request(request)
+        except BaseException:
+            release()
+            raise
+        response.stream = _ReleasingSyncStream(response.stream, release)
+        return response
+
+    def close(self):
+        self._transport.close()
+
+
+class SharedTransport:
+    """
+    One keep-alive pool for the async clients (AsyncOpenAI + both autogen clients) and one
+    for the synchronous ZhipuAiClient, built from the same TransportConfig.
+    httpx cannot share a pool between sync and async clients, hence the pair.
+    """
+
+    def __init__(self, config: Optional[TransportConfig] = None):
+        self.config = config or TransportConfig.from_env()
+        self.async_transport = PooledAsyncTransport(self.config)
+        self.sync_transport = PooledSyncTransport(self.config)
+        self.async_client = httpx.AsyncClient(
+            transport=self.async_transport, timeout=self.config.timeout, follow_redirects=True
+        )
+        self.sync_client = httpx.Client(
+            transport=self.sync_transport, timeout=self.config.timeout, follow_redirects=True
+        )
+
+    def summary(self) -> str:
+        c = self.config
+        return (
+            f"HTTP Pool: http2={'on' if c.http2 else 'off'} max_connections={c.max_connections} "
+            f"keepalive={c.max_keepalive_connections} per_host={c.max_per_host or '-'} "
+            f"requests={self.async_transport.requests + self.sync_transport.requests} "
+            f"open_connections={self.async_transport.open_connections()}"
+        )
+
+    async def aclose(self):
+        await self.async_client.aclose()
+        self.sync_client.close()
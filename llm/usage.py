@@ -0,0 +1,242 @@
+import json
+import os
+import re
+import time
+from collections import defaultdict
+from dataclasses import asdict, dataclass
+from typing import Any, AsyncGenerator, Callable, Dict, List, Literal, Mapping, Optional, Sequence, Union
+
+from autogen_core import CancellationToken
+from autogen_core.models import ChatCompletionClient, CreateResult, LLMMessage
+from autogen_core.tools import Tool, ToolSchema
+from pydantic import BaseModel
+
+from llm.client import WrappedChatCompletionClient
+from llm.context import CallContext, current_context
+
+# Business_Dept_<company_id> -> Business_Dept, CEO_<company_id> -> CEO
+_ROLE_RE = re.compile(r"^([A-Za-z]+(?:_Dept|_SA)?)_")
+
+DIMENSIONS = ("phase", "week", "company", "agent", "prompt")
+
+
+def agent_role(agent_name: Optional[str]) -> Optional[str]:
+    if not agent_name:
+        return agent_name
+    m = _ROLE_RE.match(agent_name)
+    return m.group(1) if m else agent_name
+
+
+@dataclass
+class UsageRecord:
+    phase: Optional[str]
+    week: Optional[int]
+    company: Optional[str]
+    agent: Optional[str]
+    prompt: Optional[str]
+    prompt_tokens: int
+    completion_tokens: int
+    latency: float
+    cached: bool
+    ts: float
+    attempt: bool = False
+
+
+class UsageLedger:
+    """
+    Collects the token usage (CreateResult.usage, i.e. TextMessage.models_usage) and latency
+    of every model call, tagged with the current CallContext, and aggregates it per phase /
+    week / company / department agent / prompt template. Cached responses are counted but
+    cost nothing. Every `listeners` callback receives each UsageRecord as it is recorded.
+
+    Calls and wire attempts are recorded separately: `record` counts one logical call and
+    its latency, `record_attempt` the tokens of every request that went out on the wire,
+    so retries, hedge duplicates and budget refits are billed even though only one result
+    reaches the caller.
+    """
+
+    def __init__(self, prompt_price_per_1k: float = 0.0, completion_price_per_1k: float = 0.0,
+                 export_path: Optional[str] = None):
+        self.prompt_price_per_1k = prompt_price_per_1k
+        self.completion_price_per_1k = completion_price_per_1k
+        self.export_path = export_path
+        self.records: List[UsageRecord] = []
+        self.listeners: List[Callable[[UsageRecord], None]] = []
+        self.started = time.time()
+
+    @classmethod
+    def from_env(cls) -> "UsageLedger":
+        return cls(
+            prompt_price_per_1k=float(os.getenv("LLM_PRICE_PROMPT_PER_1K", "0")),
+            completion_price_per_1k=float(os.getenv("LLM_PRICE_COMPLETION_PER_1K", "0")),
+            export_path=os.getenv("LLM_USAGE_EXPORT", "../logs/llm_usage.json") or None,
+        )
+
+    def record(self, prompt_tokens: int, completion_tokens: int, latency: float, cached: bool = False,
+               context: Optional[CallContext] = None, attempt: bool = False):
+        ctx = context or current_context()
+        record = UsageRecord(
+            phase=ctx.phase,
+            week=ctx.week,
+            company=ctx.company,
+            agent=agent_role(ctx.agent),
+            prompt=ctx.prompt,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            latency=latency,
+            cached=cached,
+            ts=time.time(),
+            attempt=attempt,
+        )
+        self.records.append(record)
+        for listener in self.listeners:
+            listener(record)
+
+    def record_attempt(self, prompt_tokens: int, completion_tokens: int, latency: float,
+                       context: Optional[CallContext] = None):
+        self.record(prompt_tokens, completion_tokens, latency, context=context, attempt=True)
+
+    def cost(self, prompt_tokens: int, completion_tokens: int) -> float:
+        return (prompt_tokens * self.prompt_price_per_1k + completion_tokens * self.completion_price_per_1k) / 1000
+
+    @staticmethod
+    def _empty() -> Dict[str, Any]:
+        return {"calls": 0, "cached": 0, "attempts": 0, "prompt_tokens": 0, "completion_tokens": 0, "latency": 0.0}
+
+    def _add(self, bucket: Dict[str, Any], r: UsageRecord):
+        if r.attempt:
+            bucket["attempts"] += 1
+            bucket["prompt_tokens"] += r.prompt_tokens
+            bucket["completion_tokens"] += r.completion_tokens
+            return
+        bucket["calls"] += 1
+        if r.cached:
+            bucket["cached"] += 1
+            return
+        bucket["prompt_tokens"] += r.prompt_tokens
+        bucket["completion_tokens"] += r.completion_tokens
+        bucket["latency"] += r.latency
+
+    def _finish(self, bucket: Dict[str, Any]) -> Dict[str, Any]:
+        live = bucket["calls"] - bucket["cached"]
+        bucket["total_tokens"] = bucket["prompt_tokens"] + bucket["completion_tokens"]
+        bucket["avg_latency"] = bucket["latency"] / live if live else 0.0
+        bucket["cost"] = self.cost(bucket["prompt_tokens"], bucket["completion_tokens"])
+        return bucket
+
+    def totals(self) -> Dict[str, Any]:
+        bucket = self._empty()
+        for r in self.records:
+            self._add(bucket, r)
+        return self._finish(bucket)
+
+    def by(self, dimension: str) -> Dict[str, Dict[str, Any]]:
+        """Aggregates per value of `dimension`, most expensive first."""
+        if dimension not in DIMENSIONS:
+            raise ValueError(f"Unknown usage dimension: {dimension} (expected one of {DIMENSIONS})")
+        buckets: Dict[str, Dict[str, Any]] = defaultdict(self._empty)
+        for r in self.records:
+            self._add(buckets[str(getattr(r, dimension) or "-")], r)
+        finished = {key: self._finish(b) for key, b in buckets.items()}
+        return dict(sorted(finished.items(), key=lambda kv: kv[1]["total_tokens"], reverse=True))
+
+    def log_summary(self, logger, dimensions: Sequence[str] = ("phase", "agent", "prompt")):
+        columns = ["Key", "Calls", "Cached", "Attempts", "Prompt Tok", "Completion Tok", "Avg Latency (s)", "Cost"]
+        for dimension in dimensions:
+            rows = [
+                [key, b["calls"], b["cached"], b["attempts"], b["prompt_tokens"], b["completion_tokens"],
+                 f"{b['avg_latency']:.2f}", f"{b['cost']:.4f}"]
+                for key, b in self.by(dimension).items()
+            ]
+            if rows:
+                logger.log_table(f"LLM Usage by {dimension}", columns, rows)
+
+    def export(self, path: Optional[str] = None) -> Optional[str]:
+        path = path or self.export_path
+        if not path:
+            return None
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        data = {
+            "started": self.started,
+            "finished": time.time(),
+            "prices_per_1k": {"prompt": self.prompt_price_per_1k, "completion": self.completion_price_per_1k},
+            "run": self.totals(),
+            **{f"by_{d}": self.by(d) for d in DIMENSIONS},
+            "records": [asdict(r) for r in self.records],
+        }
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        return path
+
+    def summary(self) -> str:
+        t = self.totals()
+        text = (
+            f"Usage: calls={t['calls']} (cached {t['cached']}) attempts={t['attempts']} tokens={t['prompt_tokens']}+{t['completion_tokens']} "
+            f"avg_latency={t['avg_latency']:.2f}s"
+        )
+        if self.prompt_price_per_1k or self.completion_price_per_1k:
+            text += f" cost={t['cost']:.4f}"
+        return text
+
+
+class UsageLedgerClient(WrappedChatCompletionClient):
+    """
+    Records every call and its latency in the ledger. Tokens are left to WireUsageClient
+    on the innermost layers, which sees each attempt rather than only the final result.
+    """
+
+    def __init__(self, inner: ChatCompletionClient, ledger: UsageLedger):
+        super().__init__(inner)
+        self._ledger = ledger
+
+    def _record(self, result: CreateResult, latency: float):
+        self._ledger.record(0, 0, latency, cached=result.cached)
+
+    async def create(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools: Sequence[Tool | ToolSchema] = [],
+        tool_choice: Tool | Literal["auto", "required", "none"] = "auto",
+        json_output: Optional[bool | type[BaseModel]] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> CreateResult:
+        start = time.perf_counter()
+        result = await super().create(
+            messages, tools=tools, tool_choice=tool_choice, json_output=json_output,
+            extra_create_args=extra_create_args, cancellation_token=cancellation_token,
+        )
+        self._record(result, time.perf_counter() - start)
+        return result
+
+    async def create_stream(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools: Sequence[Tool | ToolSchema] = [],
+        tool_choice: Tool | Literal["auto", "required", "none"] = "auto",
+        json_output: Optional[bool | type[BaseModel]] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> AsyncGenerator[Union[str, CreateResult], None]:
+        start = time.perf_counter()
+        async for chunk in super().create_stream(
+            messages, tools=tools, tool_choice=tool_choice, json_output=json_output,
+            extra_create_args=extra_create_args, cancellation_token=cancellation_token,
+        ):
+            if isinstance(chunk, CreateResult):
+                self._record(chunk, time.perf_counter() - start)
+            yield chunk
+
+
+class WireUsageClient(UsageLedgerClient):
+    """Records the token usage of every request that reaches the wire as a ledger attempt."""
+
+    def _record(self, result: CreateResult, latency: float):
+        usage = result.usage
+        self._ledger.record_attempt(
+            usage.prompt_tokens if usage else 0,
+            usage.completion_tokens if usage else 0,
+            latency,
+        )
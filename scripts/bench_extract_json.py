@@ -0,0 +1,103 @@
+"""
+Benchmarks utils.extract_json against the previous three-pass regex extractor on the
+model replies recorded in logs/*.md (the "> **Agent (Title)**:" blocks). Every reply is
+also wrapped the ways models actually return JSON: a ```json fence, a preamble, and a
+trailing remark containing braces.
+
+    python scripts/bench_extract_json.py [--logs "logs/*.md"] [--repeat 200]
+"""
+import argparse
+import glob
+import json
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import extract_json
+
+REPLY_HEADER = re.compile(r"^> \*\*.+\*\*:$")
+
+VARIANTS = {
+    "raw": "{}",
+    "fenced": "```json\n{}\n```",
+    "preamble": "好的，以下是我的输出结果：\n{}",
+    "trailing": "{}\n\n说明: 字段格式参考 {{\"key\": value}}，如有疑问请告知。",
+}
+
+
+def legacy_extract_json(text):
+    """utils.extract_json before the single-pass scanner (prints silenced)."""
+    try:
+        clean_text = text.replace("```json", "").replace("```", "").strip()
+        return json.loads(clean_text)
+    except json.JSONDecodeError:
+        pass
+    try:
+        if "```json" in text:
+            match = re.search(r"```json(.*?)```", text, re.DOTALL)
+            if match:
+                return json.loads(match.group(1).strip())
+        match = re.search(r"\{.*\}", text, re.DOTALL)
+        if match:
+            return json.loads(match.group(0).strip())
+    except Exception:
+        pass
+    return {}
+
+
+def load_replies(pattern):
+    """Blockquoted agent outputs from the markdown logs that contain a JSON object."""
+    replies = []
+    for path in sorted(glob.glob(pattern)):
+        with open(path, encoding="utf-8") as f:
+            lines = f.read().splitlines()
+        i = 0
+        while i < len(lines):
+            if REPLY_HEADER.match(lines[i]):
+                body = []
+                i += 1
+                while i < len(lines) and lines[i].startswith(">"):
+                    body.append(lines[i][2:] if lines[i].startswith("> ") else lines[i][1:])
+                    i += 1
+                reply = "\n".join(body).strip()
+                if "{" in reply:
+                    replies.append(reply)
+            else:
+                i += 1
+    return replies
+
+
+def bench(fn, texts, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for text in texts:
+            fn(text)
+    return (time.perf_counter() - start) / (repeat * len(texts)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logs", default=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "logs", "*.md"))
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    replies = load_replies(args.logs)
+    if not replies:
+        sys.exit(f"No replies found in {args.logs}")
+    print(f"{len(replies)} replies from {args.logs}, avg {sum(map(len, replies)) / len(replies):.0f} chars\n")
+    print(f"{'variant':<10} {'legacy us':>10} {'scanner us':>11} {'speedup':>8} {'legacy ok':>10} {'scanner ok':>11}")
+    for name, template in VARIANTS.items():
+        texts = [template.replace("{}", reply, 1) for reply in replies]
+        legacy_ok = sum(bool(legacy_extract_json(t)) for t in texts)
+        scanner_ok = sum(bool(extract_json(t)) for t in texts)
+        legacy_us = bench(legacy_extract_json, texts, args.repeat)
+        scanner_us = bench(extract_json, texts, args.repeat)
+        print(f"{name:<10} {legacy_us:>10.1f} {scanner_us:>11.1f} {legacy_us / scanner_us:>7.2f}x "
+              f"{legacy_ok:>6}/{len(texts):<3} {scanner_ok:>7}/{len(texts):<3}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,13 @@
+#!/bin/bash
+
+PROJECT_ROOT="/data1/wyh/ai-town-x/AgentCompany"
+export PYTHONPATH="$PROJECT_ROOT:$PYTHONPATH"
+
+# 启动后将 GLM_BASE_URL 指向本地即可离线压测:
+#   export GLM_BASE_URL="http://127.0.0.1:8000/api/paas/v4/"
+python3 "$PROJECT_ROOT/llm/mock_server.py" \
+    --port 8000 \
+    --latency "lognormal:0.0,0.5" \
+    --error_rate 0.01 \
+    --rate_limit_rate 0.02 \
+    >> "$PROJECT_ROOT/logs/mock_server.log" 2>&1
\ No newline at end of file
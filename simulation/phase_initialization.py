@@ -1,155 +1,246 @@
-import json
 import os
 import time
 import re
 import traceback
 import asyncio
 import argparse
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+from pydantic import ValidationError
 from configs.roles import *
 from configs.prompts import INIT_PROMPT
+from configs.prompts import INIT_BATCH_PROMPT
+from configs.prompts import INIT_BATCH_ITEM
 from configs.prompts import REFRESH_PROMPT
 from api import call_glm
 from api import async_call_glm
+from api import llm_stats_summary
+from api import render_prompt
+from api import CONCURRENCY_LIMITER
+from api import PROMPT_SIZER
+from api import JSON_REPAIRER
+from llm.context import call_context
+from llm.tokens import estimate_tokens
 from utils import extract_json
-
-CONCURRENCY_LIMIT = 5
-
-async def async_create_company_instance(info, semaphore):
-    async with semaphore:
-        company_id = info.get('id', '0')
-        name = info.get('公司名称', info.get('name', '未命名公司'))
-        description = info.get('公司介绍', info.get('description', '暂无介绍'))
-        details = info.get('产品服务', info.get('product', ''))
-        # news = info.get('新闻资讯', info.get('history', ''))
-
-        init_info = {
-            "company_id": company_id,
-            "name": name,
-            "description": description,
-            "details": details,
-        }
-        prompt = INIT_PROMPT.format(**init_info)
+from utils_json import load
+from utils_logger import LOGGER
+from utils_loop import LOOP_CHOICES, LOOP_MONITOR, run
+
+# 批量初始化时每家企业预留的输出 token 数
+INIT_BATCH_TOKENS_PER_COMPANY = 1024
+
+def parse_company_info(info) -> Dict[str, Any]:
+    company_id = info.get('id', '0')
+    name = info.get('公司名称', info.get('name', '未命名公司'))
+    description = info.get('公司介绍', info.get('description', '暂无介绍'))
+    details = info.get('产品服务', info.get('product', ''))
+    # news = info.get('新闻资讯', info.get('history', ''))
+
+    return {
+        "company_id": company_id,
+        "name": name,
+        "description": description,
+        "details": details,
+    }
+
+def build_company(init_info: Dict[str, Any], ai_data: Dict[str, Any]) -> Company:
+    tags = ai_data.get("tags", [])
+    strategy_content = ai_data.get("strategy_content", "")
+    current_role_str = ai_data.get("current_role", "Producer")
+
+    # 所有企业都生成战略规划
+    if not strategy_content:
+        strategy_content = "企业发展与技术合作规划。"
+    strategy = StrategicPlan(content=strategy_content)
+
+    # 根据current_role判断当前轮次的角色
+    if "Demander" in current_role_str:
+        role = CompanyRole.DEMANDER
+    else:
+        role = CompanyRole.PRODUCER 
+
+    return Company(
+        company_id=str(init_info["company_id"]),
+        name=init_info["name"],
+        role=role,
+        description=init_info["description"],
+        details=init_info["details"],
+        tags=tags,
+        strategy=strategy,
+        state=CompanyState.IDLE
+    )
+
+async def async_create_company_instance(info):
+    init_info = parse_company_info(info)
+    name = init_info["name"]
+    prompt = render_prompt("INIT_PROMPT", INIT_PROMPT, init_info)
         
-        try:
-            print(f"⏳ 开始生成: {name}...") 
+    try:
+        LOGGER.log_status(f"⏳ 开始生成: {name}...", style="info")
+        with call_context(phase="initialization", company=name, agent="GLM", prompt="INIT_PROMPT"):
             llm_response = await async_call_glm(prompt, schema=CompanyInfo)
-            print(f"🤖 LLM 回答: {llm_response}")
+            LOGGER.log_detail(f"🤖 LLM 回答: {llm_response}")
             
-            ai_data = extract_json(llm_response)
+            ai_data = await JSON_REPAIRER.repair(llm_response, CompanyInfo, prompt=prompt)
             
-            if not ai_data:
-                raise ValueError("LLM 返回无法解析为 JSON")
-
-            tags = ai_data.get("tags", [])
-            strategy_content = ai_data.get("strategy_content", "")
-            current_role_str = ai_data.get("current_role", "Producer")
+        if not ai_data:
+            raise ValueError("LLM 返回无法解析为 JSON")
 
-            # 所有企业都生成战略规划
-            if not strategy_content:
-                strategy_content = "企业发展与技术合作规划。"
-            strategy = StrategicPlan(content=strategy_content)
-
-            # 根据current_role判断当前轮次的角色
-            if "Demander" in current_role_str:
-                role = CompanyRole.DEMANDER
-            else:
-                role = CompanyRole.PRODUCER 
-
-            company = Company(
-                company_id=str(company_id),
-                name=name,
-                role=role,
-                description=description,
-                details=details,
-                tags=tags,
-                strategy=strategy,
-                state=CompanyState.IDLE
-            )
+        company = build_company(init_info, ai_data)
             
-            print(f" [完成] {name} -> Role: {role.value}")
-            return company
+        LOGGER.log_status(f" [完成] {name} -> Role: {company.role.value}", style="success")
+        return company
         
-        except Exception as e:
-            print(f" [失败] {name}")
-            print(f"❌ Error initializing {name}: {e}")
-            # traceback.print_exc()
-            return None
+    except Exception as e:
+        LOGGER.log_status(f" [失败] {name}", style="error")
+        LOGGER.log_status(f"❌ Error initializing {name}: {e}", style="error")
+        # traceback.print_exc()
+        return None
+
+def render_batch_item(index: int, init_info: Dict[str, Any]) -> str:
+    return INIT_BATCH_ITEM.format(index=index, **init_info)
+
+def plan_init_batches(raw_list: List[Dict], batch_size: int) -> List[List[Dict]]:
+    """按 batch_size 分批, 同时保证每批 prompt 不超过 PROMPT_SIZER 的体积上限; 单条就超限的企业单独成批"""
+    base_tokens = estimate_tokens(INIT_BATCH_PROMPT)
+    limit = PROMPT_SIZER.limit
+    batches, current, current_tokens = [], [], base_tokens
+    for info in raw_list:
+        item_tokens = estimate_tokens(render_batch_item(len(current) + 1, parse_company_info(info)))
+        too_big = limit > 0 and current and current_tokens + item_tokens > limit
+        if len(current) >= batch_size or too_big:
+            batches.append(current)
+            current, current_tokens = [], base_tokens
+        current.append(info)
+        current_tokens += item_tokens
+    if current:
+        batches.append(current)
+    return batches
+
+async def async_create_company_batch(infos: List[Dict]) -> List[Company]:
+    """
+    一次请求初始化多家企业, 按 index 拆分回各企业;
+    整批失败或某条结果缺失 / 不合法时, 对这些企业回退到单条调用
+    """
+    if len(infos) == 1:
+        return [await async_create_company_instance(infos[0])]
+
+    init_infos = [parse_company_info(info) for info in infos]
+    prompt = INIT_BATCH_PROMPT.format(
+        count=len(infos),
+        companies="\n".join(render_batch_item(i + 1, init_info) for i, init_info in enumerate(init_infos)),
+    )
+    LOGGER.log_status(f"⏳ 批量生成 {len(infos)} 家: {', '.join(info['name'] for info in init_infos)}...", style="info")
+
+    companies: List[Optional[Company]] = [None] * len(infos)
+    try:
+        with call_context(phase="initialization_batch", agent="GLM", prompt="INIT_BATCH_PROMPT"):
+            llm_response = await async_call_glm(
+                prompt, schema=CompanyInfoBatch, max_tokens=INIT_BATCH_TOKENS_PER_COMPANY * len(infos)
+            )
+        items = extract_json(llm_response).get("companies", [])
+        if not isinstance(items, list):
+            items = []
+        for item in items:
+            try:
+                parsed = CompanyInfoBatchItem.model_validate(item)
+            except ValidationError:
+                continue
+            if 1 <= parsed.index <= len(infos) and companies[parsed.index - 1] is None:
+                companies[parsed.index - 1] = build_company(
+                    init_infos[parsed.index - 1], parsed.model_dump(mode="json")
+                )
+    except Exception as e:
+        LOGGER.log_status(f"❌ Batch of {len(infos)} failed: {e}", style="error")
+
+    missing = [i for i, company in enumerate(companies) if company is None]
+    for i, company in enumerate(companies):
+        if company is not None:
+            LOGGER.log_status(f" [完成] {company.name} -> Role: {company.role.value} (batch)", style="success")
+    if missing:
+        LOGGER.log_status(f"🔁 批量结果缺失 {len(missing)}/{len(infos)} 家, 回退到单条调用", style="info")
+        fallback = await asyncio.gather(*[async_create_company_instance(infos[i]) for i in missing])
+        for i, company in zip(missing, fallback):
+            companies[i] = company
+    return companies
     
-async def async_create_companies_list(data_path: str) -> List[Company]:
+async def async_create_companies_list(data_path: str, batch_size: int = 1) -> List[Company]:
     all_companies = []
 
     if os.path.exists(data_path):
-        print(f"📂 读取数据文件: {data_path}")
-        with open(data_path, "r", encoding="utf-8") as f:
-            raw_list = json.load(f)
+        LOGGER.log_status(f"📂 读取数据文件: {data_path}", style="info")
+        raw_list = load(data_path)
             
-        print(f"📊 共加载 {len(raw_list)} 条原始数据，开始并发初始化 (并发数: {CONCURRENCY_LIMIT})...\n")
-        
-        semaphore = asyncio.Semaphore(CONCURRENCY_LIMIT)
+        LOGGER.log_status(f"📊 共加载 {len(raw_list)} 条原始数据，开始并发初始化 (自适应并发, 当前窗口: {CONCURRENCY_LIMITER.limit})...\n", style="info")
         
-        tasks = []
-        for company_info in raw_list:
-            task = async_create_company_instance(info=company_info, semaphore=semaphore)
-            tasks.append(task)
-        
-        results = await asyncio.gather(*tasks)
+        if batch_size > 1:
+            batches = plan_init_batches(raw_list, batch_size)
+            LOGGER.log_status(f"📦 批量模式: {len(raw_list)} 家企业分为 {len(batches)} 批 (每批最多 {batch_size} 家)", style="info")
+            batch_results = await asyncio.gather(*[async_create_company_batch(batch) for batch in batches])
+            results = [company for batch in batch_results for company in batch]
+        else:
+            tasks = []
+            for company_info in raw_list:
+                task = async_create_company_instance(info=company_info)
+                tasks.append(task)
+            
+            results = await asyncio.gather(*tasks)
         
         all_companies = [r for r in results if r is not None]
         
-        print(f"\n✅ 初始化完成! 成功生成 {len(all_companies)} 个企业 Agent。")
+        LOGGER.log_status(f"\n✅ 初始化完成! 成功生成 {len(all_companies)} 个企业 Agent。", style="success")
+        LOGGER.log_status(f"💾 {llm_stats_summary()}", style="info")
     else:
-        print(f"❌ 文件导入失败: {data_path}")
+        LOGGER.log_status(f"❌ 文件导入失败: {data_path}", style="error")
 
     return all_companies
 
-async def async_refresh_company_instance(company: Company, current_week: int, semaphore):
-    async with semaphore:
-        if not company.is_idle(current_week):
-            return company
+async def async_refresh_company_instance(company: Company, current_week: int):
+    if not company.is_idle(current_week):
+        return company
 
-        history_text = "\n".join(company.project_history[-3:]) if company.project_history else "暂无近期项目历史。"
+    history_text = "\n".join(company.project_history[-3:]) if company.project_history else "暂无近期项目历史。"
         
-        prompt = REFRESH_PROMPT.format(
-            name=company.name,
-            current_week=current_week,
-            description=company.description,
-            last_role=company.role.value,
-            history_summary=history_text
-        )
-
-        try:
+    prompt = render_prompt("REFRESH_PROMPT", REFRESH_PROMPT, dict(
+        name=company.name,
+        current_week=current_week,
+        description=company.description,
+        last_role=company.role.value,
+        history_summary=history_text
+    ))
+
+    try:
+        with call_context(phase="refresh", company=company.name, agent="GLM", prompt="REFRESH_PROMPT"):
             llm_response = await async_call_glm(prompt, schema=CompanyRefreshInfo)
-            ai_data = extract_json(llm_response)
-
-            if ai_data:
-                new_strategy = ai_data.get("strategy_content", company.strategy.content)
-                company.strategy = StrategicPlan(content=new_strategy)
-                role_str = ai_data.get("current_role", "Producer")
-                if "Demander" in role_str:
-                    company.role = CompanyRole.DEMANDER
-                else:
-                    company.role = CompanyRole.PRODUCER
-                company.state = CompanyState.IDLE
+            ai_data = await JSON_REPAIRER.repair(llm_response, CompanyRefreshInfo, prompt=prompt)
+
+        if ai_data:
+            new_strategy = ai_data.get("strategy_content", company.strategy.content)
+            company.strategy = StrategicPlan(content=new_strategy)
+            role_str = ai_data.get("current_role", "Producer")
+            if "Demander" in role_str:
+                company.role = CompanyRole.DEMANDER
+            else:
+                company.role = CompanyRole.PRODUCER
+            company.state = CompanyState.IDLE
                 
-            return company
+        return company
 
-        except Exception as e:
-            print(f"⚠️ 刷新失败 {company.name}: {e}")
-            return company
+    except Exception as e:
+        LOGGER.log_status(f"⚠️ 刷新失败 {company.name}: {e}", style="warning")
+        return company
 
 async def async_refresh_companies_list(companies: List[Company], current_week: int) -> List[Company]:
-    semaphore = asyncio.Semaphore(CONCURRENCY_LIMIT)
     tasks = []
 
     target_companies = [c for c in companies if c.is_idle(current_week)]
-    print(f"🔄 [Week {current_week}] Refreshing strategies for {len(target_companies)} idle companies...")
+    LOGGER.log_status(f"🔄 [Week {current_week}] Refreshing strategies for {len(target_companies)} idle companies...", style="info")
 
     for company in target_companies:
-        task = async_refresh_company_instance(company, current_week, semaphore)
+        task = async_refresh_company_instance(company, current_week)
         tasks.append(task)
     if tasks:
         await asyncio.gather(*tasks)
+        LOGGER.log_status(f"💾 {llm_stats_summary()}", style="info")
 
     return companies
 
@@ -238,14 +329,24 @@ async def async_refresh_companies_list(companies: List[Company], current_week: i
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument('--data_path', type=str, default="../data/companies_info.json", help='Path to the companies_info.json file')
+    parser.add_argument('--batch_size', type=int, default=1, help='Companies per INIT request (1 = one request per company)')
+    parser.add_argument('--loop', type=str, default="auto", choices=LOOP_CHOICES, help='Event loop implementation (auto = uvloop when installed)')
+    parser.add_argument('--loop_lag_ms', type=float, default=None, help='Report event-loop stalls longer than this (0 = off, default LOOP_LAG_MS or 100)')
+    parser.add_argument('--headless', action='store_true', help='Compact one-line console output without rich rendering (default: auto when stdout is not a terminal)')
     args = parser.parse_args()
+    if args.headless:
+        LOGGER.set_headless(True)
 
     data_path = args.data_path
 
     start_time = time.time()
 
     # all_companies = create_companies_list(data_path=data_path)
-    all_companies = asyncio.run(async_create_companies_list(data_path=data_path))
+    all_companies = run(
+        async_create_companies_list(data_path=data_path, batch_size=args.batch_size),
+        loop=args.loop, lag_ms=args.loop_lag_ms,
+    )
+    print(LOOP_MONITOR.summary())
 
     end_time = time.time()
     elapsed_time = end_time - start_time
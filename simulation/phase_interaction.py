@@ -1,5 +1,4 @@
 import sys
-import json
 import os
 import re
 import jieba
@@ -16,15 +15,21 @@ from autogen_agentchat.messages import TextMessage
 from autogen_core import CancellationToken
 
 from utils import extract_json
+from utils_json import dump
 from utils_logger import *
+from utils_loop import LOOP_MONITOR, run
 from api import MODEL_CLIENT
+from api import llm_stats_summary
+from llm.context import call_context
+from llm.streaming import on_early_decision
+from llm.structured import output_defaults, output_fallbacks
 from configs.roles import *
 from group.agents.assistant_agent import AssistantAgent
 from autogen_ext.models.openai import OpenAIChatCompletionClient
 from core.teams.company_demander import DemanderTeamFactory_interaction
 from core.teams.company_producer import ProducerTeamFactory_interaction
+from core.teams.team import team_output
 
-GLOBAL_CONCURRENCY_LIMIT = 5
 MAX_ROUNDS = 3
 logger = LOGGER
 
@@ -46,8 +51,11 @@ class InteractionLogger:
             f"{content}\n"
             f"{'='*60}\n\n"
         )
+        offset = os.path.getsize(self.filename)
         with open(self.filename, "a", encoding="utf-8") as f:
             f.write(log_entry)
+        ref = EventStream.ref(self.filename, (offset, len(log_entry.encode("utf-8"))))
+        LOGGER.events.emit("step", step=step_name, actor=agent_name, ref=ref)
     
     def log_summary(self, results: List[InteractionHistory], total_time: float):
         summary = f"""
@@ -59,6 +67,7 @@ class InteractionLogger:
         Failed: {sum(1 for r in results if r.final_status == 'failure')}
         Total Time: {total_time:.2f}s
         Average Time: {total_time/len(results) if results else 0:.2f}s
+        {llm_stats_summary()}
 
         Detailed Results:
         """
@@ -82,10 +91,9 @@ class phase2_workflow:
         self.matched_list = matched_list
         self.company_map = {c.company_id: c for c in all_companies}
         self.logger = InteractionLogger("../logs/simulation_phase3_interaction_log.txt")
-        self.semaphore = asyncio.Semaphore(GLOBAL_CONCURRENCY_LIMIT)
 
     async def run(self):
-        print(f"\n======== Phase 3: Interaction & Execution Start ========")
+        logger.log_rule("Phase 3: Interaction & Execution Start")
         start_time = time.time()
         tasks = []
 
@@ -93,164 +101,152 @@ class phase2_workflow:
             task = self.process_single_interaction(match)
             tasks.append(task)
 
-        results = await asyncio.gather(*tasks, return_exceptions=True)
+        with call_context(phase="interaction"):
+            results = await asyncio.gather(*tasks, return_exceptions=True)
 
         valid_results = []
         for i, result in enumerate(results):
             if isinstance(result, Exception):
-                print(f"❌ Match {i+1} failed with exception: {result}")
+                logger.log_status(f"❌ Match {i+1} failed with exception: {result}", style="error")
                 self.logger.log_step("Exception", f"Match_{i+1}", str(result))
                 traceback.print_exc() # 打印堆栈以便调试
             elif result is None:
-                print(f"⚠️ Match {i+1} returned None (Unexpected)")
+                logger.log_status(f"⚠️ Match {i+1} returned None (Unexpected)", style="warning")
             else:
                 valid_results.append(result)
 
         end_time = time.time()
         total_duration = end_time - start_time
 
-        print(f"\n======== Phase 3 Completed. Total Interactions: {len(valid_results)}/{len(results)} ========")
+        logger.log_status(f"\n======== Phase 3 Completed. Total Interactions: {len(valid_results)}/{len(results)} ========", style="info")
 
         self.logger.log_summary(valid_results, total_duration)
 
         final_data = [h.to_dict() for h in valid_results]
         try:
-            with open("../logs/final_interaction_history.json", "w", encoding="utf-8") as f:
-                json.dump(final_data, f, ensure_ascii=False, indent=2)
-            print("📁 Final history saved to ../logs/final_interaction_history.json")
+            dump(final_data, "../logs/final_interaction_history.json")
+            logger.log_status("📁 Final history saved to ../logs/final_interaction_history.json", style="info")
         except Exception as e:
-            print(f"❌ Failed to save final json: {e}")
+            logger.log_status(f"❌ Failed to save final json: {e}", style="error")
             
         return valid_results
 
     async def process_single_interaction(self, match: Dict) -> InteractionHistory:
-        async with self.semaphore:
-            demander = self.company_map[match['demander_id']]
-            producer = self.company_map[match['producer_id']]
-            project_data = match['project']
+        demander = self.company_map[match['demander_id']]
+        producer = self.company_map[match['producer_id']]
+        project_data = match['project']
 
-            console.rule(f"[bold magenta]Start Interaction: {demander.name} ⚔️ {producer.name}[/]")
+        logger.log_rule(f"Start Interaction: {demander.name} ⚔️ {producer.name}", style="bold magenta")
             
-            history = InteractionHistory(
-                demander_id=demander.company_id,
-                demander_name=demander.name,
-                producer_id=producer.company_id,
-                producer_name=producer.name,
-                project_id=project_data['project_id'],
-                project_content=project_data['project_content']
-            )
+        history = InteractionHistory(
+            demander_id=demander.company_id,
+            demander_name=demander.name,
+            producer_id=producer.company_id,
+            producer_name=producer.name,
+            project_id=project_data['project_id'],
+            project_content=project_data['project_content']
+        )
             
-            print(f"🚀 Start Interaction: {demander.name} <-> {producer.name}")
+        logger.log_status(f"🚀 Start Interaction: {demander.name} <-> {producer.name}", style="info")
 
-            last_review_content = ""
+        last_review_content = ""
             
-            for round_idx in range(1, MAX_ROUNDS + 1):
-                console.print(f"\n[bold yellow]--- Round {round_idx} ---[/]")
+        for round_idx in range(1, MAX_ROUNDS + 1):
+            logger.log_status(f"\n--- Round {round_idx} ---")
                 
-                try:
-                    # ==========================================================
-                    # Step 1: Producer 生成方案 (ProducerProposal)
-                    # ==========================================================
-                    logger.log_event(producer.name, "Action", f"Drafting Proposal V{round_idx}...")
-                    producer_team = ProducerTeamFactory_interaction.create_team(
-                        producer, round_idx, last_review_content
-                    )
+            try:
+                # ==========================================================
+                # Step 1: Producer 生成方案 (ProducerProposal)
+                # ==========================================================
+                logger.log_event(producer.name, "Action", f"Drafting Proposal V{round_idx}...")
+                producer_team = ProducerTeamFactory_interaction.create_team(
+                    producer, round_idx, last_review_content
+                )
                     
-                    p_task_input = (
-                        f"项目原始需求: {history.project_content}\n"
-                        f"Tags: {project_data.get('tags')}\n"
-                        f"上一轮反馈: {last_review_content if last_review_content else '无 (初始轮)'}"
-                    )
+                p_task_input = (
+                    f"项目原始需求: {history.project_content}\n"
+                    f"Tags: {project_data.get('tags')}\n"
+                    f"上一轮反馈: {last_review_content if last_review_content else '无 (初始轮)'}"
+                )
                     
+                # 版本号由本轮次决定; 修复后仍不合法的字段用原来的默认值
+                with call_context(company=producer.name), output_defaults(version=round_idx), \
+                        output_fallbacks(technical_design="", feature_list=[], implementation_plan="",
+                                         timeline="", risk_analysis=""):
                     p_res = await producer_team.run(task=p_task_input)
-                    p_raw = p_res.messages[-1].content
-                    logger.log_llm_content(producer.name, p_raw, title=f"Proposal V{round_idx}")
-                    self.logger.log_step(f"R{round_idx} Producer Output", producer.name, p_raw)
-                    
-                    p_json = extract_json(p_raw.replace("TERMINATE", "").strip())
-                    if not p_json:
-                        raise ValueError("Producer failed to generate valid JSON")
-
-                    proposal_obj = ProducerProposal(
-                        version=round_idx,
-                        technical_design=p_json.get("technical_design", ""),
-                        feature_list=p_json.get("feature_list", []),
-                        implementation_plan=p_json.get("implementation_plan", ""),
-                        timeline=p_json.get("timeline", ""),
-                        risk_analysis=p_json.get("risk_analysis", "")
-                    )
+                proposal_obj = team_output(p_res, ProducerProposal).model_copy(update={"version": round_idx})
+                # 传给下一个 Agent 的用紧凑 JSON, 日志里的用缩进格式
+                proposal_str_for_review = proposal_obj.model_dump_json()
+                proposal_log = proposal_obj.model_dump_json(indent=2)
+                logger.log_llm_content(producer.name, proposal_log, title=f"Proposal V{round_idx}")
+                self.logger.log_step(f"R{round_idx} Producer Output", producer.name, proposal_log)
 
-                    # ==========================================================
-                    # Step 2: Demander 审阅方案 (DemanderReview)
-                    # ==========================================================
-                    logger.log_event(demander.name, "Action", "Reviewing Proposal...")
-                    proposal_str_for_review = json.dumps(p_json, ensure_ascii=False, indent=2)
+                # ==========================================================
+                # Step 2: Demander 审阅方案 (DemanderReview)
+                # ==========================================================
+                logger.log_event(demander.name, "Action", "Reviewing Proposal...")
                     
-                    demander_team = DemanderTeamFactory_interaction.create_team(
-                        demander, proposal_str_for_review, last_review_content
-                    )
+                demander_team = DemanderTeamFactory_interaction.create_team(
+                    demander, proposal_str_for_review, last_review_content
+                )
                     
-                    d_task_input = f"请审阅乙方提交的第 {round_idx} 版方案，并给出 JSON 格式的反馈。"
+                d_task_input = f"请审阅乙方提交的第 {round_idx} 版方案，并给出 JSON 格式的反馈。"
                     
-                    d_res = await demander_team.run(task=d_task_input)
-                    d_raw = d_res.messages[-1].content
-                    logger.log_llm_content(demander.name, d_raw, title=f"Review V{round_idx}")
-                    self.logger.log_step(f"R{round_idx} Demander Output", demander.name, d_raw)
-                    
-                    d_json = extract_json(d_raw.replace("TERMINATE", "").strip())
-                    if not d_json:
-                        raise ValueError("Demander failed to generate valid JSON")
+                def early_review(field, value, elapsed, context):
+                    logger.log_event(demander.name, "Early Decision", f"{field}={value} after {elapsed:.2f}s")
 
-                    review_obj = DemanderReview(
-                        overall_satisfaction=d_json.get("overall_satisfaction", "needs_major_revision"),
-                        weaknesses=d_json.get("weaknesses", []),
-                        additional_requirements=d_json.get("additional_requirements", []),
-                        revision_priority=d_json.get("revision_priority", []),
-                        expected_improvements=d_json.get("expected_improvements", "")
-                    )
+                with call_context(company=demander.name), on_early_decision(early_review), \
+                        output_fallbacks(overall_satisfaction="needs_major_revision", weaknesses=[],
+                                         additional_requirements=[], revision_priority=[], expected_improvements=""):
+                    d_res = await demander_team.run(task=d_task_input)
+                review_obj = team_output(d_res, DemanderReview)
+                review_json = review_obj.model_dump_json()
+                review_log = review_obj.model_dump_json(indent=2)
+                logger.log_llm_content(demander.name, review_log, title=f"Review V{round_idx}")
+                self.logger.log_step(f"R{round_idx} Demander Output", demander.name, review_log)
 
-                    # ==========================================================
-                    # Step 3: 记录本轮交互
-                    # ==========================================================
-                    round_record = InteractionRound(
-                        round_id=round_idx,
-                        producer_proposal=proposal_obj,
-                        demander_review=review_obj
-                    )
-                    history.rounds.append(round_record)
-                    history.total_rounds = round_idx
+                # ==========================================================
+                # Step 3: 记录本轮交互
+                # ==========================================================
+                round_record = InteractionRound(
+                    round_id=round_idx,
+                    producer_proposal=proposal_obj,
+                    demander_review=review_obj
+                )
+                history.rounds.append(round_record)
+                history.total_rounds = round_idx
                     
-                    last_review_content = json.dumps(d_json, ensure_ascii=False, indent=2)
+                last_review_content = review_json
 
-                    # ==========================================================
-                    # Step 4: 判断是否结束
-                    # ==========================================================
-                    status = review_obj.overall_satisfaction
-                    print(f"    👉 Result: {status}")
+                # ==========================================================
+                # Step 4: 判断是否结束
+                # ==========================================================
+                status = review_obj.overall_satisfaction
+                logger.log_status(f"    👉 Result: {status}", style="info")
 
-                    history.final_status = "failure"
-                    if status == "accepted":
-                        history.final_status = "success"
-                        history.final_proposal = proposal_obj
-                        logger.log_success(f"Deal Reached in Round {round_idx}!")
-                        print(f"    🎉 Success! {demander.name} accepted the proposal.")
-                        break
-                    else:
-                        logger.log_event(demander.name, "Feedback", "Requesting Revisions", color="yellow")
+                history.final_status = "failure"
+                if status == "accepted":
+                    history.final_status = "success"
+                    history.final_proposal = proposal_obj
+                    logger.log_success(f"Deal Reached in Round {round_idx}!")
+                    logger.log_status(f"    🎉 Success! {demander.name} accepted the proposal.", style="success")
+                    break
+                else:
+                    logger.log_event(demander.name, "Feedback", "Requesting Revisions", color="yellow")
                     
-                    if round_idx == MAX_ROUNDS:
-                        history.final_status = "failure"
-                        history.failure_reason = "Max rounds reached without acceptance."
-                        print(f"    ❌ Failed: Max rounds reached.")
-
-                except Exception as e:
-                    print(f"    ⚠️ Error in interaction: {e}")
-                    traceback.print_exc()
+                if round_idx == MAX_ROUNDS:
                     history.final_status = "failure"
-                    history.failure_reason = str(e)
-                    break
+                    history.failure_reason = "Max rounds reached without acceptance."
+                    logger.log_status(f"    ❌ Failed: Max rounds reached.", style="error")
+
+            except Exception as e:
+                logger.log_status(f"    ⚠️ Error in interaction: {e}", style="warning")
+                traceback.print_exc()
+                history.final_status = "failure"
+                history.failure_reason = str(e)
+                break
             
-            return history
+        return history
         
 if __name__ == "__main__":
     print("🚀 Initializing Dummy Data for Phase 3 Testing...")
@@ -356,7 +352,8 @@ if __name__ == "__main__":
     # 注意：确保 MODEL_CLIENT 已经正确配置
     try:
         workflow = phase2_workflow(MODEL_CLIENT, matched_list, all_companies)
-        asyncio.run(workflow.run())
+        run(workflow.run())
+        print(LOOP_MONITOR.summary())
     except KeyboardInterrupt:
         print("\n🛑 Simulation stopped by user.")
     except Exception as e:
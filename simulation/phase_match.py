@@ -1,5 +1,4 @@
 import sys
-import json
 import os
 import re
 import jieba
@@ -15,18 +14,24 @@ from autogen_agentchat.messages import TextMessage
 from autogen_core import CancellationToken
 
 from utils import extract_json
-from utils_logger import LOGGER
+from utils_json import dumps
+from utils_logger import LOGGER, EventStream
+from utils_loop import LOOP_MONITOR, run
 from api import MODEL_CLIENT
+from api import llm_stats_summary
+from llm.context import call_context
+from llm.streaming import on_early_decision
+from llm.structured import output_defaults, output_fallbacks
 from configs.roles import *
 from core.market import *
 from core.teams.company_demander import DemanderAgentFactory
 from core.teams.company_producer import ProducerAgentFactory
 from core.teams.company_demander import DemanderTeamFactory_match
 from core.teams.company_producer import ProducerTeamFactory_match
+from core.teams.team import team_output
 from group.agents.assistant_agent import AssistantAgent
 from autogen_ext.models.openai import OpenAIChatCompletionClient
 
-GLOBAL_CONCURRENCY_LIMIT = 5
 logger = LOGGER
 
 class SimulationLogger:
@@ -43,37 +48,40 @@ class SimulationLogger:
             f"📝 Content:\n{content}\n"
             f"{'-'*60}\n\n"
         )
+        offset = os.path.getsize(self.filename)
         with open(self.filename, "a", encoding="utf-8") as f:
             f.write(log_entry)
-        print(f"  [Log Saved] {step_name} - {agent_name}")
+        ref = EventStream.ref(self.filename, (offset, len(log_entry.encode("utf-8"))))
+        LOGGER.events.emit("step", step=step_name, actor=agent_name, ref=ref)
+        LOGGER.log_detail(f"  [Log Saved] {step_name} - {agent_name}")
 
 class phase1_workflow:
     def __init__(self, model_client):
         self.model_client = model_client
         self.matched_list = []
         self.logger = SimulationLogger()
-        self.semaphore = asyncio.Semaphore(GLOBAL_CONCURRENCY_LIMIT)
 
     async def run_simulation(self, all_companies: List[Company]):
         logger.log_header("Phase 1: Demand & Match Simulation")
         demanders = [c for c in all_companies if c.role == CompanyRole.DEMANDER]
         producers = [c for c in all_companies if c.role == CompanyRole.PRODUCER]
 
-        print(f"======== Simulation Initialized ========")
-        print(f"Demanders Count: {len(demanders)}")
-        print(f"Producers Count: {len(producers)}")
+        LOGGER.log_rule("Simulation Initialized")
+        LOGGER.log_status(f"Demanders Count: {len(demanders)}", style="info")
+        LOGGER.log_status(f"Producers Count: {len(producers)}", style="info")
 
         start_time = time.time()
         tasks = []
 
         for demander in demanders:
-            print(f"\n----------------------------------------------------")
-            print(f"🔄 Processing Demander: {demander.name} ({demander.company_id})")
+            LOGGER.log_detail(f"\n----------------------------------------------------")
+            LOGGER.log_status(f"🔄 Processing Demander: {demander.name} ({demander.company_id})", style="info")
 
             task = self.process_single_demander_flow(demander, producers)
             tasks.append(task)
         
-        await asyncio.gather(*tasks, return_exceptions=True)
+        with call_context(phase="match"):
+            await asyncio.gather(*tasks, return_exceptions=True)
         
             # active_project = await self._process_demander_proposal_demo(demander)
             # if not active_project:
@@ -93,14 +101,17 @@ class phase1_workflow:
 
             # await self._process_producer_bidding_demo(demander, active_project, candidates)
 
-        print(f"\n====================================================")
-        print(f"✅ Phase 1 Completed. Total Matches: {len(self.matched_list)}")
-        print(json.dumps(self.matched_list, indent=2, ensure_ascii=False))
-        self.logger.log_step("Phase 1 Result", "System", json.dumps(self.matched_list, indent=2, ensure_ascii=False))
+        LOGGER.log_detail(f"\n====================================================")
+        LOGGER.log_status(f"✅ Phase 1 Completed. Total Matches: {len(self.matched_list)}", style="success")
+        matched_json = dumps(self.matched_list, pretty=True)
+        LOGGER.log_detail(matched_json)
+        self.logger.log_step("Phase 1 Result", "System", matched_json)
 
         end_time = time.time()
-        print(f"Total Time: {end_time - start_time:.2f} seconds")
+        LOGGER.log_status(f"Total Time: {end_time - start_time:.2f} seconds", style="info")
         self.logger.log_step("Phase 1 Time", "System", f"{end_time - start_time:.2f} seconds")
+        LOGGER.log_status(f"💾 {llm_stats_summary()}", style="info")
+        self.logger.log_step("Phase 1 LLM Stats", "System", llm_stats_summary())
     
         logger.log_header("Match Results Summary")
         if self.matched_list:
@@ -123,11 +134,10 @@ class phase1_workflow:
         return self.matched_list
     
     async def process_single_demander_flow(self, demander: Company, all_producers: List[Company]):
-        print(f"\n🚀 Start Flow: {demander.name}")
-        async with self.semaphore:
-            active_project = await self._process_demander_proposal(demander)
+        LOGGER.log_status(f"\n🚀 Start Flow: {demander.name}", style="info")
+        active_project = await self._process_demander_proposal(demander)
         if not active_project:
-            print(f"   ❌ [Flow End] {demander.name}: No project generated.")
+            LOGGER.log_status(f"   ❌ [Flow End] {demander.name}: No project generated.", style="error")
             return
         
         # 只有当producer的状态不为busy时才可以参与竞标
@@ -136,7 +146,7 @@ class phase1_workflow:
         candidates = rec_sys.recommend(active_project, top_k=3)
 
         if not candidates:
-            print(f"   ❌ [Flow End] {demander.name}: No suitable producers found.")
+            LOGGER.log_status(f"   ❌ [Flow End] {demander.name}: No suitable producers found.", style="error")
             self.logger.log_step("Market Match", "System", f"No candidates for {demander.name}")
             return
         
@@ -144,53 +154,56 @@ class phase1_workflow:
 
         if match_result:
             self.matched_list.append(match_result)
-            print(f"   🎉 [Match Confirmed] {demander.name} <--> {match_result['producer_name']}")
+            LOGGER.log_status(f"   🎉 [Match Confirmed] {demander.name} <--> {match_result['producer_name']}", style="success")
         else:
-            print(f"   💨 [Flow End] {demander.name}: All candidates rejected.")
+            LOGGER.log_status(f"   💨 [Flow End] {demander.name}: All candidates rejected.", style="info")
 
     async def _process_single_producer_bid(self, demander: Company, project: ActiveProject, candidate: Dict) -> Optional[Dict]:
         producer = candidate["company"]
         score = candidate["total_score"]
         
-        async with self.semaphore:
-            try:
-                producer_team = ProducerTeamFactory_match.create_team(producer)
+        try:
+            producer_team = ProducerTeamFactory_match.create_team(producer)
                 
-                rfp_message = json.dumps({
-                    "project_content": project.project_content,
-                    "required_tags": project.tags,
-                }, ensure_ascii=False)
-                rfp_input = f"New RFP Received: {rfp_message}"
+            rfp_message = dumps({
+                "project_content": project.project_content,
+                "required_tags": project.tags,
+            })
+            rfp_input = f"New RFP Received: {rfp_message}"
                 
+            def early_decision(field, value, elapsed, context):
+                # CEO 流式输出时, decision 字段一可解析就先记录, 不等整段回复结束
+                logger.log_event(producer.name, "Early Decision", f"{field}={value} after {elapsed:.2f}s")
+
+            # 修复后 decision 仍缺失 / 不合法时按拒绝处理, 与原来的 .get("decision") 一致
+            with call_context(company=producer.name), on_early_decision(early_decision), \
+                    output_fallbacks(decision="REJECT", reason=""):
                 result = await producer_team.run(task=rfp_input)
-                p_content = result.messages[-1].content
-                self.logger.log_step("Producer Team Decision", producer.name, p_content)
-                
-                clean_content = p_content.replace("TERMINATE", "").strip()
-                decision_data = extract_json(clean_content)
+            decision = team_output(result, ProducerDecision)
+            self.logger.log_step("Producer Team Decision", producer.name, decision.model_dump_json(indent=2))
                 
-                if decision_data.get("decision") == "ACCEPT":
-                    # 这里将当前producer设为busy
-                    producer.state = CompanyState.BUSY
-                    reason = decision_data.get('reason')
-                    print(f"      ✅ {producer.name} Accepted!")
-                    return {
-                        "demander_id": demander.company_id,
-                        "demander_name": demander.name,
-                        "producer_id": producer.company_id,
-                        "producer_name": producer.name,
-                        "project": project.__dict__,
-                        "match_reason": reason,
-                        "score": score
-                    }
-                else:
-                    print(f"      ❌ {producer.name} Rejected.")
-                    return None
-                    
-            except Exception as e:
-                print(f"      ⚠️ Error in producer bid {producer.name}: {e}")
-                self.logger.log_step("Error", producer.name, str(e))
+            if decision.decision == "ACCEPT":
+                # 这里将当前producer设为busy
+                producer.state = CompanyState.BUSY
+                reason = decision.reason
+                LOGGER.log_status(f"      ✅ {producer.name} Accepted!", style="success")
+                return {
+                    "demander_id": demander.company_id,
+                    "demander_name": demander.name,
+                    "producer_id": producer.company_id,
+                    "producer_name": producer.name,
+                    "project": project.__dict__,
+                    "match_reason": reason,
+                    "score": score
+                }
+            else:
+                LOGGER.log_status(f"      ❌ {producer.name} Rejected.", style="warning")
                 return None
+                    
+        except Exception as e:
+            LOGGER.log_status(f"      ⚠️ Error in producer bid {producer.name}: {e}", style="warning")
+            self.logger.log_step("Error", producer.name, str(e))
+            return None
     
     async def _process_demander_proposal(self, demander: Company) -> Optional[ActiveProject]:
         try:
@@ -199,35 +212,26 @@ class phase1_workflow:
             demander_team = DemanderTeamFactory_match.create_team(demander)
             plan_input = f"Current Strategy Plan: {demander.strategy.content}"
             
-            result = await demander_team.run(task=plan_input)
-            
-            last_message_content = result.messages[-1].content
-            logger.log_llm_content(demander.name, last_message_content, title="Proposal Draft")
-            self.logger.log_step("Demander Team Discussion", demander.name, last_message_content)
-            clean_content = last_message_content.replace("TERMINATE", "").strip()
-            project_data = extract_json(clean_content)
-            
-            if not project_data:
-                raise ValueError("JSON parsing failed")
-
-            project = ActiveProject(
-                project_id=project_data.get("project_id", f"{demander.company_id}_{datetime.now().timestamp()}"),
-                project_content=project_data.get("project_content", ""),
-                type=project_data.get("type", "General"),
-                tags=project_data.get("tags", []),
-                weeks=project_data.get("weeks", 5),
-            )
-            print(f"   📝 [Project Ready] {demander.name}: {project.tags}, {project.weeks} weeks")
+            # project_id 缺失时由这里生成, 不再追问模型; 修复后仍不合法的字段用原来的默认值
+            with call_context(company=demander.name), \
+                    output_defaults(project_id=f"{demander.company_id}_{datetime.now().timestamp()}"), \
+                    output_fallbacks(project_content="", type="General", tags=[], weeks=5):
+                result = await demander_team.run(task=plan_input)
+            project = team_output(result, ActiveProject)
+            project_json = project.model_dump_json(indent=2)
+            logger.log_llm_content(demander.name, project_json, title="Proposal Draft")
+            self.logger.log_step("Demander Team Discussion", demander.name, project_json)
+            LOGGER.log_status(f"   📝 [Project Ready] {demander.name}: {project.tags}, {project.weeks} weeks", style="info")
             logger.log_success(f"Project Generated: {project.tags}")
             return project
             
         except Exception as e:
-            print(f"   ❌ Error generating proposal for {demander.name}: {e}")
+            LOGGER.log_status(f"   ❌ Error generating proposal for {demander.name}: {e}", style="error")
             self.logger.log_step("Error", demander.name, str(e))
             return None
         
     async def _process_producer_bidding_concurrent(self, demander: Company, project: ActiveProject, candidates: List[Dict]) -> Optional[Dict]:
-        print(f"   🔍 Bidding: {demander.name} asking {len(candidates)} candidates concurrently...")
+        LOGGER.log_status(f"   🔍 Bidding: {demander.name} asking {len(candidates)} candidates concurrently...", style="info")
         
         bid_tasks = []
         for cand in candidates:
@@ -253,7 +257,7 @@ class phase1_workflow:
         # 我们直接取第一个 Accept 即可，这就是“优先级最高的愿意合作者”
         best_match = accepted_results[0]
         
-        print(f"      ✅ {demander.name} received {len(accepted_results)} offers. Chose: {best_match['producer_name']}")
+        LOGGER.log_status(f"      ✅ {demander.name} received {len(accepted_results)} offers. Chose: {best_match['producer_name']}", style="success")
         return best_match
 
 
@@ -398,4 +402,5 @@ if __name__ == "__main__":
 
     model_client = MODEL_CLIENT
     workflow = phase1_workflow(model_client=model_client)
-    asyncio.run(workflow.run_simulation(all_companies))
\ No newline at end of file
+    run(workflow.run_simulation(all_companies))
+    print(LOOP_MONITOR.summary())
\ No newline at end of file
@@ -11,13 +11,20 @@ import asyncio
 
 from utils import extract_json
 from api import MODEL_CLIENT
+from api import llm_stats_summary
+from api import USAGE_LEDGER
+from api import PROMPT_SIZER
+from api import STREAM_MONITOR
+from api import MIDDLEWARE
+from utils_loop import LOOP_CHOICES, LOOP_MONITOR, run
+from utils_logger import LOGGER
 from configs.roles import *
 
 from phase_initialization import async_create_companies_list
 from phase_match import phase1_workflow
 from phase_interaction import phase2_workflow
 
-async def main(data_path: str):
+async def main(data_path: str, batch_size: int = 1):
     print("\n" + "="*60)
     print("🚀 AGENT COMPANY SIMULATION: FULL CYCLE START")
     print("="*60 + "\n")
@@ -30,7 +37,7 @@ async def main(data_path: str):
     print(f"📦 [PHASE 1] INITIALIZATION STARTING...")
     print(f"   Reading from: {data_path}")
     
-    all_companies = await async_create_companies_list(data_path)
+    all_companies = await async_create_companies_list(data_path, batch_size=batch_size)
     if not all_companies:
         print("❌ [PHASE 1] Failed: No companies created. Exiting simulation.")
         return
@@ -92,18 +99,37 @@ async def main(data_path: str):
     print("🏁 SIMULATION FINISHED")
     print("="*60)
     print(f"Total Duration: {duration:.2f} seconds")
+    print(llm_stats_summary())
+    USAGE_LEDGER.log_summary(LOGGER)
+    PROMPT_SIZER.log_report(LOGGER)
+    STREAM_MONITOR.log_report(LOGGER)
+    MIDDLEWARE.log_report(LOGGER)
+    print(LOOP_MONITOR.summary())
+    print(LOGGER.sink.summary())
+    LOOP_MONITOR.log_report(LOGGER)
+    print(LOGGER.render_summary())
+    usage_path = USAGE_LEDGER.export()
+    if usage_path:
+        print(f"LLM usage exported to {usage_path}")
     print("Logs saved to ../logs/ directory.")
     print("Final History saved to ../logs/final_interaction_history.json")
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Run the full Agent Company Simulation")
     parser.add_argument('--data_path', type=str, default="../data/companies_info.json", help='Path to the companies JSON data file')
+    parser.add_argument('--batch_size', type=int, default=1, help='Companies per INIT request during initialization (1 = one request per company)')
+    parser.add_argument('--loop', type=str, default="auto", choices=LOOP_CHOICES, help='Event loop implementation (auto = uvloop when installed)')
+    parser.add_argument('--loop_lag_ms', type=float, default=None, help='Report event-loop stalls longer than this (0 = off, default LOOP_LAG_MS or 100)')
+    parser.add_argument('--headless', action='store_true', help='Compact one-line console output without rich rendering (default: auto when stdout is not a terminal)')
     args = parser.parse_args()
+    if args.headless:
+        LOGGER.set_headless(True)
     
     os.makedirs("../logs", exist_ok=True)
+    USAGE_LEDGER.listeners.append(LOGGER.events.llm_call)
     
     try:
-        asyncio.run(main(args.data_path))
+        run(main(args.data_path, batch_size=args.batch_size), loop=args.loop, lag_ms=args.loop_lag_ms)
     except KeyboardInterrupt:
         print("\n🛑 Simulation interrupted by user.")
     except Exception as e:
@@ -0,0 +1,64 @@
+import asyncio
+from typing import Any, List, Optional, Sequence, Union
+
+from autogen_core.models import CreateResult, RequestUsage
+
+from llm.client import WrappedChatCompletionClient
+
+
+def result(content: str = "ok", finish_reason: str = "stop", prompt_tokens: int = 10,
+           completion_tokens: int = 5, cached: bool = False) -> CreateResult:
+    return CreateResult(
+        finish_reason=finish_reason, content=content, cached=cached,
+        usage=RequestUsage(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens),
+    )
+
+
+class FakeModelClient(WrappedChatCompletionClient):
+    """
+    Stands in for the provider client at the bottom of a chain. `replies` are returned by
+    successive create calls (an Exception entry is raised instead); `chunks` are streamed
+    by create_stream, followed by a final CreateResult of their joined text. Every call's
+    extra_create_args is kept in `calls` and its messages in `sent`; `closed` counts streams
+    closed early.
+    """
+
+    def __init__(self, replies: Sequence[Union[CreateResult, Exception]] = (),
+                 chunks: Sequence[str] = (), delay: float = 0.0):
+        super().__init__(None)
+        self.replies = list(replies)
+        self.chunks = list(chunks)
+        self.delay = delay
+        self.calls: List[dict] = []
+        self.sent: List[list] = []
+        self.closed = 0
+
+    async def create(self, messages, *, tools=[], tool_choice="auto", json_output=None,
+                     extra_create_args={}, cancellation_token=None) -> CreateResult:
+        self.calls.append(dict(extra_create_args))
+        self.sent.append(list(messages))
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        reply = self.replies.pop(0) if len(self.replies) > 1 else self.replies[0]
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+
+    async def create_stream(self, messages, *, tools=[], tool_choice="auto", json_output=None,
+                            extra_create_args={}, cancellation_token=None):
+        self.calls.append(dict(extra_create_args))
+        self.sent.append(list(messages))
+        finished = False
+        try:
+            for chunk in self.chunks:
+                if self.delay:
+                    await asyncio.sleep(self.delay)
+                yield chunk
+            finished = True
+            yield result("".join(self.chunks), completion_tokens=len(self.chunks))
+        finally:
+            if not finished:
+                self.closed += 1
+
+    async def close(self) -> None:
+        pass
@@ -0,0 +1,90 @@
+import asyncio
+import time
+
+import pytest
+
+from llm.breaker import (
+    CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError, Failover, FailoverChatCompletionClient,
+)
+from tests.fakes import FakeModelClient, result
+
+
+class ServerError(Exception):
+    status_code = 503
+
+
+class BadRequest(Exception):
+    status_code = 400
+
+
+def call(breaker, outcome):
+    async def attempt():
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    return asyncio.run(breaker.call(attempt))
+
+
+def test_consecutive_failures_trip_and_open_rejects():
+    breaker = CircuitBreaker("glm", failure_threshold=2, open_seconds=60)
+    for _ in range(2):
+        with pytest.raises(ServerError):
+            call(breaker, ServerError())
+    assert breaker.state == OPEN and breaker.trips == 1
+
+    with pytest.raises(CircuitOpenError):
+        call(breaker, "ok")
+    assert breaker.rejected == 1 and breaker.retry_in() > 0
+
+
+def test_half_open_probe_closes_or_reopens():
+    breaker = CircuitBreaker("glm", failure_threshold=1, open_seconds=0.05)
+    with pytest.raises(ServerError):
+        call(breaker, ServerError())
+    time.sleep(0.06)
+    with pytest.raises(ServerError):
+        call(breaker, ServerError())
+    assert (breaker.state, breaker.trips) == (OPEN, 2)
+
+    time.sleep(0.06)
+    assert call(breaker, "ok") == "ok"
+    assert breaker.state == CLOSED
+
+
+def test_half_open_lets_only_the_probe_through():
+    breaker = CircuitBreaker("glm", failure_threshold=1, open_seconds=0.0)
+    breaker.record_failure()
+    assert breaker.allow() and breaker.state == HALF_OPEN
+    assert not breaker.allow()
+
+
+def test_client_errors_keep_the_circuit_closed():
+    breaker = CircuitBreaker("glm", failure_threshold=1)
+    with pytest.raises(BadRequest):
+        call(breaker, BadRequest())
+    assert breaker.state == CLOSED and breaker.successes == 1
+
+
+def test_error_rate_trips_without_consecutive_failures():
+    breaker = CircuitBreaker("glm", failure_threshold=100, error_rate_threshold=0.5, window=4)
+    for ok in (False, True, False, False):
+        if ok:
+            breaker.record_success()
+        else:
+            breaker.record_failure()
+    assert breaker.state == OPEN
+
+
+def test_failover_client_uses_fallback_only_for_provider_errors():
+    failover = Failover(CircuitBreaker("primary"), CircuitBreaker("fallback"))
+    fallback = FakeModelClient([result("from fallback")])
+
+    client = FailoverChatCompletionClient(FakeModelClient([ServerError("down")]), failover, fallback)
+    assert asyncio.run(client.create([])).content == "from fallback"
+    assert failover.failovers == 1
+
+    client = FailoverChatCompletionClient(FakeModelClient([BadRequest("bad")]), failover, fallback)
+    with pytest.raises(BadRequest):
+        asyncio.run(client.create([]))
+    assert failover.failovers == 1
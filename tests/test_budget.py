@@ -0,0 +1,68 @@
+import asyncio
+
+from llm.budget import BudgetedChatCompletionClient, TokenBudget
+from llm.context import call_context
+from tests.fakes import FakeModelClient, result
+
+
+def learned(samples=(100,) * 10, **kwargs):
+    budget = TokenBudget(min_samples=10, headroom=1.5, min_tokens=64, max_tokens=1000, **kwargs)
+    for n in samples:
+        budget.observe("P", n)
+    return budget
+
+
+def test_budget_is_learned_after_min_samples():
+    budget = learned(samples=[100] * 9)
+    assert budget.budget("P") is None
+    budget.observe("P", 100)
+    assert budget.budget("P") == 150
+    assert budget.budget("P", cap=120) == 120
+    assert budget.budgeted == 2
+
+
+def test_retry_budget_doubles_up_to_the_cap():
+    budget = learned()
+    assert [budget.retry_budget(150), budget.retry_budget(600), budget.retry_budget(1000)] == [300, 1000, None]
+    assert (budget.truncated, budget.exhausted) == (3, 1)
+
+
+def test_truncated_reply_is_refit_and_finally_sent_uncapped():
+    budget = learned(samples=[400] * 10)
+    fake = FakeModelClient([
+        result("cut", finish_reason="length"),
+        result("cut", finish_reason="length"),
+        result("done", completion_tokens=1200),
+    ])
+    client = BudgetedChatCompletionClient(fake, budget)
+
+    with call_context(prompt="P"):
+        reply = asyncio.run(client.create([]))
+
+    assert reply.content == "done"
+    assert [call.get("max_tokens") for call in fake.calls] == [600, 1000, None]
+    assert (budget.truncated, budget.exhausted, budget.lifted) == (2, 1, 1)
+
+
+def test_caller_max_tokens_is_left_alone_and_observed():
+    budget = learned(samples=[100] * 9)
+    fake = FakeModelClient([result(completion_tokens=77)])
+    client = BudgetedChatCompletionClient(fake, budget)
+
+    with call_context(prompt="P"):
+        asyncio.run(client.create([], extra_create_args={"max_tokens": 50}))
+
+    assert fake.calls == [{"max_tokens": 50}]
+    assert budget.budgeted == 0 and budget.budget("P") == 150
+
+
+def test_samples_persist_and_bad_files_are_reported(tmp_path):
+    path = str(tmp_path / "budgets.json")
+    budget = learned(path=path)
+    budget.save()
+    assert TokenBudget(path=path, min_samples=10, headroom=1.5, min_tokens=64).budget("P") == 150
+
+    (tmp_path / "broken.json").write_text("{not json")
+    notices = []
+    TokenBudget(path=str(tmp_path / "broken.json"), notify=notices.append)
+    assert len(notices) == 1 and "ignored" in notices[0]
@@ -0,0 +1,73 @@
+import asyncio
+import sqlite3
+import time
+
+from llm.cache import CachedChatCompletionClient, ResponseCache
+from tests.fakes import FakeModelClient, result
+
+
+def accessed(path, key):
+    with sqlite3.connect(path) as conn:
+        return conn.execute("SELECT accessed FROM entries WHERE key = ?", (key,)).fetchone()[0]
+
+
+def test_hits_misses_and_replay_mode(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = ResponseCache(path, mode="readwrite")
+    assert cache.get("k") is None
+    cache.put("k", "v")
+    assert cache.get("k") == "v"
+    cache.close()
+
+    replay = ResponseCache(path, mode="replay")
+    replay.put("other", "x")
+    assert (replay.get("k"), replay.get("other")) == ("v", None)
+    assert (replay.hits, replay.misses, replay.writes) == (1, 1, 0)
+
+
+def test_access_times_are_written_in_batches(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = ResponseCache(path, mode="readwrite", touch_batch=3)
+    cache.put("k", "v")
+    written = accessed(path, "k")
+    time.sleep(0.01)
+
+    cache.get("k")
+    cache.get("k")
+    assert accessed(path, "k") == written
+    cache.get("k")
+    assert accessed(path, "k") > written
+
+    cache.get("k")
+    cache.close()
+    assert cache.hits == 4
+
+
+def test_eviction_respects_pending_access_times(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"), mode="readwrite", max_entries=2)
+    cache.put("a", "1")
+    cache.put("b", "2")
+    cache.get("a")
+    cache.put("c", "3")
+    assert (cache.get("a"), cache.get("b"), cache.get("c")) == ("1", None, "3")
+    assert cache.evictions == 1
+
+
+def test_expired_entries_are_misses(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"), mode="readwrite", ttl=-1)
+    cache.put("k", "v")
+    assert cache.get("k") is None
+    assert (cache.expired, cache.stats()["entries"]) == (1, 0)
+
+
+def test_client_caches_only_finished_replies(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"), mode="readwrite")
+    fake = FakeModelClient([result("cut", finish_reason="length"), result("done")])
+    client = CachedChatCompletionClient(fake, cache)
+
+    async def twice():
+        return [await client.create([]) for _ in range(2)] + [await client.create([])]
+
+    first, second, third = asyncio.run(twice())
+    assert (first.content, second.content, third.content) == ("cut", "done", "done")
+    assert third.cached and len(fake.calls) == 2
@@ -0,0 +1,60 @@
+import asyncio
+
+import pytest
+
+from llm.concurrency import AdaptiveConcurrencyLimiter, ConcurrencyGatedClient, is_overload_error
+from tests.fakes import FakeModelClient, result
+
+
+class TooManyRequests(Exception):
+    status_code = 429
+
+
+class BadRequest(Exception):
+    status_code = 400
+
+
+def test_window_caps_requests_on_the_wire():
+    limiter = AdaptiveConcurrencyLimiter(initial=2, max_limit=2)
+    client = ConcurrencyGatedClient(FakeModelClient([result()], delay=0.02), limiter)
+
+    async def burst():
+        await asyncio.gather(*(client.create([]) for _ in range(6)))
+
+    asyncio.run(burst())
+    stats = limiter.stats()
+    assert (stats["peak_in_flight"], stats["in_flight"], stats["successes"]) == (2, 0, 6)
+    assert stats["peak_waiting"] >= 3
+
+
+def test_healthy_successes_grow_the_window_additively():
+    limiter = AdaptiveConcurrencyLimiter(initial=2, max_limit=4, latency_target=1.0)
+    limiter.record_success(0.5)
+    assert limiter.window == pytest.approx(2.5)
+    limiter.record_success(5.0)
+    assert limiter.window == pytest.approx(2.5) and limiter.increases == 1
+
+
+def test_overload_halves_the_window_once_per_cooldown():
+    limiter = AdaptiveConcurrencyLimiter(initial=8, cooldown=60)
+    limiter.record_failure(TooManyRequests("slow down"))
+    limiter.record_failure(asyncio.TimeoutError())
+    assert (limiter.window, limiter.overloads, limiter.decreases) == (4.0, 2, 1)
+
+
+def test_error_rate_backs_off_without_overloads():
+    limiter = AdaptiveConcurrencyLimiter(initial=8, error_rate_threshold=0.2, cooldown=0)
+    for _ in range(7):
+        limiter.record_success(0.1)
+    for _ in range(3):
+        limiter.record_failure(BadRequest("bad"))
+    assert limiter.decreases == 1 and limiter.window < 8
+
+
+def test_failed_request_releases_its_slot():
+    limiter = AdaptiveConcurrencyLimiter(initial=1, max_limit=1)
+    client = ConcurrencyGatedClient(FakeModelClient([TooManyRequests("429")]), limiter)
+    with pytest.raises(TooManyRequests):
+        asyncio.run(client.create([]))
+    assert (limiter.in_flight, limiter.failures) == (0, 1)
+    assert is_overload_error(TooManyRequests()) and not is_overload_error(BadRequest())
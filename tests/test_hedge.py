@@ -0,0 +1,68 @@
+import asyncio
+
+from llm.hedge import Hedger
+
+
+def scripted(*outcomes):
+    """Attempt factory whose n-th call sleeps outcomes[n][0] then returns (or raises) outcomes[n][1]."""
+    started, cancelled = [], []
+
+    async def attempt():
+        delay, outcome = outcomes[len(started)]
+        started.append(outcome)
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            cancelled.append(outcome)
+            raise
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    return attempt, started, cancelled
+
+
+def warmed(**kwargs):
+    hedger = Hedger(enabled=True, min_samples=2, min_delay=0.02, percentile=0.5, **kwargs)
+    for _ in range(2):
+        asyncio.run(hedger.run(scripted((0.0, "warm"))[0], route="r"))
+    return hedger
+
+
+def test_no_hedging_until_the_route_is_warm():
+    hedger = Hedger(enabled=True, min_samples=2, min_delay=0.0)
+    attempt, started, _ = scripted((0.03, "slow"))
+    assert asyncio.run(hedger.run(attempt, route="r")) == "slow"
+    assert len(started) == 1 and hedger.hedge_delay("r") is None
+
+
+def test_slow_primary_is_hedged_and_cancelled():
+    hedger = warmed(max_extra_ratio=1.0)
+    attempt, started, cancelled = scripted((1.0, "primary"), (0.0, "hedge"))
+
+    assert asyncio.run(hedger.run(attempt, route="r")) == "hedge"
+    assert cancelled == ["primary"]
+    assert (hedger.hedged, hedger.hedge_wins) == (1, 1)
+
+
+def test_failed_winner_waits_for_the_other_attempt():
+    hedger = warmed(max_extra_ratio=1.0)
+    attempt, _, _ = scripted((0.05, "primary"), (0.0, RuntimeError("hedge failed")))
+
+    assert asyncio.run(hedger.run(attempt, route="r")) == "primary"
+    assert hedger.primary_wins == 1
+
+
+def test_hedges_are_capped_by_the_extra_traffic_budget():
+    hedger = warmed(max_extra_ratio=0.0)
+    attempt, started, _ = scripted((0.05, "primary"), (0.0, "hedge"))
+
+    assert asyncio.run(hedger.run(attempt, route="r")) == "primary"
+    assert len(started) == 1 and hedger.skipped_budget == 1
+
+
+def test_disabled_hedger_just_awaits():
+    hedger = Hedger()
+    attempt, started, _ = scripted((0.0, "ok"))
+    assert asyncio.run(hedger.run(attempt)) == "ok"
+    assert hedger.calls == 0 and len(started) == 1
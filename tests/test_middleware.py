@@ -0,0 +1,61 @@
+import asyncio
+
+import pytest
+
+from llm.client import WrappedChatCompletionClient
+from llm.middleware import MiddlewareStack
+from tests.fakes import FakeModelClient, result
+
+
+class Repeating(WrappedChatCompletionClient):
+    """Calls the layer below `times` times, sleeping `pause` before each call."""
+
+    def __init__(self, inner, times=1, pause=0.0, parallel=False):
+        super().__init__(inner)
+        self.times = times
+        self.pause = pause
+        self.parallel = parallel
+
+    async def create(self, messages, **kwargs):
+        if self.parallel:
+            await asyncio.sleep(self.pause)
+            results = await asyncio.gather(*(super(Repeating, self).create(messages, **kwargs) for _ in range(self.times)))
+            return results[0]
+        for _ in range(self.times):
+            await asyncio.sleep(self.pause)
+            reply = await super().create(messages, **kwargs)
+        return reply
+
+
+def build(factories):
+    stack = MiddlewareStack(list(factories), factories)
+    return stack, stack.build(FakeModelClient([result()], delay=0.05))
+
+
+def test_self_time_is_charged_per_call():
+    stack, client = build({
+        "outer": lambda inner: Repeating(inner),
+        "retry": lambda inner: Repeating(inner, times=3, pause=0.02),
+    })
+    asyncio.run(client.create([]))
+    report = stack.report()
+
+    assert report["model"]["calls"] == 3
+    assert report["retry"]["avg_self"] == pytest.approx(0.06, abs=0.02)
+    assert report["outer"]["avg_self"] == pytest.approx(0.0, abs=0.01)
+
+
+def test_overlapping_calls_below_are_not_double_counted():
+    stack, client = build({"hedge": lambda inner: Repeating(inner, times=2, pause=0.03, parallel=True)})
+    asyncio.run(client.create([]))
+    report = stack.report()
+
+    assert report["model"]["calls"] == 2
+    assert report["hedge"]["avg_self"] == pytest.approx(0.03, abs=0.015)
+
+
+def test_unknown_and_repeated_layers_are_rejected():
+    with pytest.raises(ValueError):
+        MiddlewareStack(["missing"], {})
+    with pytest.raises(ValueError):
+        MiddlewareStack(["a", "a"], {"a": lambda inner: inner})
@@ -0,0 +1,61 @@
+import asyncio
+
+from configs.roles import CompanyInfo, CompanyInfoBatch, CompanyRole
+from simulation import phase_initialization
+from simulation.phase_initialization import async_create_company_batch, plan_init_batches
+from utils_json import dumps
+
+INFOS = [{"id": str(i), "公司名称": f"公司{i}", "公司介绍": "介绍", "产品服务": "产品"} for i in range(1, 4)]
+
+
+def item(index, role="Producer"):
+    return {"index": index, "tags": ["AI"], "strategy_content": f"战略{index}", "current_role": role}
+
+
+def fake_glm(monkeypatch, batch_reply):
+    calls = []
+
+    async def async_call_glm(prompt, schema=None, **kwargs):
+        calls.append(schema)
+        if schema is CompanyInfoBatch:
+            if isinstance(batch_reply, Exception):
+                raise batch_reply
+            return batch_reply
+        return dumps({"tags": ["单条"], "strategy_content": "单条战略", "current_role": "Demander"})
+
+    monkeypatch.setattr(phase_initialization, "async_call_glm", async_call_glm)
+    return calls
+
+
+def test_batch_reply_is_split_by_index(monkeypatch):
+    calls = fake_glm(monkeypatch, dumps({"companies": [item(3), item(1, "Demander"), item(2)]}))
+    companies = asyncio.run(async_create_company_batch(INFOS))
+
+    assert [c.name for c in companies] == ["公司1", "公司2", "公司3"]
+    assert companies[0].role == CompanyRole.DEMANDER and companies[2].strategy.content == "战略3"
+    assert calls == [CompanyInfoBatch]
+
+
+def test_missing_and_invalid_items_fall_back_to_single_calls(monkeypatch):
+    invalid = {"index": 2, "tags": ["AI"]}
+    calls = fake_glm(monkeypatch, dumps({"companies": [item(1), invalid, item(1, "Demander"), item(9)]}))
+    companies = asyncio.run(async_create_company_batch(INFOS))
+
+    assert companies[0].strategy.content == "战略1" and companies[0].role == CompanyRole.PRODUCER
+    assert [c.strategy.content for c in companies[1:]] == ["单条战略", "单条战略"]
+    assert calls == [CompanyInfoBatch, CompanyInfo, CompanyInfo]
+
+
+def test_failed_batch_falls_back_for_every_company(monkeypatch):
+    calls = fake_glm(monkeypatch, RuntimeError("boom"))
+    companies = asyncio.run(async_create_company_batch(INFOS))
+
+    assert [c.tags for c in companies] == [["单条"]] * 3
+    assert calls.count(CompanyInfo) == 3
+
+
+def test_batches_respect_size_and_prompt_limit(monkeypatch):
+    assert [len(b) for b in plan_init_batches(INFOS * 3, 4)] == [4, 4, 1]
+
+    monkeypatch.setattr(phase_initialization.PROMPT_SIZER, "limit", 1)
+    assert [len(b) for b in plan_init_batches(INFOS, 4)] == [1, 1, 1]
@@ -0,0 +1,54 @@
+import asyncio
+
+from autogen_core.models import SystemMessage, UserMessage
+
+from llm.context import call_context
+from llm.prompt_size import PromptSizeClient, PromptSizer, truncate_to_tokens
+from llm.tokens import estimate_tokens
+from tests.fakes import FakeModelClient, result
+
+TEMPLATE = "公司: {name}\n历史: {history}\n数据: {data}"
+
+
+def test_estimate_counts_cjk_and_latin_differently():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("a" * 400) == 101
+    assert estimate_tokens("中" * 100) == 71
+
+
+def test_truncate_keeps_head_and_tail():
+    text = "开头" + "x" * 4000 + "结尾"
+    trimmed = truncate_to_tokens(text, 100)
+    assert estimate_tokens(trimmed) <= 100
+    assert trimmed.startswith("开头") and trimmed.endswith("结尾") and "已省略" in trimmed
+
+
+def test_render_trims_lowest_priority_fields_first():
+    notices = []
+    sizer = PromptSizer(limit=300, field_priority={"history": 1, "data": 2}, min_field_tokens=50, notify=notices.append)
+    fields = {"name": "甲", "history": "h" * 2000, "data": "d" * 800}
+
+    prompt = sizer.render("INIT", TEMPLATE, fields)
+
+    assert estimate_tokens(prompt) <= 300 and "d" * 800 in prompt
+    assert not notices
+    assert sizer.report()["INIT"]["trimmed_renders"] == 1
+
+
+def test_render_reports_prompts_it_cannot_fit():
+    notices = []
+    sizer = PromptSizer(limit=100, field_priority={"history": 1}, min_field_tokens=50, notify=notices.append)
+    sizer.render("INIT", TEMPLATE, {"name": "甲", "history": "h" * 2000, "data": "d" * 2000})
+    assert len(notices) == 1 and "INIT" in notices[0]
+
+
+def test_client_trims_user_messages_but_never_the_system_prompt():
+    sizer = PromptSizer(limit=200, min_field_tokens=20)
+    fake = FakeModelClient([result()])
+    system = SystemMessage(content="s" * 400)
+    with call_context(prompt="CEO"):
+        asyncio.run(PromptSizeClient(fake, sizer).create([system, UserMessage(content="u" * 2000, source="user")]))
+
+    sent = fake.sent[0]
+    assert sent[0] is system and len(sent[1].content) < 2000
+    assert sizer.report()["CEO"]["trimmed_requests"] == 1
@@ -0,0 +1,58 @@
+import asyncio
+import time
+
+import pytest
+
+from llm.ratelimit import RateLimitedChatCompletionClient, RateLimiter, TokenBucket
+from tests.fakes import FakeModelClient, result
+
+
+def test_bucket_serves_its_burst_then_waits_for_refill():
+    bucket = TokenBucket(rate_per_minute=600, burst_seconds=0.2)
+    assert bucket.capacity == 2
+    bucket.take(1)
+    bucket.take(1)
+    assert bucket.wait_time(1) == pytest.approx(0.1, abs=0.01)
+    assert TokenBucket(0).wait_time(10 ** 6) == 0.0
+
+
+def test_requests_per_minute_throttle_a_burst():
+    limiter = RateLimiter(rpm=600, burst_seconds=0.2)
+
+    async def burst():
+        start = time.monotonic()
+        await asyncio.gather(*(limiter.acquire(10) for _ in range(4)))
+        return time.monotonic() - start
+
+    assert asyncio.run(burst()) >= 0.18
+    assert limiter.acquired == 4 and limiter.throttled >= 1
+
+
+def test_reservation_is_settled_with_real_usage():
+    limiter = RateLimiter(tpm=60000, burst_seconds=10, completion_estimate=512)
+    reservation = asyncio.run(limiter.acquire(100, max_completion_tokens=200))
+    assert reservation.estimated_tokens == 300
+    assert limiter.tokens.tokens == pytest.approx(10000 - 300, abs=5)
+
+    limiter.settle(reservation, 120)
+    assert limiter.tokens.tokens == pytest.approx(10000 - 120, abs=5)
+    assert (limiter.estimated_tokens, limiter.actual_tokens) == (300, 120)
+
+
+def test_client_settles_live_results_only():
+    limiter = RateLimiter(tpm=60000)
+    fake = FakeModelClient([result(prompt_tokens=40, completion_tokens=2), result(cached=True)])
+    client = RateLimitedChatCompletionClient(fake, limiter)
+
+    async def twice():
+        await client.create([])
+        await client.create([])
+
+    asyncio.run(twice())
+    assert (limiter.acquired, limiter.actual_tokens) == (2, 42)
+
+
+def test_disabled_limiter_never_waits():
+    limiter = RateLimiter()
+    assert not limiter.enabled
+    assert asyncio.run(limiter.acquire(10 ** 6)).waited == 0.0
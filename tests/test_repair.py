@@ -0,0 +1,73 @@
+import asyncio
+from typing import List
+
+from pydantic import BaseModel
+
+from configs.prompts import REPAIR_PROMPT
+from llm.repair import JsonRepairer, validation_errors
+
+
+class Decision(BaseModel):
+    decision: str
+    reason: str
+    weeks: int
+
+
+REQUEST = "公司数据: 甲方科技, 预算 30 万, 周期 6 周"
+
+
+def make_repairer(replies: List[str], **kwargs):
+    asks = []
+
+    async def ask(prompt, schema):
+        asks.append((prompt, sorted(schema.model_fields)))
+        return replies[len(asks) - 1]
+
+    return JsonRepairer(ask, REPAIR_PROMPT, notify=lambda message: None, **kwargs), asks
+
+
+def test_valid_reply_needs_no_follow_up():
+    repairer, asks = make_repairer([])
+    data = asyncio.run(repairer.repair('{"decision": "ACCEPT", "reason": "ok", "weeks": 4}', Decision))
+    assert data == {"decision": "ACCEPT", "reason": "ok", "weeks": 4}
+    assert asks == []
+    assert repairer.valid == 1
+
+
+def test_follow_up_asks_only_for_invalid_fields():
+    repairer, asks = make_repairer(['{"weeks": 6}'])
+    data = asyncio.run(repairer.repair('{"decision": "ACCEPT", "reason": "ok", "weeks": "six"}', Decision, prompt=REQUEST))
+    assert data["weeks"] == 6
+    assert asks[0][1] == ["weeks"]
+    assert repairer.repaired == 1
+
+
+def test_each_round_carries_the_original_request_once():
+    repairer, asks = make_repairer(['{"reason": "still missing weeks"}', '{"weeks": 6}'], max_rounds=2)
+    data = asyncio.run(repairer.repair('{"decision": "ACCEPT"}', Decision, prompt=REQUEST))
+    assert not validation_errors(Decision, data)
+    assert len(asks) == 2
+    for prompt, _ in asks:
+        assert prompt.count(REQUEST) == 1
+        assert prompt.count("【原始请求】") == 1
+    # 第二轮只追问仍然缺失的字段, 且附上一轮的回复
+    assert asks[1][1] == ["weeks"]
+    assert "still missing weeks" in asks[1][0]
+
+
+def test_unparseable_or_failed_reply_is_not_repaired():
+    repairer, asks = make_repairer([])
+    for raw in ("", None, "failed:timeout", "抱歉, 我无法回答"):
+        assert asyncio.run(repairer.repair(raw, Decision, prompt=REQUEST)) == {}
+    assert asks == []
+    assert repairer.skipped == 4
+
+
+def test_defaults_fill_fields_and_survive_a_failed_follow_up():
+    async def ask(prompt, schema):
+        raise RuntimeError("endpoint down")
+
+    repairer = JsonRepairer(ask, REPAIR_PROMPT, notify=lambda message: None)
+    data = asyncio.run(repairer.repair('{"decision": "ACCEPT"}', Decision, defaults={"weeks": 5}))
+    assert data == {"decision": "ACCEPT", "weeks": 5}
+    assert repairer.failed == 1
@@ -0,0 +1,64 @@
+import asyncio
+
+import pytest
+from autogen_core.models import UserMessage
+
+from llm.replay import CallRecorder, RecordReplayChatCompletionClient, ReplayMissError
+from tests.fakes import FakeModelClient, result
+
+
+def ask(client, text, **kwargs):
+    return asyncio.run(client.create([UserMessage(content=text, source="user")], **kwargs))
+
+
+def record(path, replies, questions):
+    recorder = CallRecorder(path, mode="record")
+    client = RecordReplayChatCompletionClient(FakeModelClient(replies, delay=0.02), recorder)
+    for text in questions:
+        ask(client, text)
+    return recorder
+
+
+def test_replay_serves_identical_requests_in_recorded_order(tmp_path):
+    path = str(tmp_path / "rec.jsonl")
+    assert record(path, [result("one"), result("two")], ["q", "q"]).recorded == 2
+
+    live = FakeModelClient([result("live")])
+    client = RecordReplayChatCompletionClient(live, CallRecorder(path, mode="replay", latency="zero"))
+    assert [ask(client, "q").content, ask(client, "q", extra_create_args={"max_tokens": 9}).content] == ["one", "two"]
+    assert live.calls == []
+
+
+def test_original_latency_is_simulated(tmp_path):
+    path = str(tmp_path / "rec.jsonl")
+    record(path, [result("one")], ["q"])
+    recorder = CallRecorder(path, mode="replay")
+    ask(RecordReplayChatCompletionClient(FakeModelClient([result()]), recorder), "q")
+    assert recorder.replayed_latency >= 0.02
+
+
+def test_misses_fail_or_go_live(tmp_path):
+    path = str(tmp_path / "rec.jsonl")
+    record(path, [result("one")], ["q"])
+
+    strict = RecordReplayChatCompletionClient(FakeModelClient([result()]), CallRecorder(path, mode="replay"))
+    with pytest.raises(ReplayMissError):
+        ask(strict, "other")
+
+    recorder = CallRecorder(path, mode="replay", on_miss="live")
+    live = RecordReplayChatCompletionClient(FakeModelClient([result("live")]), recorder)
+    assert ask(live, "other").content == "live"
+    assert recorder.misses == 1
+
+
+def test_recording_overwrites_the_previous_run(tmp_path):
+    path = str(tmp_path / "rec.jsonl")
+    record(path, [result("old")], ["q"])
+    record(path, [result("new")], ["q"])
+    with open(path, encoding="utf-8") as f:
+        assert len(f.readlines()) == 1
+
+
+def test_bad_modes_are_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        CallRecorder(str(tmp_path / "rec.jsonl"), mode="rewind")
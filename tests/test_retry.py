@@ -0,0 +1,131 @@
+import asyncio
+
+import pytest
+
+from llm.breaker import CircuitBreaker, CircuitOpenError
+from llm.context import wire_timeout
+from llm.retry import RetryableOutputError, RetryBudget, Retrier, RetryPolicy
+
+FAST = RetryPolicy(max_attempts=3, timeout=0.2, base_delay=0.0, max_delay=0.0)
+
+
+class ServerError(Exception):
+    status_code = 500
+
+
+def make_retrier(policy=FAST, budget=None):
+    notices = []
+    retrier = Retrier({"match": policy}, policy, budget or RetryBudget(min_retries=100), notify=notices.append)
+    return retrier, notices
+
+
+def test_retries_provider_errors_until_success():
+    retrier, notices = make_retrier()
+    attempts = []
+
+    async def attempt():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise ServerError("boom")
+        return "ok"
+
+    assert asyncio.run(retrier.run(attempt, phase="match")) == "ok"
+    stats = retrier.stats()["match"]
+    assert (stats["calls"], stats["retries"], stats["gave_up"]) == (1, 2, 0)
+    assert len(notices) == 2 and notices[0].startswith("🔁 Retry 1/2 (match)")
+
+
+def test_client_errors_and_open_circuits_are_not_retried():
+    retrier, _ = make_retrier()
+
+    class BadRequest(Exception):
+        status_code = 400
+
+    for exc in (BadRequest("400"), CircuitOpenError("open")):
+        async def attempt(exc=exc):
+            raise exc
+
+        with pytest.raises(type(exc)):
+            asyncio.run(retrier.run(attempt, phase="match"))
+    assert retrier.stats()["match"]["retries"] == 0
+
+
+def test_retry_budget_caps_retries():
+    retrier, _ = make_retrier(budget=RetryBudget(ratio=0.0, min_retries=1))
+
+    async def attempt():
+        raise RetryableOutputError("no json")
+
+    for _ in range(2):
+        with pytest.raises(RetryableOutputError):
+            asyncio.run(retrier.run(attempt, phase="match"))
+    stats = retrier.stats()["match"]
+    # 第一次调用用掉唯一的一次重试额度, 之后的重试都被预算拒绝
+    assert stats["retries"] == 1
+    assert stats["budget_denied"] == 2
+    assert stats["invalid"] == 3
+
+
+def test_timeout_reaches_the_breaker_not_the_queue():
+    retrier, _ = make_retrier()
+    breaker = CircuitBreaker("t", failure_threshold=10)
+    seen = []
+
+    async def attempt():
+        # 排队 (限流 / 并发窗口) 的时间不受单次超时限制
+        await asyncio.sleep(0.3)
+        seen.append(wire_timeout())
+        return await breaker.call(lambda: asyncio.sleep(0, result="ok"))
+
+    assert asyncio.run(retrier.run(attempt, phase="match")) == "ok"
+    assert seen == [0.2]
+    assert retrier.stats()["match"]["timeouts"] == 0
+
+
+def test_slow_wire_request_times_out_and_counts_on_the_breaker():
+    retrier, _ = make_retrier(RetryPolicy(max_attempts=2, timeout=0.05, base_delay=0.0, max_delay=0.0))
+    breaker = CircuitBreaker("t", failure_threshold=10)
+
+    with pytest.raises(TimeoutError):
+        asyncio.run(retrier.run(lambda: breaker.call(lambda: asyncio.sleep(1)), phase="match"))
+    assert breaker.failures == 2
+    assert retrier.stats()["match"]["timeouts"] == 2
+
+
+def test_stream_first_chunk_timeout_is_retried_and_announced():
+    retrier, notices = make_retrier(RetryPolicy(max_attempts=2, timeout=0.05, base_delay=0.0, max_delay=0.0))
+    breaker = CircuitBreaker("t", failure_threshold=10)
+    opened = []
+
+    async def chunks():
+        opened.append(1)
+        if len(opened) == 1:
+            await asyncio.sleep(1)
+        for chunk in ("a", "b"):
+            await asyncio.sleep(0.01)
+            yield chunk
+
+    async def consume():
+        return [chunk async for chunk in retrier.stream(lambda: breaker.stream(chunks), phase="match")]
+
+    assert asyncio.run(consume()) == ["a", "b"]
+    assert len(notices) == 1 and "TimeoutError" in notices[0]
+    assert (breaker.failures, breaker.successes) == (1, 1)
+
+
+def test_stream_is_not_retried_after_the_first_chunk():
+    retrier, notices = make_retrier()
+
+    async def chunks():
+        yield "a"
+        raise ServerError("cut")
+
+    async def consume():
+        got = []
+        with pytest.raises(ServerError):
+            async for chunk in retrier.stream(chunks, phase="match"):
+                got.append(chunk)
+        return got
+
+    assert asyncio.run(consume()) == ["a"]
+    assert notices == []
@@ -0,0 +1,69 @@
+import asyncio
+
+from autogen_core.models import CreateResult, UserMessage
+
+from llm.streaming import IncrementalJsonParser, JsonCutoffClient, StreamingJsonClient, StreamMonitor, on_early_decision
+from llm.context import call_context
+from tests.fakes import FakeModelClient
+
+MESSAGES = [UserMessage(content="RFP", source="user")]
+
+
+def collect(client):
+    async def run():
+        return [chunk async for chunk in client.create_stream(MESSAGES, json_output=True)]
+    return asyncio.run(run())
+
+
+def test_parser_reports_fields_as_they_complete():
+    parser = IncrementalJsonParser()
+    seen = []
+    for chunk in ['```json\n{"deci', 'sion": "ACC', 'EPT", "tags": ["a", ', '"b"], "n": 3', '}\n```']:
+        seen.extend(parser.feed(chunk))
+    assert seen == [("decision", "ACCEPT"), ("tags", ["a", "b"]), ("n", 3)]
+    assert parser.complete
+    assert parser.object_text == '{"decision": "ACCEPT", "tags": ["a", "b"], "n": 3}'
+
+
+def test_parser_ignores_braces_inside_strings():
+    parser = IncrementalJsonParser()
+    fields = parser.feed('{"reason": "用 } 和 { 说明", "ok": true}')
+    assert fields == [("reason", "用 } 和 { 说明"), ("ok", True)]
+    assert parser.complete
+
+
+class Recorder(FakeModelClient):
+    """A layer that keeps the final results it sees, as cache / replay / rate limiting do."""
+
+    def __init__(self, inner):
+        super().__init__()
+        self._inner = inner
+        self.results = []
+
+    async def create_stream(self, messages, **kwargs):
+        async for chunk in self._inner.create_stream(messages, **kwargs):
+            if isinstance(chunk, CreateResult):
+                self.results.append(chunk)
+            yield chunk
+
+
+def test_cut_off_result_reaches_the_layers_above_the_cutoff():
+    model = FakeModelClient(chunks=['{"decision": "REJECT", ', '"reason": "忙"}', " 另外补充一些说明", "……"])
+    monitor = StreamMonitor({"DECIDE": "decision"})
+    recorder = Recorder(JsonCutoffClient(model, monitor))
+    decisions = []
+    with call_context(prompt="DECIDE"), on_early_decision(lambda field, value, *_: decisions.append(value)):
+        chunks = collect(StreamingJsonClient(recorder, monitor))
+    assert "".join(c for c in chunks if isinstance(c, str)) == '{"decision": "REJECT", "reason": "忙"}'
+    assert [r.content for r in recorder.results] == ['{"decision": "REJECT", "reason": "忙"}']
+    assert decisions == ["REJECT"]
+    assert model.closed == 1
+    assert monitor.report()["DECIDE"]["cut_off"] == 1
+
+
+def test_disabled_cutoff_passes_the_stream_through():
+    model = FakeModelClient(chunks=['{"a": 1}', " trailing"])
+    chunks = collect(JsonCutoffClient(model, StreamMonitor(), enabled=False))
+    assert chunks[:-1] == ['{"a": 1}', " trailing"]
+    assert chunks[-1].content == '{"a": 1} trailing'
+    assert model.closed == 0
@@ -0,0 +1,76 @@
+import asyncio
+
+import pytest
+from autogen_core.models import CreateResult, RequestUsage, SystemMessage, UserMessage
+
+from configs.roles import ActiveProject, ProducerDecision
+from llm.structured import StructuredOutput, output_defaults, output_fallbacks, request_text, with_schema_instruction
+from utils_json import loads
+
+
+def reply(content: str) -> CreateResult:
+    return CreateResult(finish_reason="stop", content=content, usage=RequestUsage(prompt_tokens=1, completion_tokens=1), cached=False)
+
+
+def coerce(structured, content, model, request=""):
+    return loads(asyncio.run(structured.coerce(reply(content), model, request)).content)
+
+
+def test_valid_reply_is_returned_as_canonical_json():
+    structured = StructuredOutput()
+    data = coerce(structured, '好的 {"decision": "ACCEPT", "reason": "匹配"} TERMINATE', ProducerDecision)
+    assert data == {"decision": "ACCEPT", "reason": "匹配"}
+    assert structured.failed == 0
+
+
+def test_repair_gets_defaults_and_request():
+    calls = []
+
+    async def repair(raw, model, defaults, request):
+        calls.append((defaults, request))
+        return {**defaults, "project_content": "官网", "type": "WebDev", "weeks": 4}
+
+    structured = StructuredOutput(repair)
+    with output_defaults(project_id="p1"):
+        data = coerce(structured, '{"project_content": "官网"}', ActiveProject, request="原始需求")
+    assert data["project_id"] == "p1" and data["weeks"] == 4
+    assert calls == [({"project_id": "p1"}, "原始需求")]
+    assert structured.repaired == 1
+
+
+def test_fields_still_invalid_after_repair_take_the_fallbacks():
+    async def repair(raw, model, defaults, request):
+        return {**defaults, "project_content": "官网", "weeks": "many"}
+
+    structured = StructuredOutput(repair)
+    with output_defaults(project_id="p1"), output_fallbacks(project_content="", type="General", tags=[], weeks=5):
+        data = coerce(structured, '{"project_content": "官网", "weeks": "many"}', ActiveProject)
+    assert data == {"project_id": "p1", "project_content": "官网", "type": "General", "tags": [], "weeks": 5}
+    assert structured.fell_back == 1
+
+
+def test_reply_without_json_still_raises():
+    async def repair(raw, model, defaults, request):
+        return dict(defaults)
+
+    structured = StructuredOutput(repair)
+    with output_fallbacks(decision="REJECT", reason=""):
+        with pytest.raises(ValueError):
+            coerce(structured, "failed:timeout", ProducerDecision)
+    assert structured.failed == 1
+
+
+def test_fallbacks_are_scoped_to_the_context():
+    structured = StructuredOutput()
+    with output_fallbacks(reason=""):
+        assert coerce(structured, '{"decision": "ACCEPT"}', ProducerDecision)["reason"] == ""
+    with pytest.raises(ValueError):
+        coerce(structured, '{"decision": "ACCEPT"}', ProducerDecision)
+
+
+def test_schema_instruction_and_request_text():
+    messages = [SystemMessage(content="你是 CEO"), UserMessage(content="RFP", source="user")]
+    instructed = with_schema_instruction(messages, ProducerDecision)
+    assert instructed[0].content.startswith("你是 CEO") and "decision" in instructed[0].content
+    assert messages[0].content == "你是 CEO"
+    assert request_text(messages) == "你是 CEO\n\nRFP"
@@ -0,0 +1,50 @@
+import asyncio
+
+from llm.context import call_context
+from llm.retry import RetryBudget, Retrier, RetryingChatCompletionClient, RetryPolicy
+from llm.usage import UsageLedger, UsageLedgerClient, WireUsageClient
+from tests.fakes import FakeModelClient, result
+
+FAST = RetryPolicy(max_attempts=3, timeout=1.0, base_delay=0.0, max_delay=0.0)
+
+
+def make_chain(fake, ledger):
+    retrier = Retrier({}, FAST, RetryBudget(min_retries=100), notify=lambda message: None)
+    retrying = RetryingChatCompletionClient(WireUsageClient(fake, ledger), retrier, validate=lambda text: text != "bad")
+    return UsageLedgerClient(retrying, ledger)
+
+
+def test_retried_attempts_are_billed_once_per_wire_request():
+    ledger = UsageLedger()
+    fake = FakeModelClient([result("bad", prompt_tokens=100, completion_tokens=7), result("ok", prompt_tokens=100, completion_tokens=3)])
+
+    with call_context(phase="match", agent="CEO_c1"):
+        asyncio.run(make_chain(fake, ledger).create([]))
+
+    totals = ledger.totals()
+    assert (totals["calls"], totals["attempts"]) == (1, 2)
+    assert (totals["prompt_tokens"], totals["completion_tokens"]) == (200, 10)
+    assert ledger.by("agent")["CEO"]["total_tokens"] == 210
+
+
+def test_streamed_attempts_are_billed():
+    ledger = UsageLedger()
+    fake = FakeModelClient(chunks=["a", "b"])
+
+    async def consume():
+        return [chunk async for chunk in make_chain(fake, ledger).create_stream([])]
+
+    asyncio.run(consume())
+    totals = ledger.totals()
+    assert (totals["calls"], totals["attempts"], totals["completion_tokens"]) == (1, 1, 2)
+
+
+def test_cached_calls_cost_nothing():
+    ledger = UsageLedger(prompt_price_per_1k=1.0)
+    ledger.record(0, 0, 0.0, cached=True)
+    ledger.record_attempt(1000, 0, 0.5)
+    ledger.record(0, 0, 0.5)
+
+    totals = ledger.totals()
+    assert (totals["calls"], totals["cached"], totals["attempts"]) == (2, 1, 1)
+    assert totals["avg_latency"] == 0.5 and totals["cost"] == 1.0
@@ -0,0 +1,35 @@
+from pydantic import BaseModel
+
+from utils import extract_json, iter_json
+
+
+class Decision(BaseModel):
+    decision: str
+
+
+def test_fenced_reply_with_prose_around_it():
+    text = '好的, 见 [1]:\n```json\n{"a": {"b": "}{"}, "c": [1, 2]}\n```\n备注: {不是 JSON}'
+    assert extract_json(text) == {"a": {"b": "}{"}, "c": [1, 2]}
+
+
+def test_escaped_quotes_and_broken_candidates_are_skipped():
+    text = '{"note": "say \\"}\\"", "bad": } {"ok": "a\\"b"}'
+    assert extract_json(text) == {"ok": 'a"b'}
+    assert extract_json('{oops} trailing {"ok": 1}') == {"ok": 1}
+
+
+def test_truncated_reply_yields_nothing():
+    assert extract_json('{"decision": "ACC') == {}
+    assert list(iter_json('{"a": 1} {"b": "unterminated')) == [(0, {"a": 1})]
+
+
+def test_array_only_when_no_object():
+    assert extract_json("[1, 2] then {\"a\": 1}") == {"a": 1}
+    assert extract_json("[1, 2]") == [1, 2]
+    assert extract_json("") == {} and extract_json(None) == {}
+
+
+def test_model_picks_first_valid_object():
+    text = '{"other": 1} {"decision": "ACCEPT"}'
+    assert extract_json(text, Decision) == Decision(decision="ACCEPT")
+    assert extract_json('{"other": 1}', Decision) is None
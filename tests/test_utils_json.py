@@ -0,0 +1,50 @@
+import dataclasses
+from enum import Enum
+
+import pytest
+from pydantic import BaseModel
+
+import utils_json
+from utils_json import dumps, loads
+
+BACKENDS = ["json"] + (["orjson"] if utils_json.orjson is not None else [])
+
+
+class Role(Enum):
+    PRODUCER = "Producer"
+
+
+@dataclasses.dataclass
+class Plan:
+    content: str
+    internal: str = "hidden"
+
+    def to_dict(self):
+        return {"content": self.content}
+
+
+@dataclasses.dataclass
+class Point:
+    x: int
+    role: Role
+
+
+class Tag(BaseModel):
+    name: str
+
+
+VALUE = {"plan": Plan("扩张"), "point": Point(1, Role.PRODUCER), "tag": Tag(name="AI"), "ids": {3}}
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_backends_encode_the_same(monkeypatch, backend):
+    monkeypatch.setattr(utils_json, "BACKEND", backend)
+    assert dumps(VALUE) == '{"plan":{"content":"扩张"},"point":{"x":1,"role":"Producer"},"tag":{"name":"AI"},"ids":[3]}'
+    assert loads(dumps(VALUE, pretty=True)) == loads(dumps(VALUE))
+    assert dumps(VALUE, pretty=True).startswith('{\n  "plan"')
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_values_orjson_rejects_fall_back_to_stdlib(monkeypatch, backend):
+    monkeypatch.setattr(utils_json, "BACKEND", backend)
+    assert dumps({1: 2 ** 70}) == '{"1":1180591620717411303424}'
@@ -0,0 +1,58 @@
+import json
+
+from llm.context import call_context
+from utils_logger import BufferedLogSink, EventStream
+
+
+def test_sink_drains_everything_on_close(tmp_path):
+    path = tmp_path / "run.md"
+    sink = BufferedLogSink(str(path), flush_lines=7, flush_interval=10)
+    spans = [sink.write(f"第{i}行\n") for i in range(100)]
+    sink.close()
+
+    data = path.read_bytes()
+    assert data.decode("utf-8").count("\n") == 100
+    assert (sink.queued, sink.written, sink.dropped) == (100, 100, 0)
+    offset, length = spans[42]
+    assert data[offset:offset + length].decode("utf-8") == "第42行\n"
+
+
+def test_sink_appends_and_drops_after_close(tmp_path):
+    path = tmp_path / "run.md"
+    path.write_text("old\n", encoding="utf-8")
+    sink = BufferedLogSink(str(path))
+    assert sink.write("new\n") == (4, 4)
+    sink.close()
+
+    assert sink.write("late\n") is None and sink.dropped == 1
+    assert path.read_text(encoding="utf-8") == "old\nnew\n"
+
+
+def test_sync_sink_writes_immediately(tmp_path):
+    path = tmp_path / "run.md"
+    sink = BufferedLogSink(str(path), background=False)
+    sink.write("now\n")
+    assert path.read_text(encoding="utf-8") == "now\n"
+
+
+def test_events_carry_sequence_and_call_context(tmp_path):
+    path = tmp_path / "events.jsonl"
+    events = EventStream(str(path), "run-1")
+    events.emit("start")
+    with call_context(phase="match", week=2, company="c1"):
+        events.emit("step", title="Proposal", body=EventStream.ref("/logs/run.md", (10, 5)), skipped=None)
+    events.close()
+
+    first, second = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    assert (first["seq"], first["type"], first["run_id"]) == (1, "start", "run-1")
+    assert (second["seq"], second["phase"], second["week"], second["company"]) == (2, "match", 2, "c1")
+    assert second["body"] == {"file": "run.md", "offset": 10, "length": 5}
+    assert "skipped" not in second
+
+
+def test_disabled_stream_writes_nothing(tmp_path):
+    path = tmp_path / "events.jsonl"
+    events = EventStream(str(path), "run-1", enabled=False)
+    events.emit("start")
+    events.close()
+    assert not path.exists() and events.seq == 0
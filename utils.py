@@ -1,28 +1,79 @@
 import json
+import logging
 import re
-from typing import Dict, List, Set
-from pydantic import ValidationError
-
-def extract_json(text: str) -> Dict:
-    try:
-        clean_text = text.replace("```json", "").replace("```", "").strip()
-        return json.loads(clean_text)
-    except json.JSONDecodeError:
-        pass
-
-    try:
-        if "```json" in text:
-            pattern = r"```json(.*?)```"
-            match = re.search(pattern, text, re.DOTALL)
-            if match:
-                return json.loads(match.group(1).strip())
-        
-        pattern = r"\{.*\}"
-        match = re.search(pattern, text, re.DOTALL)
-        if match:
-            return json.loads(match.group(0).strip())
-            
-    except Exception as e:
-        print(f"JSON Parsing Error: {e}")
-        
-    return {}
\ No newline at end of file
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple, Union
+from pydantic import BaseModel, ValidationError
+
+_log = logging.getLogger(__name__)
+
+_DECODER = json.JSONDecoder()
+_JSON_START = re.compile(r"[{\[]")
+# 候选内部只关心括号; 字符串 (含转义) 作为一个整体跳过
+_JSON_TOKEN = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"|[{}\[\]]|"', re.DOTALL)
+_CLOSERS = {"}": "{", "]": "["}
+
+
+def _skip_candidate(text: str, start: int) -> int:
+    """Where scanning resumes after the bracket at `start` failed to decode."""
+    stack: List[str] = []
+    for m in _JSON_TOKEN.finditer(text, start):
+        c = m.group()
+        if c[0] == '"':
+            if len(c) == 1:
+                # 字符串直到文本结尾都未闭合 (回复被截断), 之后不会再有完整的 JSON
+                return len(text)
+        elif c in "{[":
+            stack.append(c)
+        elif stack.pop() != _CLOSERS[c]:
+            return m.start()
+        elif not stack:
+            return m.end()
+    return len(text)
+
+
+def iter_json(text: str) -> Iterator[Tuple[int, Any]]:
+    """
+    Yields (offset, value) for every top-level JSON object / array in `text`, left to right,
+    in one linear pass: each candidate bracket is decoded in place (json's C scanner finds
+    where the value ends), and one that does not decode is skipped as a balanced span,
+    honouring strings and escapes, so prose around the JSON (```json fences, preambles,
+    trailing remarks with braces) never swallows it.
+    """
+    pos = 0
+    while True:
+        m = _JSON_START.search(text, pos)
+        if m is None:
+            return
+        start = m.start()
+        try:
+            value, pos = _DECODER.raw_decode(text, start)
+        except ValueError as e:
+            _log.debug("Skipping JSON candidate at %d: %s", start, e)
+            pos = _skip_candidate(text, start)
+            continue
+        yield start, value
+
+
+def extract_json(text: str, model: Optional[type[BaseModel]] = None) -> Union[Dict, List, BaseModel, None]:
+    """
+    The first JSON object in a model reply (a bare array only when the reply holds no
+    object, so "see [1]" in a preamble never wins), or {} when there is none. With `model`,
+    the first object that validates as `model` is returned as an instance, None if none does.
+    """
+    fallback: Optional[List] = None
+    for start, value in iter_json(text or ""):
+        if isinstance(value, list):
+            if fallback is None:
+                fallback = value
+            continue
+        if model is None:
+            return value
+        try:
+            return model.model_validate(value)
+        except ValidationError as e:
+            _log.debug("JSON object at %d is not a valid %s: %s", start, model.__name__, e)
+
+    _log.debug("No JSON object found in reply: %r", (text or "")[:80])
+    if model is not None:
+        return None
+    return fallback if fallback is not None else {}
@@ -0,0 +1,61 @@
+import dataclasses
+import json
+import os
+from enum import Enum
+from typing import Any, Union
+
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# 编码后端; JSON_BACKEND=json 强制使用标准库 (对比测试或排查 orjson 行为差异时)
+BACKEND = "orjson" if orjson is not None and os.getenv("JSON_BACKEND", "auto") != "json" else "json"
+
+
+def _default(obj: Any) -> Any:
+    """Pydantic models, dataclasses (their to_dict when defined), sets, and for the stdlib encoder enums."""
+    if isinstance(obj, BaseModel):
+        return obj.model_dump(mode="json")
+    if dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        return obj.to_dict() if hasattr(obj, "to_dict") else dataclasses.asdict(obj)
+    if isinstance(obj, Enum):
+        return obj.value
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    return str(obj)
+
+
+def dumps(obj: Any, pretty: bool = False) -> str:
+    """
+    Compact JSON (no whitespace, non-ASCII kept) for data that goes to models, files and
+    caches; `pretty=True` gives the 2-space indented form for logs people read.
+    """
+    if BACKEND == "orjson":
+        try:
+            # 数据类交给 _default, 与标准库一样优先用 to_dict (而不是 orjson 逐字段序列化)
+            option = orjson.OPT_PASSTHROUGH_DATACLASS | (orjson.OPT_INDENT_2 if pretty else 0)
+            return orjson.dumps(obj, default=_default, option=option).decode("utf-8")
+        except TypeError:
+            # 超出 64 位的整数、非字符串键等 orjson 不支持的情况交给标准库
+            pass
+    if pretty:
+        return json.dumps(obj, ensure_ascii=False, indent=2, default=_default)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=_default)
+
+
+def loads(data: Union[str, bytes]) -> Any:
+    # 解码固定用标准库: 在 logs/*.md 记录的回复上 (大量中文字符串) orjson.loads 反而慢 2~3 倍
+    return json.loads(data)
+
+
+def dump(obj: Any, path: str, pretty: bool = False):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(dumps(obj, pretty))
+
+
+def load(path: str) -> Any:
+    with open(path, "rb") as f:
+        return loads(f.read())
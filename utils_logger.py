@@ -1,11 +1,21 @@
+import atexit
 import os
+import queue
+import re
+import sys
+import threading
+import time
 from datetime import datetime
+from typing import Any, Callable, Dict, Optional, Tuple
 from rich.console import Console
 from rich.panel import Panel
 from rich.table import Table
 from rich.text import Text
 from rich.theme import Theme
 
+from llm.context import current_context
+from utils_json import dumps
+
 custom_theme = Theme({
     "info": "cyan",
     "warning": "yellow",
@@ -16,8 +26,188 @@ custom_theme = Theme({
 
 console = Console(theme=custom_theme)
 
+# 无界面模式下输出前去掉 emoji 与变体选择符
+_EMOJI = re.compile("[\U0001F000-\U0001FAFF\u2600-\u27BF\u2B00-\u2BFF\uFE0F]")
+
+
+def headless_default() -> bool:
+    """LOG_HEADLESS=1 / 0 forces the mode; otherwise headless whenever stdout is not a terminal."""
+    mode = os.getenv("LOG_HEADLESS", "auto")
+    if mode == "auto":
+        return not sys.stdout.isatty()
+    return mode == "1"
+
+
+def one_line(text: str, limit: int = 160) -> str:
+    text = " ".join(_EMOJI.sub("", str(text)).split())
+    return text if len(text) <= limit else text[:limit - 3] + "..."
+
+class BufferedLogSink:
+    """
+    Appends log entries to a file from a background thread, so logging from a coroutine
+    never waits on disk. `write` only enqueues; the writer keeps the file open and flushes
+    a batch every `flush_lines` entries or `flush_interval` seconds, and `close` (also run
+    at interpreter exit) drains what is left. When `max_queue` entries are already waiting
+    new ones are dropped and counted rather than blocking the caller. `write` returns the
+    (byte offset, byte length) the entry will occupy in the file, or None if it was dropped.
+    """
+
+    _CLOSE = object()
+
+    def __init__(self, path: str, max_queue: int = 10000, flush_lines: int = 64,
+                 flush_interval: float = 0.5, background: bool = True):
+        self.path = path
+        self.flush_lines = flush_lines
+        self.flush_interval = flush_interval
+        self.background = background
+
+        self.queued = 0
+        self.written = 0
+        self.dropped = 0
+        self.batches = 0
+        self.max_depth = 0
+
+        self._offset = os.path.getsize(path) if os.path.exists(path) else 0
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._thread: threading.Thread = None
+        self._closed = False
+        if background:
+            self._thread = threading.Thread(target=self._run, name="log-sink", daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    @classmethod
+    def from_env(cls, path: str) -> "BufferedLogSink":
+        return cls(
+            path,
+            max_queue=int(os.getenv("LOG_QUEUE_SIZE", "10000")),
+            flush_lines=int(os.getenv("LOG_FLUSH_LINES", "64")),
+            flush_interval=float(os.getenv("LOG_FLUSH_MS", "500")) / 1000,
+            background=os.getenv("LOG_SINK", "buffered") != "sync",
+        )
+
+    def write(self, content: str) -> Optional[Tuple[int, int]]:
+        if not self.background:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(content)
+            self.written += 1
+        else:
+            if self._closed:
+                self.dropped += 1
+                return None
+            try:
+                self._queue.put_nowait(content)
+            except queue.Full:
+                self.dropped += 1
+                return None
+            self.queued += 1
+            self.max_depth = max(self.max_depth, self._queue.qsize())
+        length = len(content.encode("utf-8"))
+        span, self._offset = (self._offset, length), self._offset + length
+        return span
+
+    def _run(self):
+        with open(self.path, "a", encoding="utf-8") as f:
+            while True:
+                batch = [self._queue.get()]
+                deadline = time.monotonic() + self.flush_interval
+                while batch[-1] is not self._CLOSE and len(batch) < self.flush_lines:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        batch.append(self._queue.get(timeout=remaining))
+                    except queue.Empty:
+                        break
+                closing = batch[-1] is self._CLOSE
+                if closing:
+                    batch.pop()
+                if batch:
+                    f.write("".join(batch))
+                    f.flush()
+                    self.written += len(batch)
+                    self.batches += 1
+                if closing:
+                    return
+
+    def close(self, timeout: float = 5.0):
+        """Writes out everything still queued and stops the writer thread."""
+        if self._thread is None or self._closed:
+            return
+        self._closed = True
+        self._queue.put(self._CLOSE)
+        self._thread.join(timeout)
+
+    def summary(self) -> str:
+        if not self.background:
+            return f"Log Sink: sync written={self.written}"
+        return (
+            f"Log Sink: queued={self.queued} written={self.written} dropped={self.dropped} "
+            f"pending={self.queued - self.written} batches={self.batches} max_depth={self.max_depth}"
+        )
+
+class EventStream:
+    """
+    Machine-readable twin of the markdown log: one JSON object per line with the run id,
+    a sequence number, the time, the event type and the CallContext of the emitting task
+    (phase / week / company / agent / prompt), plus event-specific fields. Bulky payloads
+    stay in the human logs and are referenced as {"file", "offset", "length"} (bytes), so
+    a run loads with e.g. pandas.read_json(path, lines=True) without parsing markdown.
+    """
+
+    def __init__(self, path: str, run_id: str, enabled: bool = True):
+        self.path = path
+        self.run_id = run_id
+        self.enabled = enabled
+        self.seq = 0
+        self.sink = BufferedLogSink.from_env(path) if enabled else None
+
+    @classmethod
+    def from_env(cls, path: str, run_id: str) -> "EventStream":
+        return cls(path, run_id, enabled=os.getenv("LOG_EVENTS", "1") == "1")
+
+    def emit(self, event_type: str, **fields):
+        if not self.enabled:
+            return
+        self.seq += 1
+        event = {"run_id": self.run_id, "seq": self.seq, "ts": round(time.time(), 3), "type": event_type}
+        event.update(current_context().as_dict())
+        event.update({k: v for k, v in fields.items() if v is not None})
+        self.sink.write(dumps(event) + "\n")
+
+    @staticmethod
+    def ref(path: str, span: Optional[Tuple[int, int]]) -> Optional[Dict[str, Any]]:
+        if span is None:
+            return None
+        return {"file": os.path.basename(path), "offset": span[0], "length": span[1]}
+
+    def llm_call(self, record):
+        """
+        UsageLedger listener: an llm_call event per model call with its latency and cache
+        status, and an llm_attempt event with the tokens of every request sent on the wire.
+        """
+        tags = dict(phase=record.phase, week=record.week, company=record.company, agent=record.agent, prompt=record.prompt)
+        if record.attempt:
+            self.emit(
+                "llm_attempt", **tags, latency=round(record.latency, 4),
+                prompt_tokens=record.prompt_tokens, completion_tokens=record.completion_tokens,
+            )
+        else:
+            self.emit("llm_call", **tags, latency=round(record.latency, 4), cached=record.cached)
+
+    def close(self):
+        if self.sink is not None:
+            self.sink.close()
+
 class SimulationLogManager:
-    def __init__(self, log_dir="../logs"):
+    """
+    Logs every step to the console, the markdown run log and the JSONL event stream. In
+    headless mode (cron jobs, output redirected to a file) the console gets one compact
+    line per call instead of rich panels and tables; the files are identical in both modes.
+    The CPU time spent producing console output is counted either way (`render_summary`).
+    """
+
+    def __init__(self, log_dir="../logs", headless: Optional[bool] = None):
         if not os.path.exists(log_dir):
             os.makedirs(log_dir)
             
@@ -26,50 +216,108 @@ class SimulationLogManager:
         
         with open(self.log_file, "w", encoding="utf-8") as f:
             f.write(f"# Simulation Log - {timestamp}\n\n")
+        # 写文件交给后台线程, 热路径上只做入队 (LOG_SINK=sync 恢复同步写入)
+        self.sink = BufferedLogSink.from_env(self.log_file)
+        # 同名 .jsonl: 结构化事件流 (LOG_EVENTS=0 关闭)
+        self.events = EventStream.from_env(os.path.join(log_dir, f"sim_run_{timestamp}.jsonl"), timestamp)
+
+        self.headless = headless_default() if headless is None else headless
+        self.renders = 0
+        self.render_cpu = 0.0
+
+    def set_headless(self, headless: bool):
+        self.headless = headless
+
+    def _render(self, rich_output: Callable[[], None], line: Optional[str]):
+        """rich_output() normally, print(line) in headless mode (nothing when line is None); CPU time is charged to rendering."""
+        if self.headless and line is None:
+            return
+        start = time.thread_time()
+        if self.headless:
+            print(line)
+        else:
+            rich_output()
+        self.renders += 1
+        self.render_cpu += time.thread_time() - start
+
+    def render_summary(self) -> str:
+        mode = "headless" if self.headless else "rich"
+        avg = self.render_cpu / self.renders * 1000 if self.renders else 0.0
+        return f"Console: {mode} renders={self.renders} cpu={self.render_cpu:.3f}s ({avg:.2f}ms/render)"
+
+    def _write_file(self, content: str) -> Optional[Dict[str, Any]]:
+        """Appends to the markdown log; returns a reference to the entry for EventStream."""
+        return EventStream.ref(self.log_file, self.sink.write(content + "\n"))
+
+    def close(self):
+        self.sink.close()
+        self.events.close()
 
-    def _write_file(self, content: str):
-        with open(self.log_file, "a", encoding="utf-8") as f:
-            f.write(content + "\n")
+    def log_rule(self, title: str, style: str = "bold blue"):
+        """Console-only section divider."""
+        self._render(lambda: console.rule(f"[{style}]{title}[/]"), f"== {one_line(title)} ==")
+
+    def log_status(self, message: str, style: str = "bold yellow"):
+        """Console-only progress line; `message` is plain text (no rich markup)."""
+        self._render(lambda: console.print(Text(message, style=style)), one_line(message))
+
+    def log_detail(self, message: str, style: str = "dim"):
+        """Console-only verbose output (raw replies, JSON dumps), left out in headless mode."""
+        self._render(lambda: console.print(Text(message, style=style)), None)
 
     def log_header(self, title: str):
-        console.rule(f"[bold blue]{title}[/]")
+        self.log_rule(title)
         self._write_file(f"\n## {title}\n")
+        self.events.emit("header", title=title)
 
     def log_event(self, agent_name: str, event_type: str, message: str, color="info"):
         time_str = datetime.now().strftime("%H:%M:%S")
-        console.print(f"[{time_str}] [bold]{agent_name}[/]: [{color}]{message}[/]")
+        self._render(
+            lambda: console.print(f"[{time_str}] [bold]{agent_name}[/]: [{color}]{message}[/]"),
+            f"[{time_str}] {one_line(agent_name, 40)} | {event_type} | {one_line(message)}",
+        )
         self._write_file(f"- **{time_str}** | **{agent_name}** | {event_type} | {message}")
+        self.events.emit("event", actor=agent_name, event=event_type, message=message)
 
     def log_llm_content(self, agent_name: str, content: str, title="Thinking"):
-        console.print(Panel(
-            content,
-            title=f"🤖 {agent_name} - {title}",
-            border_style="blue",
-            style="llm_output"
-        ))
-        
-        self._write_file(f"\n> **{agent_name} ({title})**:\n> \n> {content.replace(chr(10), chr(10)+'> ')}\n")
+        self._render(
+            lambda: console.print(Panel(
+                content,
+                title=f"🤖 {agent_name} - {title}",
+                border_style="blue",
+                style="llm_output"
+            )),
+            f"[{datetime.now().strftime('%H:%M:%S')}] {one_line(agent_name, 40)} | {title} | {len(content)} chars",
+        )
+
+        ref = self._write_file(f"\n> **{agent_name} ({title})**:\n> \n> {content.replace(chr(10), chr(10)+'> ')}\n")
+        self.events.emit("llm_content", actor=agent_name, title=title, chars=len(content), ref=ref)
 
     def log_table(self, title: str, columns: list, rows: list):
-        table = Table(title=title)
-        for col in columns:
-            table.add_column(col, justify="center")
-        for row in rows:
-            table.add_row(*[str(r) for r in row])
-            
-        console.print(table)
-        
+        def render_table():
+            table = Table(title=title)
+            for col in columns:
+                table.add_column(col, justify="center")
+            for row in rows:
+                table.add_row(*[str(r) for r in row])
+            console.print(table)
+
+        self._render(render_table, f"== {one_line(title)}: {len(rows)} rows ==")
+
         md_table = f"\n### {title}\n| {' | '.join(columns)} |\n| {' | '.join(['---']*len(columns))} |\n"
         for row in rows:
             md_table += f"| {' | '.join(str(r) for r in row)} |\n"
         self._write_file(md_table)
+        self.events.emit("table", title=title, columns=columns, rows=rows)
 
     def log_success(self, message: str):
-        console.print(f"✅ [success]{message}[/]")
+        self._render(lambda: console.print(f"✅ [success]{message}[/]"), f"OK: {one_line(message)}")
         self._write_file(f"\n**✅ SUCCESS:** {message}\n")
+        self.events.emit("success", message=message)
 
     def log_error(self, message: str):
-        console.print(f"❌ [error]{message}[/]")
+        self._render(lambda: console.print(f"❌ [error]{message}[/]"), f"ERROR: {one_line(message)}")
         self._write_file(f"\n**❌ ERROR:** {message}\n")
+        self.events.emit("error", message=message)
 
 LOGGER = SimulationLogManager()
\ No newline at end of file
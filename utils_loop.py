@@ -0,0 +1,187 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import defaultdict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
+
+from llm.context import active_phase
+
+T = TypeVar("T")
+
+LOOP_CHOICES = ("auto", "asyncio", "uvloop")
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def loop_factory(name: str = "auto") -> Tuple[str, Optional[Callable[[], asyncio.AbstractEventLoop]]]:
+    """(loop actually used, factory for asyncio.Runner); "auto" picks uvloop when it is installed."""
+    if name == "asyncio":
+        return "asyncio", None
+    try:
+        import uvloop
+    except ImportError:
+        if name == "uvloop":
+            print("⚠️ uvloop is not installed (pip install uvloop), using the asyncio loop")
+        return "asyncio", None
+    return "uvloop", uvloop.new_event_loop
+
+
+def _call_site(frame) -> Tuple[str, str]:
+    """(innermost frame in this repository, innermost frame overall) of a sampled stack."""
+    stack = traceback.StackSummary.extract(traceback.walk_stack(frame), lookup_lines=False)
+    inside = stack[0]
+    own = next(
+        (f for f in stack if f.filename.startswith(PROJECT_ROOT) and "site-packages" not in f.filename
+         and os.path.abspath(f.filename) != os.path.abspath(__file__)),
+        inside,
+    )
+    return (
+        f"{os.path.relpath(own.filename, PROJECT_ROOT)}:{own.lineno} {own.name}",
+        f"{os.path.basename(inside.filename)}:{inside.lineno} {inside.name}",
+    )
+
+
+class LoopLagMonitor:
+    """
+    Measures how late the event loop wakes a heartbeat that sleeps `interval` seconds.
+    Every stall over `threshold` is recorded under the active phase and the call site
+    that was blocking the loop: a watchdog thread samples the loop thread's stack while
+    the stall is still going on and keeps the innermost frame in this repository (plus
+    the innermost frame overall, e.g. json.encoder or rich). Stalls shorter than the
+    watchdog period may go unsampled and are reported with site "-".
+    """
+
+    def __init__(self, threshold: float = 0.1, interval: float = 0.05, enabled: bool = True):
+        self.threshold = threshold
+        self.interval = interval
+        self.enabled = enabled
+        self.loop_name = "asyncio"
+
+        self.beats = 0
+        self.stalls = 0
+        self.total_lag = 0.0
+        self.max_lag = 0.0
+        self._sites: Dict[Tuple[str, str], Dict[str, Any]] = defaultdict(
+            lambda: {"stalls": 0, "total": 0.0, "max": 0.0, "inside": "-"}
+        )
+
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._loop_thread: Optional[int] = None
+        self._last_beat = 0.0
+        self._sample: Optional[Tuple[Optional[str], str, str]] = None
+
+    @classmethod
+    def from_env(cls) -> "LoopLagMonitor":
+        return cls(
+            threshold=float(os.getenv("LOOP_LAG_MS", "100")) / 1000,
+            enabled=os.getenv("LOOP_LAG_MONITOR", "1") == "1",
+        )
+
+    def start(self):
+        """Starts the heartbeat on the running loop and the watchdog thread."""
+        if not self.enabled or self._task is not None:
+            return
+        self._loop_thread = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.get_running_loop().create_task(self._heartbeat())
+        self._thread = threading.Thread(target=self._watch, name="loop-lag-watchdog", daemon=True)
+        self._thread.start()
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        self._stop.set()
+        self._thread.join(timeout=1.0)
+
+    async def _heartbeat(self):
+        before = time.monotonic()
+        while True:
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self._last_beat = now
+            self.beats += 1
+            lag = now - before - self.interval
+            if lag >= self.threshold:
+                self._record(lag)
+            before = now
+
+    def _watch(self):
+        period = min(self.interval, self.threshold) / 4
+        while not self._stop.wait(period):
+            if self._sample is not None or time.monotonic() - self._last_beat < self.interval + self.threshold:
+                continue
+            frame = sys._current_frames().get(self._loop_thread)
+            if frame is not None:
+                self._sample = (active_phase(), *_call_site(frame))
+
+    def _record(self, lag: float):
+        sample, self._sample = self._sample, None
+        phase, site, inside = sample if sample else (active_phase(), "-", "-")
+        self.stalls += 1
+        self.total_lag += lag
+        self.max_lag = max(self.max_lag, lag)
+        s = self._sites[(phase or "-", site)]
+        s["stalls"] += 1
+        s["total"] += lag
+        s["max"] = max(s["max"], lag)
+        s["inside"] = inside
+
+    def report(self, top: int = 10) -> List[Dict[str, Any]]:
+        """Worst call sites by total blocking time."""
+        rows = [{"phase": phase, "site": site, **s} for (phase, site), s in self._sites.items()]
+        return sorted(rows, key=lambda r: r["total"], reverse=True)[:top]
+
+    def log_report(self, logger, top: int = 10):
+        columns = ["Phase", "Call Site", "Blocking In", "Stalls", "Total", "Max"]
+        rows = [
+            [r["phase"], r["site"], r["inside"], r["stalls"], f"{r['total']:.2f}s", f"{r['max'] * 1000:.0f}ms"]
+            for r in self.report(top)
+        ]
+        if rows:
+            logger.log_table(f"Event Loop Lag ({self.loop_name}, > {self.threshold * 1000:.0f}ms)", columns, rows)
+
+    def summary(self) -> str:
+        if not self.enabled:
+            return f"Event Loop: {self.loop_name} (lag monitor off)"
+        text = (
+            f"Event Loop: {self.loop_name} stalls={self.stalls} (>{self.threshold * 1000:.0f}ms) "
+            f"blocked={self.total_lag:.2f}s max={self.max_lag * 1000:.0f}ms"
+        )
+        worst = self.report(1)
+        if worst:
+            text += f" | worst: [{worst[0]['phase']}] {worst[0]['site']} ({worst[0]['total']:.2f}s)"
+        return text
+
+
+# 进程级事件循环延迟监控 (LOOP_LAG_MS 阈值, LOOP_LAG_MONITOR=0 关闭)
+LOOP_MONITOR = LoopLagMonitor.from_env()
+
+
+def run(main: Awaitable[T], loop: str = "auto", lag_ms: Optional[float] = None) -> T:
+    """asyncio.run with a selectable loop implementation and LOOP_MONITOR running alongside `main`."""
+    name, factory = loop_factory(loop)
+    LOOP_MONITOR.loop_name = name
+    if lag_ms is not None:
+        LOOP_MONITOR.threshold = lag_ms / 1000
+        LOOP_MONITOR.enabled = lag_ms > 0
+
+    async def monitored() -> T:
+        LOOP_MONITOR.start()
+        try:
+            return await main
+        finally:
+            await LOOP_MONITOR.stop()
+
+    with asyncio.Runner(loop_factory=factory) as runner:
+        return runner.run(monitored())